@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+import db
+import risultati
+from metriche import SOGLIA_LENTO, SOGLIA_RAPIDO
+
+# ----------------------------
+# Configurazione
+# ----------------------------
+OUTPUT_DIR = "output"
+PERCORSO_STATO = os.path.join(OUTPUT_DIR, "stato_analisi.json")
+OUTPUT_TEMPI = os.path.join(OUTPUT_DIR, "tempi_occupazione_ambulanza.csv")
+OUTPUT_DISTRIBUZIONE = os.path.join(OUTPUT_DIR, "distribuzione_ambulanze_estreme.csv")
+OUTPUT_TOP_CITTA = os.path.join(OUTPUT_DIR, "top_citta_interventi.csv")
+
+# I documenti caricati negli ultimi secondi vengono lasciati al job successivo,
+# così una scrittura ancora in corso non viene mai saltata dal watermark
+MARGINE_SECONDI = 60
+
+# "spark": connettore MongoDB su Spark (richiede Java); "locale": DuckDB in-process
+MOTORI = ("spark", "locale")
+
+COLONNE_CONTEGGI = ["citta", "totale_interventi", "interventi_rapidi", "interventi_lenti"]
+
+
+# ----------------------------
+# Stato persistente: watermark, aggregati per città e rimozioni già viste
+# ----------------------------
+def carica_stato(percorso=PERCORSO_STATO):
+    if not os.path.exists(percorso):
+        return None, pd.DataFrame(columns=COLONNE_CONTEGGI), None
+    with open(percorso, "r", encoding="utf-8") as f:
+        stato = json.load(f)
+    watermark = datetime.fromisoformat(stato["watermark"])
+    return watermark, pd.DataFrame(stato["citta"], columns=COLONNE_CONTEGGI), stato.get("rimozioni")
+
+
+def salva_stato(watermark, conteggi, rimozioni=None, percorso=PERCORSO_STATO):
+    stato = {
+        "watermark": watermark.isoformat(),
+        # Contatore di db.rimozioni_collezione al momento del job (None se sconosciuto)
+        "rimozioni": rimozioni,
+        # None al posto di NaN per i documenti senza città
+        "citta": conteggi.astype(object).where(conteggi.notna(), None).to_dict(orient="records"),
+    }
+    temporaneo = percorso + ".tmp"
+    with open(temporaneo, "w", encoding="utf-8") as f:
+        json.dump(stato, f, indent=1, ensure_ascii=False)
+    os.replace(temporaneo, percorso)
+
+
+def unisci_conteggi(conteggi, parziali):
+    """Somma i conteggi parziali della nuova finestra a quelli già accumulati."""
+    tutti = pd.concat([conteggi, parziali[COLONNE_CONTEGGI]], ignore_index=True)
+    numeriche = COLONNE_CONTEGGI[1:]
+    tutti[numeriche] = tutti[numeriche].astype("int64")
+    return tutti.groupby("citta", dropna=False, as_index=False)[numeriche].sum()
+
+
+# ----------------------------
+# Output per la dashboard
+# ----------------------------
+def distribuzione_estremi(conteggi):
+    df = conteggi.copy()
+    df["percentuale_rapidi"] = (df["interventi_rapidi"] / df["totale_interventi"] * 100).round(2)
+    df["percentuale_lenti"] = (df["interventi_lenti"] / df["totale_interventi"] * 100).round(2)
+    # Solo le città con almeno un intervento rapido o lento
+    return df[(df["interventi_rapidi"] > 0) | (df["interventi_lenti"] > 0)].sort_values("citta")
+
+
+def top_citta(conteggi, n=10):
+    df = conteggi.rename(columns={"totale_interventi": "count"})[["citta", "count"]]
+    return df.sort_values(["count", "citta"], ascending=[False, True]).head(n)
+
+
+def scrivi_output(conteggi, nuovi_tempi, da_zero):
+    """Scrive gli output in Parquet (letti dalla dashboard) e in CSV."""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    distribuzione = distribuzione_estremi(conteggi)
+    top = top_citta(conteggi)
+
+    # I tempi sono per intervento: si accodano solo le nuove righe
+    accoda = not da_zero and os.path.exists(OUTPUT_TEMPI)
+    nuovi_tempi.to_csv(OUTPUT_TEMPI, mode="a" if accoda else "w", header=not accoda, index=False)
+    distribuzione.to_csv(OUTPUT_DISTRIBUZIONE, index=False)
+    top.to_csv(OUTPUT_TOP_CITTA, index=False)
+
+    accoda = not da_zero and risultati.esiste(risultati.TEMPI)
+    if not (accoda and nuovi_tempi.empty):
+        risultati.scrivi(nuovi_tempi, risultati.TEMPI, accoda=accoda)
+    risultati.scrivi(distribuzione, risultati.DISTRIBUZIONE)
+    risultati.scrivi(top, risultati.TOP_CITTA)
+
+
+# ----------------------------
+# Job incrementale
+# ----------------------------
+def calcola(motore, inizio, fine, uri=db.MONGO_URI, spark=None, snapshot=None):
+    """Risultati parziali della finestra [inizio, fine) calcolati con il motore scelto."""
+    if motore == "spark":
+        if snapshot is not None:
+            raise ValueError("La lettura da snapshot è disponibile solo con il motore locale")
+        import analisi_spark
+
+        return analisi_spark.calcola(inizio, fine, SOGLIA_RAPIDO, SOGLIA_LENTO, spark=spark, uri=uri)
+    if motore == "locale":
+        import analisi_locale
+
+        return analisi_locale.calcola(inizio, fine, SOGLIA_RAPIDO, SOGLIA_LENTO, uri=uri, snapshot=snapshot)
+    raise ValueError(f"Motore sconosciuto: {motore!r} (valori ammessi: {', '.join(MOTORI)})")
+
+
+def rimozioni_correnti(uri=db.MONGO_URI, snapshot=None):
+    """Documenti rimossi finora da `interventi`; None leggendo da uno snapshot, dove non si può sapere."""
+    if snapshot is not None:
+        return None
+    client = db.crea_client(uri)
+    try:
+        return db.rimozioni_collezione(client[db.DB_NAME])
+    finally:
+        client.close()
+
+
+def esegui(da_zero=False, uri=db.MONGO_URI, spark=None, motore="spark", snapshot=None):
+    """Elabora i documenti caricati dopo il watermark e aggiorna output e stato.
+
+    I conteggi si possono solo sommare: se dall'ultimo job l'ingestione ha rimosso documenti
+    (versioni precedenti di file modificati), il loro contributo va tolto e si ricalcola da zero.
+    """
+    inizio_job = time.perf_counter()
+    watermark, conteggi, rimozioni_elaborate = carica_stato()
+    # Letto prima del calcolo: una rimozione durante il job viene vista dal job successivo
+    rimozioni = rimozioni_correnti(uri, snapshot)
+    if watermark is not None and not da_zero and (rimozioni is None or rimozioni != rimozioni_elaborate):
+        print("Documenti rimossi dall'ultima esecuzione (o non verificabili): ricalcolo da zero.")
+        da_zero = True
+    if da_zero:
+        watermark, conteggi = None, pd.DataFrame(columns=COLONNE_CONTEGGI)
+    fine = datetime.now(timezone.utc) - timedelta(seconds=MARGINE_SECONDI)
+
+    nuovi_tempi, parziali = calcola(motore, watermark, fine, uri=uri, spark=spark, snapshot=snapshot)
+
+    conteggi = unisci_conteggi(conteggi, parziali)
+    scrivi_output(conteggi, nuovi_tempi, da_zero=watermark is None)
+    salva_stato(fine, conteggi, rimozioni)
+
+    secondi = time.perf_counter() - inizio_job
+    print(
+        f"Analisi completata: {len(nuovi_tempi)} nuovi interventi "
+        f"(da {watermark.isoformat() if watermark else 'inizio'} a {fine.isoformat()}) "
+        f"in {secondi:.1f} s con il motore {motore}."
+    )
+    return conteggi
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Aggiorna gli output di analisi elaborando solo gli interventi caricati dall'ultima esecuzione."
+    )
+    parser.add_argument("--da-zero", action="store_true", help="Ignora lo stato salvato e ricalcola tutto")
+    parser.add_argument("--uri", default=db.MONGO_URI, help="URI di MongoDB")
+    parser.add_argument("--motore", choices=MOTORI, default="spark", help="Motore di calcolo (default: spark)")
+    parser.add_argument(
+        "--snapshot",
+        help=(
+            "Con --motore locale: legge i documenti da un export (mongoexport o cartella di JSON) invece che da MongoDB; "
+            "le rimozioni non sono verificabili e gli output vengono ricalcolati da zero"
+        ),
+    )
+    args = parser.parse_args()
+    if args.snapshot and args.motore != "locale":
+        parser.error("--snapshot richiede --motore locale")
+    esegui(da_zero=args.da_zero, uri=args.uri, motore=args.motore, snapshot=args.snapshot)
+
+
+if __name__ == "__main__":
+    main()
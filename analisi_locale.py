@@ -0,0 +1,173 @@
+import glob
+import os
+from datetime import timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from bson import json_util
+
+import db
+import normalizzazione
+from analisi_spark import CAMPI_NUMERICI, CAMPI_STRINGA, pipeline_finestra
+
+# ----------------------------
+# Motore locale (DuckDB su tabelle Arrow) per i job di analisi
+# ----------------------------
+# Produce gli stessi risultati di analisi_spark.calcola senza avviare una JVM:
+# i documenti della finestra vengono letti da MongoDB (o da un export su file)
+# in una tabella Arrow colonnare, su cui DuckDB esegue le stesse espressioni del job Spark.
+
+LOTTO_CURSORE = 10000
+
+
+def schema_interventi():
+    campi = [pa.field(nome, pa.string()) for nome in CAMPI_STRINGA]
+    campi += [pa.field(nome, pa.float64()) for nome in CAMPI_NUMERICI]
+    campi.append(pa.field("ingerito_il", pa.timestamp("ms", tz="UTC")))
+    return pa.schema(campi)
+
+
+def _stringa(valore):
+    # Come il connettore Spark con uno schema StringType: i valori non stringa vengono convertiti
+    if valore is None or isinstance(valore, str):
+        return valore
+    return str(valore)
+
+
+def _numero(valore):
+    # Come il connettore Spark con uno schema DoubleType: i valori non numerici diventano null
+    if isinstance(valore, (int, float)) and not isinstance(valore, bool):
+        return float(valore)
+    return None
+
+
+def tabella_interventi(documenti):
+    """Tabella Arrow con i soli campi usati dall'analisi, costruita da un iterabile di documenti."""
+    colonne = {campo: [] for campo in CAMPI_STRINGA}
+    numeri = {campo: [] for campo in CAMPI_NUMERICI}
+    ingeriti = []
+    for doc in documenti:
+        for campo, valori in colonne.items():
+            valori.append(_stringa(doc.get(campo)))
+        for campo, valori in numeri.items():
+            valori.append(_numero(doc.get(campo)))
+        ingeriti.append(doc.get("ingerito_il"))
+
+    # pymongo restituisce datetime senza fuso, già in UTC
+    ingeriti = [d.replace(tzinfo=timezone.utc) if d is not None and d.tzinfo is None else d for d in ingeriti]
+    array = [pa.array(colonne[campo], pa.string()) for campo in CAMPI_STRINGA]
+    array += [pa.array(numeri[campo], pa.float64()) for campo in CAMPI_NUMERICI]
+    array.append(pa.array(ingeriti, pa.timestamp("ms", tz="UTC")))
+    return pa.Table.from_arrays(array, schema=schema_interventi())
+
+
+def leggi_interventi(inizio, fine, uri=db.MONGO_URI):
+    """Documenti della finestra [inizio, fine) letti da MongoDB, già filtrati e proiettati dal server."""
+    client = db.crea_client(uri)
+    try:
+        collection = client[db.DB_NAME][db.COLLECTION_NAME]
+        cursore = collection.aggregate(pipeline_finestra(inizio, fine, data=lambda istante: istante), batchSize=LOTTO_CURSORE)
+        return tabella_interventi(cursore)
+    finally:
+        client.close()
+
+
+def documenti_snapshot(percorso):
+    """Documenti di un export su file: output di `mongoexport` (un documento per riga) o cartella di JSON.
+
+    I JSON di una cartella sono normalizzati come all'ingestione.
+    """
+    if os.path.isdir(percorso):
+        for file in sorted(glob.glob(os.path.join(percorso, "*.json"))):
+            with open(file, "r", encoding="utf-8") as f:
+                doc = json_util.loads(f.read())
+            if isinstance(doc, dict) and "normalizzazione" not in doc:
+                normalizzazione.normalizza_documento(doc)
+            yield doc
+        return
+
+    with open(percorso, "r", encoding="utf-8") as f:
+        inizio = f.read(1)
+        f.seek(0)
+        if inizio == "[":
+            # mongoexport --jsonArray
+            yield from json_util.loads(f.read())
+            return
+        for riga in f:
+            if riga.strip():
+                yield json_util.loads(riga)
+
+
+def leggi_snapshot(percorso, inizio, fine):
+    """Documenti della finestra [inizio, fine) letti da un export su file, con lo stesso filtro di MongoDB."""
+    tabella = tabella_interventi(documenti_snapshot(percorso))
+    ingerito = tabella["ingerito_il"]
+    dentro = pc.less(ingerito, pa.scalar(fine, pa.timestamp("ms", tz="UTC")))
+    if inizio is not None:
+        dentro = pc.and_(dentro, pc.greater_equal(ingerito, pa.scalar(inizio, pa.timestamp("ms", tz="UTC"))))
+    else:
+        dentro = pc.or_kleene(dentro, pc.is_null(ingerito))
+    return tabella.filter(dentro)
+
+
+# ----------------------------
+# Calcolo
+# ----------------------------
+# unix_timestamp(orario, "HH:mm") di Spark: secondi dall'epoch dell'orario su un giorno fisso.
+# I minuti normalizzati all'ingestione hanno la precedenza (come il coalesce del job Spark).
+SQL_ORARI = """
+CREATE TEMP MACRO secondi(orario) AS CAST(epoch(try_strptime(orario, '%H:%M')) AS DOUBLE);
+
+CREATE TEMP TABLE orari AS
+SELECT
+    citta,
+    ora_partenza_ambulanza,
+    ora_arrivo_ps,
+    coalesce(durata_minuti, round((secondi(ora_arrivo_ps) - secondi(ora_partenza_ambulanza)) / 60)) AS durata_minuti,
+    ora_chiamata,
+    ora_arrivo_sul_posto,
+    coalesce(tempo_di_intervento, round((secondi(ora_arrivo_sul_posto) - secondi(ora_chiamata)) / 60)) AS tempo_di_intervento
+FROM interventi;
+"""
+
+SQL_TEMPI = """
+SELECT ora_partenza_ambulanza, ora_arrivo_ps, durata_minuti,
+       ora_chiamata, ora_arrivo_sul_posto, tempo_di_intervento
+FROM orari
+"""
+
+# Classificazione rapido/lento sul tempo di intervento (chiamata -> arrivo sul posto)
+SQL_CONTEGGI = """
+SELECT citta,
+       count(*) AS totale_interventi,
+       CAST(count_if(tempo_di_intervento <= $soglia_rapido) AS BIGINT) AS interventi_rapidi,
+       CAST(count_if(tempo_di_intervento >= $soglia_lento) AS BIGINT) AS interventi_lenti
+FROM orari
+GROUP BY citta
+"""
+
+
+def calcola_tabella(tabella, soglia_rapido, soglia_lento):
+    """Tempi di occupazione e conteggi per città di una tabella di interventi (vedi analisi_spark.calcola)."""
+    import duckdb
+
+    with duckdb.connect() as connessione:
+        connessione.register("interventi", tabella)
+        connessione.execute(SQL_ORARI)
+        tempi = connessione.execute(SQL_TEMPI).df()
+        conteggi = connessione.execute(
+            SQL_CONTEGGI, {"soglia_rapido": soglia_rapido, "soglia_lento": soglia_lento}
+        ).df()
+    return tempi, conteggi
+
+
+def calcola(inizio, fine, soglia_rapido, soglia_lento, uri=db.MONGO_URI, snapshot=None):
+    """Calcola i risultati parziali della finestra [inizio, fine), come analisi_spark.calcola.
+
+    Con `snapshot` i documenti vengono letti dal file o dalla cartella indicati invece che da MongoDB.
+    """
+    if snapshot is not None:
+        tabella = leggi_snapshot(snapshot, inizio, fine)
+    else:
+        tabella = leggi_interventi(inizio, fine, uri)
+    return calcola_tabella(tabella, soglia_rapido, soglia_lento)
@@ -0,0 +1,114 @@
+import pandas as pd
+
+from metriche import FASCE_ETA, FASCIA_ETA_OLTRE
+
+# ----------------------------
+# Analitiche lato server (aggregation pipeline MongoDB)
+# ----------------------------
+# Le pipeline restituiscono solo le righe finali dei grafici: nessun documento
+# completo viene trasferito all'applicazione.
+
+
+def _fascia_eta_expr(campo):
+    """Espressione $switch che assegna la fascia d'età al valore numerico di `campo`."""
+    return {
+        "$switch": {
+            "branches": [
+                {"case": {"$lte": [campo, limite]}, "then": etichetta}
+                for limite, etichetta in FASCE_ETA
+            ],
+            "default": FASCIA_ETA_OLTRE,
+        }
+    }
+
+
+def pipeline_sintomi_frequenti(limite=15):
+    return [
+        {"$project": {"_id": 0, "sintomi": 1}},
+        {"$unwind": "$sintomi"},
+        {"$group": {"_id": "$sintomi", "frequenza": {"$sum": 1}}},
+        {"$sort": {"frequenza": -1, "_id": 1}},
+        {"$limit": limite},
+        {"$project": {"_id": 0, "Sintomo": "$_id", "Frequenza": "$frequenza"}},
+    ]
+
+
+def pipeline_sintomi_per_fascia_eta(top_sintomi=10):
+    return [
+        {"$match": {"sintomi": {"$exists": True}}},
+        {"$project": {
+            "_id": 0,
+            "sintomi": 1,
+            # Età numerica dell'ingestione (normalizzazione.py); per i documenti non normalizzati, conversione di `eta`
+            "eta": {"$ifNull": [
+                "$eta_anni",
+                {"$convert": {"input": "$eta", "to": "double", "onError": None, "onNull": None}},
+            ]},
+        }},
+        # Le età non riconosciute ("", "anziano") non appartengono a nessuna fascia
+        {"$match": {"eta": {"$ne": None}}},
+        {"$project": {"sintomi": 1, "fascia_eta": _fascia_eta_expr("$eta")}},
+        {"$unwind": "$sintomi"},
+        {"$group": {"_id": {"sintomo": "$sintomi", "fascia_eta": "$fascia_eta"}, "conteggio": {"$sum": 1}}},
+        # Si tengono solo i sintomi più frequenti sommando su tutte le fasce
+        {"$group": {
+            "_id": "$_id.sintomo",
+            "totale": {"$sum": "$conteggio"},
+            "fasce": {"$push": {"fascia_eta": "$_id.fascia_eta", "conteggio": "$conteggio"}},
+        }},
+        {"$sort": {"totale": -1, "_id": 1}},
+        {"$limit": top_sintomi},
+        {"$unwind": "$fasce"},
+        {"$project": {
+            "_id": 0,
+            "fascia_eta": "$fasce.fascia_eta",
+            "sintomi": "$_id",
+            "conteggio": "$fasce.conteggio",
+        }},
+    ]
+
+
+def pipeline_farmaci_frequenti(limite=15):
+    farmaco = "$farmaci_somministrati"
+    return [
+        {"$match": {"farmaci_somministrati": {"$type": "array"}}},
+        {"$project": {"_id": 0, "farmaci_somministrati": 1}},
+        {"$unwind": farmaco},
+        # Ogni farmaco può essere una stringa o un oggetto {"nome": ..., "dose": ...}
+        {"$project": {"nome": {"$switch": {
+            "branches": [
+                {"case": {"$eq": [{"$type": farmaco + ".nome"}, "string"]}, "then": {"$toLower": farmaco + ".nome"}},
+                {"case": {"$eq": [{"$type": farmaco}, "string"]}, "then": {"$toLower": farmaco}},
+            ],
+            "default": None,
+        }}}},
+        {"$match": {"nome": {"$ne": None}}},
+        {"$group": {"_id": "$nome", "frequenza": {"$sum": 1}}},
+        {"$sort": {"frequenza": -1, "_id": 1}},
+        {"$limit": limite},
+        {"$project": {"_id": 0, "Farmaco": "$_id", "Frequenza": "$frequenza"}},
+    ]
+
+
+def _esegui(collection, pipeline, colonne):
+    righe = list(collection.aggregate(pipeline, allowDiskUse=True))
+    return pd.DataFrame(righe, columns=colonne)
+
+
+def sintomi_frequenti(collection, limite=15):
+    """Sintomi più frequenti: colonne Sintomo, Frequenza."""
+    return _esegui(collection, pipeline_sintomi_frequenti(limite), ["Sintomo", "Frequenza"])
+
+
+def sintomi_per_fascia_eta(collection, top_sintomi=10):
+    """Conteggio dei sintomi più frequenti per fascia d'età: colonne fascia_eta, sintomi, conteggio."""
+    return _esegui(
+        collection,
+        pipeline_sintomi_per_fascia_eta(top_sintomi),
+        ["fascia_eta", "sintomi", "conteggio"],
+    )
+
+
+def farmaci_frequenti(collection, limite=15):
+    """Farmaci più somministrati (nomi in minuscolo): colonne Farmaco, Frequenza."""
+    return _esegui(collection, pipeline_farmaci_frequenti(limite), ["Farmaco", "Frequenza"])
@@ -0,0 +1,120 @@
+import json
+import os
+
+import db
+
+# ----------------------------
+# Motore Spark per i job di analisi
+# ----------------------------
+SPARK_PACKAGE = "org.mongodb.spark:mongo-spark-connector_2.12:10.5.0"
+
+# Campi letti da MongoDB: il connettore usa questo schema invece di campionare la collezione
+CAMPI_STRINGA = [
+    "citta",
+    "ora_chiamata",
+    "ora_partenza_ambulanza",
+    "ora_arrivo_sul_posto",
+    "ora_arrivo_ps",
+]
+
+# Minuti già calcolati all'ingestione (normalizzazione.py), con il passaggio della mezzanotte;
+# per i documenti non ancora normalizzati si ricalcolano dagli orari
+CAMPI_NUMERICI = [
+    "durata_minuti",
+    "tempo_di_intervento",
+]
+
+
+def schema_interventi():
+    from pyspark.sql.types import DoubleType, StringType, StructField, StructType, TimestampType
+
+    campi = [StructField(nome, StringType(), True) for nome in CAMPI_STRINGA]
+    campi += [StructField(nome, DoubleType(), True) for nome in CAMPI_NUMERICI]
+    campi.append(StructField("ingerito_il", TimestampType(), True))
+    return StructType(campi)
+
+
+def crea_sessione(uri=db.MONGO_URI):
+    from pyspark.sql import SparkSession
+
+    os.environ.setdefault("PYSPARK_SUBMIT_ARGS", f"--packages {SPARK_PACKAGE} pyspark-shell")
+    return SparkSession.builder \
+        .appName("ClinicalDataAnalysis") \
+        .config("spark.jars.packages", SPARK_PACKAGE) \
+        .config("spark.mongodb.read.connection.uri", f"{uri}/{db.DB_NAME}.{db.COLLECTION_NAME}") \
+        .getOrCreate()
+
+
+def _data_estesa(istante):
+    """Data in Extended JSON canonico (millisecondi dall'epoch), come richiesto dal connettore."""
+    return {"$date": {"$numberLong": str(int(istante.timestamp() * 1000))}}
+
+
+def pipeline_finestra(inizio, fine, data=_data_estesa):
+    """Filtro e proiezione eseguiti da MongoDB prima di inviare i documenti a Spark.
+
+    Vengono letti solo i documenti con `inizio <= ingerito_il < fine`; con
+    `inizio=None` si leggono anche i documenti caricati prima dell'introduzione
+    del campo `ingerito_il`. `data` converte gli istanti nel formato del client
+    (Extended JSON per il connettore, `datetime` per pymongo).
+    """
+    condizione = {"$lt": data(fine)}
+    if inizio is not None:
+        condizione["$gte"] = data(inizio)
+        filtro = {"ingerito_il": condizione}
+    else:
+        filtro = {"$or": [{"ingerito_il": condizione}, {"ingerito_il": {"$exists": False}}]}
+
+    proiezione = {campo: 1 for campo in CAMPI_STRINGA + CAMPI_NUMERICI + ["ingerito_il"]}
+    proiezione["_id"] = 0
+    return [{"$match": filtro}, {"$project": proiezione}]
+
+
+def leggi_interventi(spark, inizio, fine, uri=db.MONGO_URI):
+    return spark.read \
+        .format("mongodb") \
+        .option("connection.uri", uri) \
+        .option("database", db.DB_NAME) \
+        .option("collection", db.COLLECTION_NAME) \
+        .option("aggregation.pipeline", json.dumps(pipeline_finestra(inizio, fine))) \
+        .schema(schema_interventi()) \
+        .load()
+
+
+def calcola(inizio, fine, soglia_rapido, soglia_lento, spark=None, uri=db.MONGO_URI):
+    """Calcola i risultati parziali della finestra [inizio, fine).
+
+    Restituisce due DataFrame pandas: le righe dei tempi di occupazione dei nuovi
+    interventi e i conteggi parziali per città (totale, rapidi, lenti).
+    """
+    from pyspark.sql.functions import coalesce, col, count, round, sum, unix_timestamp, when
+
+    spark = spark or crea_sessione(uri)
+    df = leggi_interventi(spark, inizio, fine, uri)
+
+    # Minuti normalizzati all'ingestione; altrimenti differenza tra gli orari convertiti in timestamp
+    df = df.withColumn("partenza_ts", unix_timestamp(col("ora_partenza_ambulanza"), "HH:mm")) \
+           .withColumn("arrivo_ts", unix_timestamp(col("ora_arrivo_ps"), "HH:mm")) \
+           .withColumn("chiamata_ts", unix_timestamp(col("ora_chiamata"), "HH:mm")) \
+           .withColumn("ora_intervento", unix_timestamp(col("ora_arrivo_sul_posto"), "HH:mm")) \
+           .withColumn("durata_minuti", coalesce(col("durata_minuti"), round((col("arrivo_ts") - col("partenza_ts")) / 60))) \
+           .withColumn("tempo_di_intervento",
+                       coalesce(col("tempo_di_intervento"), round((col("ora_intervento") - col("chiamata_ts")) / 60))) \
+           .cache()
+
+    tempi = df.select(
+        "ora_partenza_ambulanza", "ora_arrivo_ps", "durata_minuti",
+        "ora_chiamata", "ora_arrivo_sul_posto", "tempo_di_intervento",
+    ).toPandas()
+
+    # Classificazione rapido/lento sul tempo di intervento (chiamata -> arrivo sul posto)
+    conteggi = df.withColumn("is_rapido", when(col("tempo_di_intervento") <= soglia_rapido, 1).otherwise(0)) \
+                 .withColumn("is_lento", when(col("tempo_di_intervento") >= soglia_lento, 1).otherwise(0)) \
+                 .groupBy("citta").agg(
+                     count("*").alias("totale_interventi"),
+                     sum("is_rapido").alias("interventi_rapidi"),
+                     sum("is_lento").alias("interventi_lenti"),
+                 ).toPandas()
+
+    df.unpersist()
+    return tempi, conteggi
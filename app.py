@@ -1,10 +1,11 @@
+import time
+from functools import wraps
+
 import streamlit as st
 import pandas as pd
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
-import pydeck as pdk
-import altair as alt
-import pymongo
+
+import app_data
+import strumentazione
 
 # ----------------------------
 # Sidebar per selezione pagina
@@ -14,6 +15,36 @@ pagina = st.sidebar.selectbox(
     ["Ambulanze", "Pazienti"]
 )
 
+# ----------------------------
+# Sezioni con rerun indipendente
+# ----------------------------
+# Ogni sezione è un frammento Streamlit: un'interazione con i suoi widget riesegue solo
+# la sezione, non l'intera pagina. I dati arrivano già pronti dalle cache di app_data;
+# altair e pydeck vengono importati dalle sezioni che disegnano i grafici.
+def debug_attivo():
+    return strumentazione.DEBUG or st.query_params.get("debug") == "1"
+
+
+def sezione(nome, errore=None):
+    """Frammento misurato come span (nome, "totale"); con `errore`, le eccezioni diventano un messaggio."""
+    def decoratore(funzione):
+        @st.fragment
+        @wraps(funzione)
+        def frammento(*args, **kwargs):
+            inizio = time.perf_counter()
+            with strumentazione.rerun_frammento(f"{pagina}/{nome}"), strumentazione.span(nome, "totale"):
+                try:
+                    funzione(*args, **kwargs)
+                except Exception as e:
+                    if errore is None:
+                        raise
+                    st.error(f"{errore}: {e}")
+            if debug_attivo():
+                st.caption(f"⏱️ {nome}: {(time.perf_counter() - inizio) * 1000:.0f} ms")
+        return frammento
+    return decoratore
+
+
 # ----------------------------
 # Funzione: Pagina Ambulanze
 # ----------------------------
@@ -32,6 +63,15 @@ def pagina_ambulanze():
         unsafe_allow_html=True
     )
 
+    sezione_mappa()
+    sezione_tempi()
+    sezione_distribuzione()
+    sezione_fasce_orarie()
+    sezione_decessi()
+
+
+@sezione("mappa")
+def sezione_mappa():
     st.markdown("<h2 style='color:#B22222;'>Mappa delle Città</h2>", unsafe_allow_html=True)
 
     st.markdown(
@@ -44,36 +84,10 @@ def pagina_ambulanze():
         unsafe_allow_html=True
     )
 
-    df = pd.read_csv("output/top_citta_interventi.csv")
-
-    geolocator = Nominatim(user_agent="my_geocoder")
-    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
-
-    @st.cache_data(show_spinner=False)
-    def get_coordinates(city_name):
-        location = geocode(city_name + ", Italy")
-        if location:
-            return location.latitude, location.longitude
-        else:
-            return None, None
-
-    if 'lat' not in df.columns or 'lon' not in df.columns:
-        df['lat'] = None
-        df['lon'] = None
-        for i, row in df.iterrows():
-            lat, lon = get_coordinates(row['citta'])
-            df.at[i, 'lat'] = lat
-            df.at[i, 'lon'] = lon
-
-    df_map = df.dropna(subset=['lat', 'lon'])
+    df_map = app_data.dati_sezione("mappa")
 
     if not df_map.empty:
-        max_count = df_map['count'].max()
-        def scale_radius(count):
-            base = 3000
-            scale = 15000
-            return base + (count / max_count) * scale
-        df_map['radius'] = df_map['count'].apply(scale_radius)
+        import pydeck as pdk
 
         layer = pdk.Layer(
             'ScatterplotLayer',
@@ -98,10 +112,14 @@ def pagina_ambulanze():
             tooltip={"text": "{citta}\nInterventi: {count}"}
         )
 
-        st.pydeck_chart(r)
+        with strumentazione.span("mappa", "grafico"):
+            st.pydeck_chart(r)
     else:
         st.warning("Non è stato possibile geocodificare le città per mostrarle sulla mappa.")
 
+
+@sezione("tempi")
+def sezione_tempi():
     st.markdown("<h2 style='color:#B22222;'>Quanto Tempo Richiedono gli Interventi?</h2>", unsafe_allow_html=True)
 
     st.markdown(
@@ -129,37 +147,18 @@ def pagina_ambulanze():
         unsafe_allow_html=True
     )
 
-    df_tempo = pd.read_csv("output/tempi_occupazione_ambulanza.csv")
-    df_tempo['durata_minuti'] = pd.to_numeric(df_tempo['durata_minuti'], errors='coerce')
-    df_tempo = df_tempo[df_tempo['durata_minuti'] >= 0]
-
-    def fascia_temporale(d):
-        if d <= 10:
-            return '≤10 min'
-        elif d <= 20:
-            return '11–20 min'
-        elif d <= 30:
-            return '21–30 min'
-        else:
-            return '>30 min'
-
-    df_tempo['fascia'] = df_tempo['durata_minuti'].apply(fascia_temporale)
-
-    df_fasce = df_tempo['fascia'].value_counts().reset_index()
-    df_fasce.columns = ['fascia', 'conteggio']
-    ordine = ['≤10 min', '11–20 min', '21–30 min', '>30 min']
-    df_fasce['fascia'] = pd.Categorical(df_fasce['fascia'], categories=ordine, ordered=True)
-    df_fasce = df_fasce.sort_values('fascia')
+    df_fasce, media_durata = app_data.dati_sezione("tempi")
 
-    chart = alt.Chart(df_fasce).mark_bar(color='#B22222').encode(
-        x=alt.X('fascia:N', title='Tempo occupazione ambulanza'),
-        y=alt.Y('conteggio:Q', title='Numero di Ambulanze'),
-        tooltip=['fascia', 'conteggio']
-    ).properties(width=600, height=400)
+    with strumentazione.span("tempi", "grafico"):
+        import altair as alt
 
-    st.altair_chart(chart, use_container_width=True)
+        chart = alt.Chart(df_fasce).mark_bar(color='#B22222').encode(
+            x=alt.X('fascia:N', title='Tempo occupazione ambulanza'),
+            y=alt.Y('conteggio:Q', title='Numero di Ambulanze'),
+            tooltip=['fascia', 'conteggio']
+        ).properties(width=600, height=400)
 
-    media_durata = df_tempo['tempo_di_intervento'].mean()
+        st.altair_chart(chart, use_container_width=True)
 
     st.markdown("<h3 style='color:#B22222; margin-bottom:10px;'>Tempo medio di intervento</h3>", unsafe_allow_html=True)
 
@@ -195,6 +194,9 @@ def pagina_ambulanze():
     
     st.markdown(f"<p style='color:#444; font-size:15px; margin-bottom:20px;'>{messaggio}</p>", unsafe_allow_html=True)
 
+
+@sezione("distribuzione")
+def sezione_distribuzione():
     st.markdown("<h3 style='color:#B22222; margin-bottom:10px;'>Distribuzione delle Ambulanze Veloci e Lente per Città</h3>", unsafe_allow_html=True)
 
     st.markdown(
@@ -206,43 +208,31 @@ def pagina_ambulanze():
         unsafe_allow_html=True
     )
 
-    df_dist = pd.read_csv("output/distribuzione_ambulanze_estreme.csv")
-
-    if not df_dist.empty:
-        # Calcola la percentuale mancante (fascia media)
-        df_dist["percentuale_fascia_media"] = 100 - df_dist["percentuale_rapidi"] - df_dist["percentuale_lenti"]
-
-        # Melting per trasformare in formato long
-        df_melted = df_dist.melt(
-            id_vars=['citta'], 
-            value_vars=['percentuale_rapidi', 'percentuale_fascia_media', 'percentuale_lenti'],
-            var_name='Tipo', 
-            value_name='Percentuale'
-        )
-
-        # Rinomina le etichette
-        df_melted['Tipo'] = df_melted['Tipo'].map({
-            'percentuale_rapidi': 'Ambulanze Veloci (≤8 min)',
-            'percentuale_fascia_media': 'Ambulanze in Fascia Media (9–19 min)',
-            'percentuale_lenti': 'Ambulanze Lente (≥20 min)'
-        })
+    df_melted = app_data.dati_sezione("distribuzione")
 
+    if not df_melted.empty:
         # Colori personalizzati: blu, verde, arancione
         colori = ['#1f77b4', '#2ca02c', '#ff7f0e']
 
         # Grafico
-        chart_dist = alt.Chart(df_melted).mark_bar().encode(
-            x=alt.X('citta:N', sort='-y', title='Città'),
-            y=alt.Y('Percentuale:Q', title='Percentuale (%)'),
-            color=alt.Color('Tipo:N', scale=alt.Scale(range=colori), legend=alt.Legend(title="Tipo Ambulanze")),
-            tooltip=['citta', 'Tipo', alt.Tooltip('Percentuale', format='.2f')]
-        ).properties(width=700, height=400)
+        with strumentazione.span("distribuzione", "grafico"):
+            import altair as alt
+
+            chart_dist = alt.Chart(df_melted).mark_bar().encode(
+                x=alt.X('citta:N', sort='-y', title='Città'),
+                y=alt.Y('Percentuale:Q', title='Percentuale (%)'),
+                color=alt.Color('Tipo:N', scale=alt.Scale(range=colori), legend=alt.Legend(title="Tipo Ambulanze")),
+                tooltip=['citta', 'Tipo', alt.Tooltip('Percentuale', format='.2f')]
+            ).properties(width=700, height=400)
 
-        st.altair_chart(chart_dist, use_container_width=True)
+            st.altair_chart(chart_dist, use_container_width=True)
 
     else:
         st.info("Il file con la distribuzione delle ambulanze estreme non è disponibile.")
 
+
+@sezione("fasce_orarie")
+def sezione_fasce_orarie():
     st.markdown("<h4 style='color:#B22222; margin-top:40px;'>Volume di Interventi per Fascia Oraria</h4>", unsafe_allow_html=True)
 
     st.markdown(
@@ -255,45 +245,19 @@ def pagina_ambulanze():
         unsafe_allow_html=True
     )
 
-    # Converte le ore in formato datetime
-    df_tempo['ora_chiamata'] = pd.to_datetime(df_tempo['ora_chiamata'], format="%H:%M", errors='coerce')
-
-    # Filtra righe valide
-    df_orari = df_tempo.dropna(subset=['ora_chiamata']).copy()
-
-    # Definizione fasce orarie
-    def fascia_oraria(h):
-        if 6 <= h < 10:
-            return "06:00 - 09:59"
-        elif 10 <= h < 14:
-            return "10:00 - 13:59"
-        elif 14 <= h < 18:
-            return "14:00 - 17:59"
-        elif 18 <= h < 22:
-            return "18:00 - 21:59"
-        elif 22 <= h or h < 2:
-            return "22:00 - 01:59"
-        else:
-            return "02:00 - 05:59"
-
-    # Applica la fascia oraria
-    df_orari['fascia_oraria'] = df_orari['ora_chiamata'].dt.hour.apply(fascia_oraria)
-
-    # Conta gli interventi per fascia
-    df_interventi = df_orari['fascia_oraria'].value_counts().reset_index()
-    df_interventi.columns = ['Fascia Oraria', 'Numero Interventi']
-    ordine_fasce = ["06:00 - 09:59", "10:00 - 13:59", "14:00 - 17:59", "18:00 - 21:59", "22:00 - 01:59", "02:00 - 05:59"]
-    df_interventi['Fascia Oraria'] = pd.Categorical(df_interventi['Fascia Oraria'], categories=ordine_fasce, ordered=True)
-    df_interventi = df_interventi.sort_values('Fascia Oraria')
+    df_interventi = app_data.dati_sezione("fasce_orarie")
 
     # Grafico Altair
-    chart_volume = alt.Chart(df_interventi).mark_bar(color='#B22222').encode(
-        x=alt.X("Fascia Oraria:N", title="Fascia Oraria"),
-        y=alt.Y("Numero Interventi:Q", title="Numero di Interventi"),
-        tooltip=["Fascia Oraria", "Numero Interventi"]
-    ).properties(width=600, height=400)
+    with strumentazione.span("fasce_orarie", "grafico"):
+        import altair as alt
 
-    st.altair_chart(chart_volume, use_container_width=True)
+        chart_volume = alt.Chart(df_interventi).mark_bar(color='#B22222').encode(
+            x=alt.X("Fascia Oraria:N", title="Fascia Oraria"),
+            y=alt.Y("Numero Interventi:Q", title="Numero di Interventi"),
+            tooltip=["Fascia Oraria", "Numero Interventi"]
+        ).properties(width=600, height=400)
+
+        st.altair_chart(chart_volume, use_container_width=True)
 
     st.markdown(
         """
@@ -306,6 +270,8 @@ def pagina_ambulanze():
     )
 
 
+@sezione("decessi", errore="Errore durante il recupero dei dati dal database")
+def sezione_decessi():
     st.markdown("<h2 style='color:#B22222;'>Eventi Critici: Decessi sul Posto</h2>", unsafe_allow_html=True)
 
     st.markdown(
@@ -319,55 +285,40 @@ def pagina_ambulanze():
         unsafe_allow_html=True
     )
 
-    try:
-        client = pymongo.MongoClient("mongodb://localhost:27017/")
-        db = client["cartella_clinica_db"]
-        collection = db["interventi"]
-        dati = list(collection.find({}, {"decesso_sul_posto": 1, "citta": 1}))
+    dati_decessi = app_data.dati_sezione("decessi")
 
-        if not dati:
-            st.warning("Nessun dato disponibile sugli esiti degli interventi.")
-        else:
-            df = pd.DataFrame(dati)
-
-            totale_interventi = len(df)
-            decessi_sul_posto = df[df["decesso_sul_posto"] == True]
-            numero_decessi = len(decessi_sul_posto)
-            percentuale_nazionale = (numero_decessi / totale_interventi) * 100 if totale_interventi > 0 else 0
-
-            st.markdown("<h3 style='color:#B22222; margin-bottom:10px;'>Percentuale Nazionale di Decessi sul Posto</h3>", unsafe_allow_html=True)
-            st.metric("Decessi sul posto", f"{percentuale_nazionale:.2f}%")
-
-            st.markdown(
-                """
-                <p style='color:#444; font-size:15px; margin-bottom:20px;'>
-                Questa percentuale indica quanti interventi si sono conclusi con un decesso prima del trasporto ospedaliero. 
-                Un valore elevato potrebbe indicare condizioni gravi alla chiamata, ritardi nei soccorsi o mancanza di risorse tempestive.
-                </p>
-                """,
-                unsafe_allow_html=True
-            )
+    if dati_decessi is None:
+        st.warning("Nessun dato disponibile sugli esiti degli interventi.")
+        return
 
-            st.markdown("<h3 style='color:#B22222; margin-bottom:10px;'>Distribuzione per Città</h3>", unsafe_allow_html=True)
+    percentuale_nazionale, df_merge = dati_decessi
 
-            df["citta"] = df["citta"].fillna("Non specificata")
-            df_citta = df.groupby("citta").size().reset_index(name="interventi_totali")
-            df_citta_decessi = decessi_sul_posto.groupby("citta").size().reset_index(name="decessi")
-            df_merge = pd.merge(df_citta, df_citta_decessi, on="citta", how="left").fillna(0)
-            df_merge["percentuale"] = (df_merge["decessi"] / df_merge["interventi_totali"]) * 100
-            # Ordina e mostra solo le città con almeno 1 decesso
-            df_merge = df_merge[df_merge["decessi"] > 0]
+    st.markdown("<h3 style='color:#B22222; margin-bottom:10px;'>Percentuale Nazionale di Decessi sul Posto</h3>", unsafe_allow_html=True)
+    st.metric("Decessi sul posto", f"{percentuale_nazionale:.2f}%")
 
-            chart_decessi = alt.Chart(df_merge.sort_values("percentuale", ascending=False).head(15)).mark_bar(color="#B22222").encode(
-                x=alt.X("percentuale:Q", title="Percentuale (%)"),
-                y=alt.Y("citta:N", title="Città", sort="-x"),
-                tooltip=["citta", "decessi", "interventi_totali", alt.Tooltip("percentuale", format=".2f")]
-            ).properties(width=700, height=400)
+    st.markdown(
+        """
+        <p style='color:#444; font-size:15px; margin-bottom:20px;'>
+        Questa percentuale indica quanti interventi si sono conclusi con un decesso prima del trasporto ospedaliero. 
+        Un valore elevato potrebbe indicare condizioni gravi alla chiamata, ritardi nei soccorsi o mancanza di risorse tempestive.
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
 
-            st.altair_chart(chart_decessi, use_container_width=True)
+    st.markdown("<h3 style='color:#B22222; margin-bottom:10px;'>Distribuzione per Città</h3>", unsafe_allow_html=True)
+
+    with strumentazione.span("decessi", "grafico"):
+        import altair as alt
+
+        chart_decessi = alt.Chart(df_merge.sort_values("percentuale", ascending=False).head(15)).mark_bar(color="#B22222").encode(
+            x=alt.X("percentuale:Q", title="Percentuale (%)"),
+            y=alt.Y("citta:N", title="Città", sort="-x"),
+            tooltip=["citta", "decessi", "interventi_totali", alt.Tooltip("percentuale", format=".2f")]
+        ).properties(width=700, height=400)
+
+        st.altair_chart(chart_decessi, use_container_width=True)
 
-    except Exception as e:
-        st.error(f"Errore durante il recupero dei dati dal database: {e}")
 
 # ----------------------------
 # Funzione: Pagina Pazienti
@@ -386,50 +337,75 @@ def pagina_pazienti():
     )
 
     try:
-        client = pymongo.MongoClient("mongodb://localhost:27017/")
-        db = client["cartella_clinica_db"]  
-        collection = db["interventi"]  
-
-        dati = list(collection.find())
-        if not dati:
+        if app_data.interroga("collezione_vuota"):
             st.warning("Nessun dato trovato nella collezione.")
             return
+    except Exception as e:
+        st.error(f"Errore nella connessione al database: {e}")
+        return
 
-        df = pd.DataFrame(dati)
+    sezione_ricerca_paziente()
+    sezione_sintomi()
+    sezione_fasce_eta()
+    sezione_farmaci()
 
-        # Sidebar: ricerca paziente con autocomplete simulato
-        st.sidebar.markdown("### 🔍 Cerca paziente")
 
-        pazienti_unici = sorted(df["cognome_nome_paziente"].dropna().unique().tolist())
+@sezione("ricerca_paziente", errore="Errore nella connessione al database")
+def sezione_ricerca_paziente():
+    # Sidebar: ricerca paziente con autocomplete simulato.
+    # I widget sono scritti nella sidebar dal frammento: digitare riesegue solo la ricerca e la scheda.
+    st.sidebar.markdown("### 🔍 Cerca paziente")
 
-        input_nome = st.sidebar.text_input("Digita nome o cognome")
+    input_nome = st.sidebar.text_input("Digita nome o cognome")
 
+    with strumentazione.span("ricerca", "caricamento"):
         if input_nome:
-            risultati = [p for p in pazienti_unici if input_nome.lower() in p.lower()]
+            risultati = app_data.indice_pazienti().cerca(input_nome)
         else:
             risultati = []
 
-        if not risultati and input_nome:
-            risultati = ["⚠️ Nessun paziente trovato"]
-
-        selezionato = st.sidebar.selectbox("Seleziona un paziente", risultati)
-
-        # Visualizza dettagli solo se selezionato paziente valido
-        if selezionato and selezionato != "⚠️ Nessun paziente trovato":
-            st.subheader(f"📄 Dettagli per: {selezionato}")
-            dati_paziente = df[df["cognome_nome_paziente"] == selezionato]
-
-            st.write(f"Totale interventi registrati: {len(dati_paziente)}")
-            st.dataframe(dati_paziente.drop(columns=["_id"]))
-
-        # --- Visualizzazioni generali sintomi ---
-        st.subheader("Sintomi più frequenti")
-        if "sintomi" in df.columns:
-            sintomi_espansi = df.explode("sintomi")
-            sintomi_freq = sintomi_espansi["sintomi"].value_counts().reset_index()
-            sintomi_freq.columns = ["Sintomo", "Frequenza"]
-
-            chart_sintomi = alt.Chart(sintomi_freq.head(15)).mark_bar(color="#6A5ACD").encode(
+    if not risultati and input_nome:
+        risultati = ["⚠️ Nessun paziente trovato"]
+
+    selezionato = st.sidebar.selectbox("Seleziona un paziente", risultati)
+
+    # Visualizza dettagli solo se selezionato paziente valido
+    if selezionato and selezionato != "⚠️ Nessun paziente trovato":
+        st.subheader(f"📄 Dettagli per: {selezionato}")
+        with strumentazione.span("scheda_paziente", "caricamento"):
+            dati_paziente = app_data.interroga("interventi_paziente", nome=selezionato)
+
+        st.write(f"Totale interventi registrati: {len(dati_paziente)}")
+        with strumentazione.span("scheda_paziente", "grafico"):
+            st.dataframe(dati_paziente)
+
+        # Il PDF viene letto da GridFS solo quando si preme il pulsante
+        if "numero_intervento" in dati_paziente:
+            numeri = [n for n in dati_paziente["numero_intervento"].dropna().unique() if n]
+            with strumentazione.span("scheda_paziente", "pdf"):
+                disponibili = sorted(app_data.pdf_disponibili(numeri))
+            for numero in disponibili:
+                st.download_button(
+                    f"📥 Cartella clinica {numero} (PDF)",
+                    data=lambda numero=numero: app_data.contenuto_pdf(numero),
+                    file_name=f"cartella_{numero}.pdf",
+                    mime="application/pdf",
+                    key=f"pdf_{numero}",
+                )
+
+
+# --- Visualizzazioni generali sintomi ---
+# Le aggregazioni sono calcolate da MongoDB: l'app riceve solo le righe dei grafici
+@sezione("sintomi", errore="Errore nella connessione al database")
+def sezione_sintomi():
+    st.subheader("Sintomi più frequenti")
+    with strumentazione.span("sintomi", "caricamento"):
+        sintomi_freq = app_data.interroga("sintomi_frequenti", limite=15)
+    if not sintomi_freq.empty:
+        with strumentazione.span("sintomi", "grafico"):
+            import altair as alt
+
+            chart_sintomi = alt.Chart(sintomi_freq).mark_bar(color="#6A5ACD").encode(
                 x=alt.X("Frequenza:Q"),
                 y=alt.Y("Sintomo:N", sort='-x'),
                 tooltip=["Sintomo", "Frequenza"]
@@ -437,28 +413,16 @@ def pagina_pazienti():
 
             st.altair_chart(chart_sintomi, use_container_width=True)
 
-        st.subheader("Sintomi più frequenti per fascia d'età")
-
-        if "eta" in df.columns and "sintomi" in df.columns:
-            df_eta = df[df["eta"].notnull()]
-            df_eta["eta"] = pd.to_numeric(df_eta["eta"], errors="coerce")
-
-            def fascia_eta(e):
-                if e <= 18:
-                    return "0–18"
-                elif e <= 35:
-                    return "19–35"
-                elif e <= 60:
-                    return "36–60"
-                else:
-                    return "60+"
 
-            df_eta["fascia_eta"] = df_eta["eta"].apply(fascia_eta)
-            df_exploded = df_eta.explode("sintomi")
-            df_gruppo = df_exploded.groupby(["fascia_eta", "sintomi"]).size().reset_index(name="conteggio")
+@sezione("fasce_eta", errore="Errore nella connessione al database")
+def sezione_fasce_eta():
+    st.subheader("Sintomi più frequenti per fascia d'età")
 
-            top_sintomi = df_gruppo.groupby("sintomi")["conteggio"].sum().nlargest(10).index
-            df_gruppo_top = df_gruppo[df_gruppo["sintomi"].isin(top_sintomi)]
+    with strumentazione.span("fasce_eta", "caricamento"):
+        df_gruppo_top = app_data.interroga("sintomi_per_fascia_eta", top_sintomi=10)
+    if not df_gruppo_top.empty:
+        with strumentazione.span("fasce_eta", "grafico"):
+            import altair as alt
 
             chart_fasce = alt.Chart(df_gruppo_top).mark_bar().encode(
                 x=alt.X("conteggio:Q", title="Frequenza"),
@@ -468,61 +432,94 @@ def pagina_pazienti():
             ).properties(width=700, height=400)
 
             st.altair_chart(chart_fasce, use_container_width=True)
-        else:
-            st.info("Dati insufficienti per analizzare sintomi per età.")
+    else:
+        st.info("Dati insufficienti per analizzare sintomi per età.")
 
-        st.subheader("Farmaci più somministrati")
 
-        st.markdown(
-            """
-            Questo grafico mostra i farmaci più comunemente somministrati durante gli interventi.
-            Queste informazioni sono utili per identificare quali farmaci devono sempre essere disponibili a bordo delle ambulanze, 
-            per garantire un intervento rapido ed efficace.
-            """
-        )
+@sezione("farmaci", errore="Errore nella connessione al database")
+def sezione_farmaci():
+    st.subheader("Farmaci più somministrati")
 
-        if "farmaci_somministrati" in df.columns:
-            # Funzione per estrarre i nomi farmaci da ogni record
-            def estrai_farmaci(record):
-                farmaci = record
-                if isinstance(farmaci, list):
-                    nomi = []
-                    for f in farmaci:
-                        if isinstance(f, dict) and "nome" in f:
-                            nomi.append(f["nome"].lower())
-                        elif isinstance(f, str):
-                            nomi.append(f.lower())
-                    return nomi
-                return []
-
-            # Applica la funzione per creare una lista espansa di farmaci
-            farmaci_espansi = df["farmaci_somministrati"].apply(estrai_farmaci).explode().dropna()
-
-            if not farmaci_espansi.empty:
-                farmaci_freq = farmaci_espansi.value_counts().reset_index()
-                farmaci_freq.columns = ["Farmaco", "Frequenza"]
-
-                chart_farmaci = alt.Chart(farmaci_freq.head(15)).mark_bar(color="#FF6F61").encode(
-                    x=alt.X("Frequenza:Q"),
-                    y=alt.Y("Farmaco:N", sort='-x'),
-                    tooltip=["Farmaco", "Frequenza"]
-                ).properties(width=700, height=400)
-
-                st.altair_chart(chart_farmaci, use_container_width=True)
-            else:
-                st.info("Nessun dato disponibile sui farmaci somministrati.")
-        else:
-            st.info("Campo 'farmaci_somministrati' non presente nel database.")
+    st.markdown(
+        """
+        Questo grafico mostra i farmaci più comunemente somministrati durante gli interventi.
+        Queste informazioni sono utili per identificare quali farmaci devono sempre essere disponibili a bordo delle ambulanze, 
+        per garantire un intervento rapido ed efficace.
+        """
+    )
 
-    except Exception as e:
-        st.error(f"Errore nella connessione al database: {e}")
+    with strumentazione.span("farmaci", "caricamento"):
+        farmaci_freq = app_data.interroga("farmaci_frequenti", limite=15)
+    if not farmaci_freq.empty:
+        with strumentazione.span("farmaci", "grafico"):
+            import altair as alt
 
+            chart_farmaci = alt.Chart(farmaci_freq).mark_bar(color="#FF6F61").encode(
+                x=alt.X("Frequenza:Q"),
+                y=alt.Y("Farmaco:N", sort='-x'),
+                tooltip=["Farmaco", "Frequenza"]
+            ).properties(width=700, height=400)
+
+            st.altair_chart(chart_farmaci, use_container_width=True)
+    else:
+        st.info("Nessun dato disponibile sui farmaci somministrati.")
+
+
+# ----------------------------
+# Pannello prestazioni (debug)
+# ----------------------------
+def pannello_prestazioni(rerun):
+    """Tempi dell'ultimo rerun per sezione e fase, comandi MongoDB e hit delle cache; solo con ?debug=1."""
+    with st.sidebar.expander("⏱️ Prestazioni", expanded=True):
+        st.metric("Rerun", f"{rerun.secondi * 1000:.0f} ms")
+
+        if rerun.span:
+            df_span = pd.DataFrame(rerun.span, columns=["sezione", "fase", "secondi"])
+            df_span = df_span.groupby(["sezione", "fase"], sort=False, as_index=False)["secondi"].sum()
+            df_span["ms"] = (df_span.pop("secondi") * 1000).round(1)
+            st.dataframe(df_span, hide_index=True)
+
+        if rerun.comandi:
+            df_mongo = pd.DataFrame(rerun.comandi, columns=["comando", "secondi", "byte", "errore"])
+            df_mongo = df_mongo.groupby("comando", as_index=False).agg(
+                comandi=("secondi", "size"), secondi=("secondi", "sum"), byte=("byte", "sum"), errori=("errore", "sum")
+            )
+            df_mongo["ms"] = (df_mongo.pop("secondi") * 1000).round(1)
+            if not strumentazione.MISURA_BYTE:
+                df_mongo = df_mongo.drop(columns="byte")
+            st.caption("MongoDB (questo rerun)")
+            st.dataframe(df_mongo, hide_index=True)
+        else:
+            st.caption("MongoDB: nessun comando in questo rerun (risultati dalla cache)")
+
+        hit = strumentazione.REGISTRO.hit_cache()
+        if hit:
+            df_cache = pd.DataFrame(
+                [(nome, richieste, percentuale) for nome, (richieste, _, percentuale) in sorted(hit.items())],
+                columns=["cache", "richieste", "hit %"],
+            ).round(1)
+            st.caption("Cache (dall'avvio del processo)")
+            st.dataframe(df_cache, hide_index=True)
+
+        st.download_button(
+            "Metriche Prometheus",
+            data=strumentazione.esporta_prometheus(),
+            file_name="metriche.prom",
+            mime="text/plain",
+        )
 
 
 # ----------------------------
 # Logica di navigazione
 # ----------------------------
+app_data.avvia_metriche()
+rerun = strumentazione.inizia_rerun(pagina)
+
 if pagina == "Ambulanze":
     pagina_ambulanze()
 elif pagina == "Pazienti":
     pagina_pazienti()
+
+strumentazione.termina_rerun()
+if strumentazione.DEBUG or st.query_params.get("debug") == "1":
+    pannello_prestazioni(rerun)
@@ -0,0 +1,280 @@
+import pandas as pd
+import streamlit as st
+
+import analisi_mongo
+import metriche
+import ricerca_pazienti
+import risultati
+import strumentazione
+from gazetteer import Gazetteer
+
+# ----------------------------
+# Accesso ai dati per l'app Streamlit
+# ----------------------------
+# Un solo client MongoDB (con pool) per tutto il processo e risultati delle query
+# in cache, indicizzati per forma della query e versione della collezione
+# `interventi`: la cache si invalida solo quando l'ingestione modifica i dati.
+# db e archivio_pdf (cioè pymongo e gridfs) sono importati solo alla prima query:
+# le sezioni che leggono gli output delle analisi vengono mostrate senza attenderli.
+
+# Secondi per cui la versione letta dal database viene considerata valida
+TTL_VERSIONE = 5
+
+
+@st.cache_resource(show_spinner=False)
+def get_client():
+    import db
+
+    client = db.crea_client(event_listeners=[strumentazione.monitor_mongo()])
+    db.crea_indici(client[db.DB_NAME])
+    return client
+
+
+def get_collection():
+    import db
+
+    return get_client()[db.DB_NAME][db.COLLECTION_NAME]
+
+
+@st.cache_data(ttl=TTL_VERSIONE, show_spinner=False)
+def _versione_interventi():
+    import db
+
+    strumentazione.conta_calcolo("versione_interventi")
+    return db.versione_collezione(get_client()[db.DB_NAME])
+
+
+def versione_interventi():
+    strumentazione.conta_richiesta("versione_interventi")
+    return _versione_interventi()
+
+
+@st.cache_resource(show_spinner=False)
+def avvia_metriche():
+    """Endpoint /metrics per Prometheus (uno per processo), se è configurata la porta."""
+    if strumentazione.PORTA_METRICHE:
+        return strumentazione.avvia_server_metriche(strumentazione.PORTA_METRICHE, strumentazione.HOST_METRICHE)
+    return None
+
+
+# ----------------------------
+# Query disponibili
+# ----------------------------
+def _esiti_interventi(collection):
+    return pd.DataFrame(list(collection.find({}, {"_id": 0, "decesso_sul_posto": 1, "citta": 1})))
+
+
+def _collezione_vuota(collection):
+    return collection.find_one({}, {"_id": 1}) is None
+
+
+def _interventi_paziente(collection, nome):
+    return pd.DataFrame(ricerca_pazienti.interventi_paziente(collection, nome))
+
+
+QUERY = {
+    "esiti_interventi": _esiti_interventi,
+    "collezione_vuota": _collezione_vuota,
+    "interventi_paziente": _interventi_paziente,
+    "sintomi_frequenti": analisi_mongo.sintomi_frequenti,
+    "sintomi_per_fascia_eta": analisi_mongo.sintomi_per_fascia_eta,
+    "farmaci_frequenti": analisi_mongo.farmaci_frequenti,
+}
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _esegui_in_cache(query, parametri, versione):
+    # `versione` fa parte della chiave di cache: un nuovo valore forza il ricalcolo
+    strumentazione.conta_calcolo(f"query.{query}")
+    return QUERY[query](get_collection(), **dict(parametri))
+
+
+def interroga(query, /, **parametri):
+    """Esegue la query registrata `query`, riusando il risultato finché la collezione non cambia."""
+    strumentazione.conta_richiesta(f"query.{query}")
+    return _esegui_in_cache(query, tuple(sorted(parametri.items())), versione_interventi())
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _indice_pazienti(versione):
+    strumentazione.conta_calcolo("indice_pazienti")
+    return ricerca_pazienti.IndicePazienti(ricerca_pazienti.nomi_pazienti(get_collection()))
+
+
+def indice_pazienti():
+    """Indice di ricerca sui nomi dei pazienti, ricostruito solo quando la collezione cambia."""
+    strumentazione.conta_richiesta("indice_pazienti")
+    return _indice_pazienti(versione_interventi())
+
+
+# ----------------------------
+# PDF delle cartelle cliniche (GridFS)
+# ----------------------------
+def pdf_disponibili(numeri):
+    import archivio_pdf
+    import db
+
+    return archivio_pdf.interventi_con_pdf(get_client()[db.DB_NAME], numeri)
+
+
+def contenuto_pdf(numero_intervento):
+    """Byte del PDF dell'intervento (vuoti se manca), da passare a st.download_button come callable.
+
+    I chunk GridFS vengono letti solo al momento del download; Streamlit non accetta
+    il file GridFS come tale, quindi il callable restituisce i byte.
+    """
+    import archivio_pdf
+    import db
+
+    pdf = archivio_pdf.apri_pdf(get_client()[db.DB_NAME], numero_intervento)
+    if pdf is None:
+        return b""
+    with pdf:
+        return pdf.read()
+
+
+# ----------------------------
+# Output delle analisi (Parquet)
+# ----------------------------
+@st.cache_data(show_spinner=False, max_entries=32)
+def _leggi_risultato(nome, colonne, firma):
+    # `firma` (file, mtime, dimensione) fa parte della chiave: la cache scade quando il job riscrive la tabella
+    strumentazione.conta_calcolo(f"risultato.{nome}")
+    return risultati.leggi(nome, list(colonne) if colonne else None)
+
+
+def leggi_risultato(nome, colonne=None):
+    """Tabella di output delle analisi, già tipizzata, con le sole colonne richieste."""
+    strumentazione.conta_richiesta(f"risultato.{nome}")
+    return _leggi_risultato(nome, tuple(colonne or ()), risultati.firma(nome))
+
+
+# ----------------------------
+# Dati delle sezioni della dashboard
+# ----------------------------
+# Ogni sezione riceve le sole righe dei suoi grafici: geocodifica e trasformazioni pandas
+# vengono rieseguite solo quando cambia la sorgente (tabella di output o collezione),
+# non a ogni rerun o cambio di pagina.
+@st.cache_resource(show_spinner=False)
+def get_gazetteer():
+    return Gazetteer()
+
+
+def _sezione_mappa():
+    with strumentazione.span("mappa", "caricamento"):
+        df = leggi_risultato(risultati.TOP_CITTA)
+
+    with strumentazione.span("mappa", "geocodifica"):
+        if 'lat' not in df.columns or 'lon' not in df.columns:
+            df = get_gazetteer().geocodifica(df, colonna='citta')
+
+    with strumentazione.span("mappa", "trasformazione"):
+        df_map = df.dropna(subset=['lat', 'lon'])
+        if not df_map.empty:
+            df_map = df_map.assign(radius=metriche.raggio(df_map['count']))
+    return df_map
+
+
+def _tempi(sezione):
+    # Colonne già tipizzate: durate in minuti (interi) e orari in minuti dalla mezzanotte
+    with strumentazione.span(sezione, "caricamento"):
+        df_tempo = leggi_risultato(risultati.TEMPI, ['durata_minuti', 'tempo_di_intervento', 'ora_chiamata'])
+    # Durate negative solo per i documenti non normalizzati con orari a cavallo della mezzanotte
+    return df_tempo[df_tempo['durata_minuti'] >= 0]
+
+
+def _sezione_tempi():
+    df_tempo = _tempi("tempi")
+    with strumentazione.span("tempi", "trasformazione"):
+        # Fasce ordinate (Categorical): value_counts senza ordinamento le restituisce già in ordine
+        df_fasce = metriche.fascia_durata(df_tempo['durata_minuti']).value_counts(sort=False).reset_index()
+        df_fasce.columns = ['fascia', 'conteggio']
+        df_fasce = df_fasce[df_fasce['conteggio'] > 0]
+    return df_fasce, df_tempo['tempo_di_intervento'].mean()
+
+
+def _sezione_distribuzione():
+    with strumentazione.span("distribuzione", "caricamento"):
+        df_dist = leggi_risultato(risultati.DISTRIBUZIONE)
+    if df_dist.empty:
+        return df_dist
+
+    with strumentazione.span("distribuzione", "trasformazione"):
+        # Calcola la percentuale mancante (fascia media)
+        df_dist["percentuale_fascia_media"] = 100 - df_dist["percentuale_rapidi"] - df_dist["percentuale_lenti"]
+
+        # Melting per trasformare in formato long
+        df_melted = df_dist.melt(
+            id_vars=['citta'],
+            value_vars=['percentuale_rapidi', 'percentuale_fascia_media', 'percentuale_lenti'],
+            var_name='Tipo',
+            value_name='Percentuale'
+        )
+
+        # Rinomina le etichette
+        df_melted['Tipo'] = df_melted['Tipo'].map({
+            'percentuale_rapidi': 'Ambulanze Veloci (≤8 min)',
+            'percentuale_fascia_media': 'Ambulanze in Fascia Media (9–19 min)',
+            'percentuale_lenti': 'Ambulanze Lente (≥20 min)'
+        })
+    return df_melted
+
+
+def _sezione_fasce_orarie():
+    df_tempo = _tempi("fasce_orarie")
+    with strumentazione.span("fasce_orarie", "trasformazione"):
+        # Fascia oraria dall'ora della chiamata (minuti dalla mezzanotte); le righe senza orario vengono escluse
+        fasce_orarie = metriche.fascia_oraria(df_tempo['ora_chiamata'] // 60)
+
+        # Conta gli interventi per fascia
+        df_interventi = fasce_orarie.value_counts(sort=False).reset_index()
+        df_interventi.columns = ['Fascia Oraria', 'Numero Interventi']
+    return df_interventi[df_interventi['Numero Interventi'] > 0]
+
+
+def _sezione_decessi():
+    """(percentuale nazionale, decessi per città), o None se non ci sono interventi."""
+    with strumentazione.span("decessi", "caricamento"):
+        df = interroga("esiti_interventi")
+    if df.empty:
+        return None
+
+    with strumentazione.span("decessi", "trasformazione"):
+        totale_interventi = len(df)
+        decessi_sul_posto = df[df["decesso_sul_posto"] == True]
+        percentuale_nazionale = (len(decessi_sul_posto) / totale_interventi) * 100
+
+        df["citta"] = df["citta"].fillna("Non specificata")
+        df_citta = df.groupby("citta").size().reset_index(name="interventi_totali")
+        df_citta_decessi = decessi_sul_posto.groupby("citta").size().reset_index(name="decessi")
+        df_merge = pd.merge(df_citta, df_citta_decessi, on="citta", how="left").fillna(0)
+        df_merge["percentuale"] = (df_merge["decessi"] / df_merge["interventi_totali"]) * 100
+        # Solo le città con almeno 1 decesso
+        df_merge = df_merge[df_merge["decessi"] > 0]
+    return percentuale_nazionale, df_merge
+
+
+# Sezione -> (funzione, tabella di output di origine; None: collezione `interventi`)
+SEZIONI = {
+    "mappa": (_sezione_mappa, risultati.TOP_CITTA),
+    "tempi": (_sezione_tempi, risultati.TEMPI),
+    "distribuzione": (_sezione_distribuzione, risultati.DISTRIBUZIONE),
+    "fasce_orarie": (_sezione_fasce_orarie, risultati.TEMPI),
+    "decessi": (_sezione_decessi, None),
+}
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _sezione_in_cache(sezione, sorgente):
+    # `sorgente` (firma della tabella o versione della collezione) fa parte della chiave di cache
+    strumentazione.conta_calcolo(f"sezione.{sezione}")
+    funzione, _ = SEZIONI[sezione]
+    return funzione()
+
+
+def dati_sezione(sezione):
+    """Dati pronti per i grafici della sezione, ricalcolati solo quando cambia la sua sorgente."""
+    strumentazione.conta_richiesta(f"sezione.{sezione}")
+    _, tabella = SEZIONI[sezione]
+    sorgente = risultati.firma(tabella) if tabella else versione_interventi()
+    return _sezione_in_cache(sezione, sorgente)
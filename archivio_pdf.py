@@ -0,0 +1,188 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+
+import gridfs
+from pymongo import DESCENDING
+
+import db
+from compila_pdf import FILE_INTERVENTI
+
+# ----------------------------
+# Archivio dei PDF delle cartelle cliniche su GridFS
+# ----------------------------
+# I PDF sono salvati a blocchi (nessun limite di 16 MB, nessun file intero in memoria)
+# con l'SHA-256 del contenuto come _id: lo stesso PDF caricato più volte occupa
+# spazio una volta sola, anche con caricamenti contemporanei. Ogni file è collegato
+# agli interventi tramite `metadata.numeri_intervento`.
+
+CARTELLA_PDF = "./pdf_output"
+DIMENSIONE_BLOCCO = 255 * 1024  # dimensione dei chunk GridFS
+DIMENSIONE_LETTURA = 1024 * 1024
+
+
+def bucket(database):
+    return gridfs.GridFSBucket(database, bucket_name=db.PDF_BUCKET, chunk_size_bytes=DIMENSIONE_BLOCCO)
+
+
+def sha256_file(percorso):
+    """SHA-256 del file letto a blocchi."""
+    digest = hashlib.sha256()
+    with open(percorso, "rb") as f:
+        for blocco in iter(lambda: f.read(DIMENSIONE_LETTURA), b""):
+            digest.update(blocco)
+    return digest.hexdigest()
+
+
+def interventi_registrati(cartella):
+    """{nome: numero_intervento} scritto da compila_pdf.py accanto ai PDF ({} se manca)."""
+    try:
+        with open(os.path.join(cartella, FILE_INTERVENTI), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def numeri_per_file(database, nomi, cartella=None):
+    """numero_intervento di ogni nome di file (senza estensione).
+
+    Prima dal registro di compila_pdf.py nella `cartella` dei PDF; per gli altri nomi dal
+    JSON di origine registrato dall'ingestione (PDF chiamato come il JSON, es. json_1.pdf).
+    """
+    registrati = interventi_registrati(cartella) if cartella else {}
+    numeri = {nome: registrati[nome] for nome in nomi if registrati.get(nome)}
+    origini = {nome + ".json": nome for nome in nomi if nome not in numeri}
+    for doc in database[db.COLLECTION_NAME].find(
+        {"file_origine": {"$in": list(origini)}}, {"_id": 0, "file_origine": 1, "numero_intervento": 1}
+    ):
+        if doc.get("numero_intervento"):
+            numeri[origini[doc["file_origine"]]] = doc["numero_intervento"]
+    return numeri
+
+
+def _collega(database, digest, numero_intervento):
+    if numero_intervento:
+        database[f"{db.PDF_BUCKET}.files"].update_one(
+            {"_id": digest}, {"$addToSet": {"metadata.numeri_intervento": numero_intervento}}
+        )
+
+
+# ----------------------------
+# Caricamento
+# ----------------------------
+def carica_flusso(database, flusso, nome_file, digest, numero_intervento=None):
+    """Carica un flusso binario già identificato dal suo SHA-256; False se il contenuto era già presente."""
+    metadata = {"sha256": digest, "numeri_intervento": [numero_intervento] if numero_intervento else []}
+    try:
+        bucket(database).upload_from_stream_with_id(digest, nome_file, flusso, metadata=metadata)
+        caricato = True
+    except gridfs.errors.FileExists:
+        # Stesso contenuto già archiviato: si aggiunge solo il collegamento all'intervento
+        caricato = False
+    _collega(database, digest, numero_intervento)
+    return caricato
+
+
+def carica_pdf(database, percorso, numero_intervento=None):
+    """Archivia un PDF da disco (letto due volte a blocchi: hash, poi caricamento); restituisce (sha256, caricato)."""
+    digest = sha256_file(percorso)
+    if database[f"{db.PDF_BUCKET}.files"].find_one({"_id": digest}, {"_id": 1}):
+        _collega(database, digest, numero_intervento)
+        return digest, False
+    with open(percorso, "rb") as f:
+        return digest, carica_flusso(database, f, os.path.basename(percorso), digest, numero_intervento)
+
+
+def carica_cartella(database, cartella=CARTELLA_PDF):
+    """Archivia tutti i PDF di una cartella, collegandoli agli interventi dal nome del file."""
+    nomi = sorted(f for f in os.listdir(cartella) if f.endswith(".pdf"))
+    numeri = numeri_per_file(database, [os.path.splitext(f)[0] for f in nomi], cartella)
+    conteggi = {"caricati": 0, "duplicati": 0, "senza_intervento": 0}
+    for nome in nomi:
+        numero = numeri.get(os.path.splitext(nome)[0])
+        _, caricato = carica_pdf(database, os.path.join(cartella, nome), numero)
+        conteggi["caricati" if caricato else "duplicati"] += 1
+        conteggi["senza_intervento"] += numero is None
+    return conteggi
+
+
+def migra_pdf_legacy(database, nome_collezione=db.PDF_BUCKET):
+    """Sposta su GridFS i PDF salvati come documenti {filename, data} nella vecchia collezione."""
+    migrati = 0
+    for doc in database[nome_collezione].find({"data": {"$exists": True}}, batch_size=1):
+        dati = bytes(doc["data"])
+        numero = numeri_per_file(database, [os.path.splitext(doc["filename"])[0]]).get(
+            os.path.splitext(doc["filename"])[0]
+        )
+        carica_flusso(database, io.BytesIO(dati), doc["filename"], hashlib.sha256(dati).hexdigest(), numero)
+        database[nome_collezione].delete_one({"_id": doc["_id"]})
+        migrati += 1
+    return migrati
+
+
+# ----------------------------
+# Lettura in streaming
+# ----------------------------
+def apri_pdf(database, numero_intervento):
+    """File GridFS (file-like, legge i chunk su richiesta) del PDF più recente dell'intervento, o None."""
+    try:
+        return next(
+            bucket(database).find({"metadata.numeri_intervento": numero_intervento}).sort("uploadDate", DESCENDING).limit(1)
+        )
+    except StopIteration:
+        return None
+
+
+def interventi_con_pdf(database, numeri):
+    """Sottoinsieme di `numeri` (numeri_intervento) che hanno almeno un PDF archiviato."""
+    trovati = database[f"{db.PDF_BUCKET}.files"].distinct(
+        "metadata.numeri_intervento", {"metadata.numeri_intervento": {"$in": list(numeri)}}
+    )
+    return set(trovati) & set(numeri)
+
+
+def blocchi_pdf(database, numero_intervento, dimensione=DIMENSIONE_BLOCCO):
+    """Generatore dei byte del PDF a blocchi, per risposte HTTP in streaming."""
+    pdf = apri_pdf(database, numero_intervento)
+    if pdf is None:
+        return
+    with pdf:
+        for blocco in iter(lambda: pdf.read(dimensione), b""):
+            yield blocco
+
+
+def scarica_pdf(database, numero_intervento, cartella=CARTELLA_PDF):
+    """Salva su disco il PDF dell'intervento senza caricarlo interamente in memoria; percorso o None."""
+    pdf = apri_pdf(database, numero_intervento)
+    if pdf is None:
+        return None
+    os.makedirs(cartella, exist_ok=True)
+    percorso = os.path.join(cartella, pdf.filename)
+    with pdf, open(percorso, "wb") as f:
+        shutil.copyfileobj(pdf, f, DIMENSIONE_LETTURA)
+    return percorso
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivia su GridFS i PDF delle cartelle cliniche.")
+    parser.add_argument("cartella", nargs="?", default=CARTELLA_PDF, help="Cartella dei PDF")
+    parser.add_argument("--migra", action="store_true", help="Sposta anche i PDF della vecchia collezione pdf_cartelle")
+    args = parser.parse_args()
+
+    client = db.crea_client()
+    database = client[db.DB_NAME]
+    db.crea_indici(database)
+    if args.migra:
+        print(f"PDF migrati dalla vecchia collezione: {migra_pdf_legacy(database)}")
+    conteggi = carica_cartella(database, args.cartella)
+    print(
+        f"Caricamento PDF completato: {conteggi['caricati']} nuovi, {conteggi['duplicati']} già presenti, "
+        f"{conteggi['senza_intervento']} senza intervento collegato."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Confronto tra le analitiche della pagina Pazienti calcolate in pandas e in MongoDB.
+
+Uso (richiede un mongod locale):
+    python benchmarks/bench_analisi_pazienti.py --dimensioni 10000 100000 1000000
+"""
+import argparse
+import copy
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+import pymongo
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import analisi_mongo  # noqa: E402
+
+DB_BENCH = "bench_cartella_clinica_db"
+
+
+# ----------------------------
+# Dati sintetici
+# ----------------------------
+def carica_modelli(cartella="cartella_clinica"):
+    modelli = []
+    for percorso in sorted(glob.glob(os.path.join(cartella, "*.json"))):
+        with open(percorso, "r", encoding="utf-8") as f:
+            modelli.append(json.load(f))
+    return modelli
+
+
+def genera_documenti(modelli, n, seed=42):
+    rng = random.Random(seed)
+    sintomi = sorted({s for m in modelli for s in (m.get("sintomi") or [])})
+    farmaci = sorted({f if isinstance(f, str) else f["nome"] for m in modelli for f in (m.get("farmaci_somministrati") or [])})
+    for i in range(n):
+        doc = copy.deepcopy(rng.choice(modelli))
+        doc["numero_intervento"] = f"BENCH{i:08d}"
+        doc["eta"] = str(rng.randint(0, 100)) if rng.random() < 0.8 else "circa 40 anni"
+        doc["sintomi"] = rng.sample(sintomi, rng.randint(0, 6))
+        doc["farmaci_somministrati"] = rng.sample(farmaci, rng.randint(0, 3))
+        yield doc
+
+
+def popola(collection, modelli, n, lotto=10000):
+    collection.drop()
+    buffer = []
+    for doc in genera_documenti(modelli, n):
+        buffer.append(doc)
+        if len(buffer) == lotto:
+            collection.insert_many(buffer, ordered=False)
+            buffer = []
+    if buffer:
+        collection.insert_many(buffer, ordered=False)
+
+
+# ----------------------------
+# Percorso pandas (come in app.py prima delle pipeline)
+# ----------------------------
+def analisi_pandas(collection):
+    df = pd.DataFrame(list(collection.find()))
+
+    sintomi_freq = df.explode("sintomi")["sintomi"].value_counts().reset_index()
+    sintomi_freq.columns = ["Sintomo", "Frequenza"]
+    sintomi_freq = sintomi_freq.head(15)
+
+    df_eta = df[df["eta"].notnull()].copy()
+    df_eta["eta"] = pd.to_numeric(df_eta["eta"], errors="coerce")
+
+    def fascia_eta(e):
+        if e <= 18:
+            return "0–18"
+        elif e <= 35:
+            return "19–35"
+        elif e <= 60:
+            return "36–60"
+        else:
+            return "60+"
+
+    df_eta["fascia_eta"] = df_eta["eta"].apply(fascia_eta)
+    df_gruppo = df_eta.explode("sintomi").groupby(["fascia_eta", "sintomi"]).size().reset_index(name="conteggio")
+    top_sintomi = df_gruppo.groupby("sintomi")["conteggio"].sum().nlargest(10).index
+    df_gruppo_top = df_gruppo[df_gruppo["sintomi"].isin(top_sintomi)]
+
+    def estrai_farmaci(record):
+        if isinstance(record, list):
+            nomi = []
+            for f in record:
+                if isinstance(f, dict) and "nome" in f:
+                    nomi.append(f["nome"].lower())
+                elif isinstance(f, str):
+                    nomi.append(f.lower())
+            return nomi
+        return []
+
+    farmaci_freq = df["farmaci_somministrati"].apply(estrai_farmaci).explode().dropna().value_counts().reset_index()
+    farmaci_freq.columns = ["Farmaco", "Frequenza"]
+    farmaci_freq = farmaci_freq.head(15)
+
+    return sintomi_freq, df_gruppo_top, farmaci_freq
+
+
+def analisi_pipeline(collection):
+    return (
+        analisi_mongo.sintomi_frequenti(collection, limite=15),
+        analisi_mongo.sintomi_per_fascia_eta(collection, top_sintomi=10),
+        analisi_mongo.farmaci_frequenti(collection, limite=15),
+    )
+
+
+def cronometra(funzione, *args, ripetizioni=3):
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        funzione(*args)
+        tempi.append(time.perf_counter() - inizio)
+    return min(tempi)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--dimensioni", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--ripetizioni", type=int, default=3)
+    args = parser.parse_args()
+
+    client = pymongo.MongoClient(args.uri)
+    collection = client[DB_BENCH]["interventi"]
+    modelli = carica_modelli()
+
+    print(f"{'documenti':>10} {'pandas (s)':>12} {'pipeline (s)':>13} {'speedup':>8}")
+    try:
+        for n in args.dimensioni:
+            popola(collection, modelli, n)
+            t_pandas = cronometra(analisi_pandas, collection, ripetizioni=args.ripetizioni)
+            t_pipeline = cronometra(analisi_pipeline, collection, ripetizioni=args.ripetizioni)
+            print(f"{n:>10} {t_pandas:>12.3f} {t_pipeline:>13.3f} {t_pandas / t_pipeline:>7.1f}x")
+    finally:
+        client.drop_database(DB_BENCH)
+
+
+if __name__ == "__main__":
+    main()
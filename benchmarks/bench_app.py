@@ -0,0 +1,131 @@
+"""Latenza percepita della dashboard Streamlit: avvio a freddo e interazioni.
+
+Esegue app.py con AppTest (lo stesso runner di script del server, senza browser) sugli
+stessi dati dell'app: il MongoDB di db.py e gli output delle analisi in output/.
+Misura:
+  - importazioni: moduli importati in testa ad app.py, pagati prima che la pagina mostri qualcosa
+  - avvio a freddo: importazioni + primo rerun della pagina Ambulanze, in un processo nuovo
+  - rerun: pagina Ambulanze di nuovo, a cache calde
+  - cambio pagina: Ambulanze -> Pazienti e ritorno
+  - ricerca: un testo digitato nella ricerca paziente. AppTest riesegue sempre lo script
+    intero (ricerca.rerun); quando la ricerca è un frammento, nel browser viene rieseguito
+    solo il frammento, il cui tempo (span "totale" della sezione) è ricerca.frammento
+
+I tempi sono la mediana di --ripetizioni esecuzioni.
+
+Uso (richiede il mongod e gli output usati dall'app):
+    python benchmarks/bench_app.py
+    python benchmarks/bench_app.py --ripetizioni 10 --json misure_app.json
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RADICE = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+APP = os.path.join(RADICE, "app.py")
+RICERCHE = ["ros", "bianchi m", "mario", "de lu", "xyz"]
+FRAMMENTO_RICERCA = "ricerca_paziente"
+TIMEOUT = 120
+
+
+def importazioni_app():
+    """Solo le istruzioni import al livello più esterno di app.py."""
+    with open(APP, "r", encoding="utf-8") as f:
+        albero = ast.parse(f.read(), APP)
+    albero.body = [nodo for nodo in albero.body if isinstance(nodo, (ast.Import, ast.ImportFrom))]
+    return compile(albero, APP, "exec")
+
+
+def misura_avvio():
+    """Eseguita in un processo nuovo: importazioni di app.py e primo rerun."""
+    from streamlit.testing.v1 import AppTest
+
+    codice = importazioni_app()
+    inizio = time.perf_counter()
+    exec(codice, {"__name__": "importazioni_app"})
+    importazioni = time.perf_counter() - inizio
+    app = AppTest.from_file(APP, default_timeout=TIMEOUT).run()
+    totale = time.perf_counter() - inizio
+    errori = [str(e.value) for e in app.exception]
+    return {"importazioni": importazioni, "avvio_a_freddo": totale, "errori": errori}
+
+
+def tempo_frammento(nome):
+    """(somma, conteggio) dello span "totale" del frammento `nome` nel registro di strumentazione."""
+    import strumentazione
+
+    istogramma = strumentazione.REGISTRO.sezioni.get((nome, "totale"))
+    return (istogramma.somma, istogramma.conteggio) if istogramma else (0.0, 0)
+
+
+def misura_interazioni():
+    from streamlit.testing.v1 import AppTest
+
+    misure = {}
+
+    def cronometra(nome, azione):
+        inizio = time.perf_counter()
+        app = azione()
+        misure.setdefault(nome, []).append(time.perf_counter() - inizio)
+        if app.exception:
+            raise RuntimeError(f"{nome}: {app.exception[0].value}")
+        return app
+
+    app = AppTest.from_file(APP, default_timeout=TIMEOUT).run()
+    cronometra("rerun.ambulanze", app.run)
+    cronometra("cambio_pagina.pazienti", lambda: app.sidebar.selectbox[0].select("Pazienti").run())
+    for testo in RICERCHE:
+        prima = tempo_frammento(FRAMMENTO_RICERCA)
+        cronometra("ricerca.rerun", lambda: app.sidebar.text_input[0].input(testo).run())
+        dopo = tempo_frammento(FRAMMENTO_RICERCA)
+        if dopo[1] > prima[1]:
+            misure.setdefault("ricerca.frammento", []).append((dopo[0] - prima[0]) / (dopo[1] - prima[1]))
+    cronometra("cambio_pagina.ambulanze", lambda: app.sidebar.selectbox[0].select("Ambulanze").run())
+    return misure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ripetizioni", type=int, default=5)
+    parser.add_argument("--json", help="Salva le misure (mediane, in secondi) in questo file")
+    parser.add_argument("--avvio", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, RADICE)
+    os.chdir(RADICE)
+
+    if args.avvio:
+        print(json.dumps(misura_avvio()))
+        return
+
+    campioni = {}
+    for _ in range(args.ripetizioni):
+        uscita = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--avvio"], capture_output=True, text=True, check=True
+        ).stdout
+        avvio = json.loads(uscita.strip().splitlines()[-1])
+        if avvio.pop("errori"):
+            print("Attenzione: eccezioni nel primo rerun dell'app")
+        for nome, secondi in avvio.items():
+            campioni.setdefault(nome, []).append(secondi)
+
+    for _ in range(args.ripetizioni):
+        for nome, tempi in misura_interazioni().items():
+            campioni.setdefault(nome, []).extend(tempi)
+
+    misure = {nome: statistics.median(tempi) for nome, tempi in campioni.items()}
+    print(f"Latenza della dashboard (mediana di {args.ripetizioni} esecuzioni)")
+    for nome, secondi in misure.items():
+        print(f"  {nome:<26} {secondi * 1000:8.1f} ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(misure, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Confronto tra la chiamata originale a Ollama (requests.post senza stream) e ClientOllama.
+
+Usa un server locale che imita /api/generate (benchmarks/stub_ollama.py), quindi
+non richiede Ollama né un modello.
+
+Uso:
+    python benchmarks/bench_client_ollama.py --richieste 20 --concorrenza 4
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from client_ollama import ClientOllama  # noqa: E402
+from stub_ollama import StubOllama  # noqa: E402
+
+
+# ----------------------------
+# Percorso originale (come in LLM_NER.ipynb prima di client_ollama)
+# ----------------------------
+def query_ollama_originale(prompt, url, model="mistral"):
+    headers = {"Content-Type": "application/json"}
+    payload = {"model": model, "prompt": prompt, "stream": False}
+    response = requests.post(url, headers=headers, json=payload)
+    if response.status_code == 200:
+        return response.json().get("response", "").strip()
+    raise Exception(f"Errore {response.status_code}: {response.text}")
+
+
+def estrai_originale(testo):
+    blocchi = re.findall(r"```json\n(.*?)```", testo, re.DOTALL)
+    return json.loads(blocchi[0]) if blocchi else None
+
+
+# ----------------------------
+# Scenari
+# ----------------------------
+def originale(stub, prompt, n, concorrenza):
+    risultati = []
+    for _ in range(n):
+        try:
+            risultati.append(estrai_originale(query_ollama_originale(prompt, stub.url)))
+        except Exception:
+            risultati.append(None)
+    return risultati
+
+
+def client(stub, prompt, n, concorrenza):
+    with ClientOllama(stub.url, concorrenza=concorrenza, attesa_base=0.05) as c:
+        return list(c.mappa(lambda cl, _: cl.genera_json(prompt, "mistral"), range(n)))
+
+
+def misura(nome, scenario, stub, prompt, n, concorrenza):
+    stub.azzera()
+    inizio = time.perf_counter()
+    risultati = scenario(stub, prompt, n, concorrenza)
+    secondi = time.perf_counter() - inizio
+    return {
+        "scenario": nome,
+        "concorrenza": concorrenza,
+        "totale_s": round(secondi, 3),
+        "s_per_richiesta": round(secondi / n, 3),
+        "json_validi": sum(r is not None for r in risultati),
+        "richieste_http": stub.richieste,
+        "connessioni": stub.connessioni,
+        "token_generati": stub.token_inviati,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--richieste", type=int, default=20)
+    parser.add_argument("--concorrenza", type=int, default=4, help="Richieste parallele del client (e del server stub)")
+    parser.add_argument("--ms-token", type=float, default=1.0, help="Ritardo per token del server stub")
+    parser.add_argument("--errori", type=float, default=0.2, help="Frazione di risposte 503 nello scenario con errori")
+    args = parser.parse_args()
+
+    with open(sorted(glob.glob("cartella_clinica/*.json"))[0], "r", encoding="utf-8") as f:
+        cartella = json.load(f)
+    prompt = "Estrai la cartella clinica dal testo: ..."
+
+    righe = []
+    stub = StubOllama(cartella, ms_token=args.ms_token, parallelo=args.concorrenza).avvia()
+    righe.append(misura("originale", originale, stub, prompt, args.richieste, 1))
+    righe.append(misura("client", client, stub, prompt, args.richieste, 1))
+    righe.append(misura("client", client, stub, prompt, args.richieste, args.concorrenza))
+    stub.shutdown()
+
+    stub = StubOllama(cartella, ms_token=args.ms_token, parallelo=args.concorrenza, errori=args.errori).avvia()
+    righe.append(misura(f"originale, {args.errori:.0%} errori", originale, stub, prompt, args.richieste, 1))
+    righe.append(misura(f"client, {args.errori:.0%} errori", client, stub, prompt, args.richieste, args.concorrenza))
+    stub.shutdown()
+
+    colonne = list(righe[0])
+    print("  ".join(f"{c:>22}" if i == 0 else f"{c:>15}" for i, c in enumerate(colonne)))
+    for riga in righe:
+        print("  ".join(f"{riga[c]!s:>22}" if i == 0 else f"{riga[c]!s:>15}" for i, c in enumerate(colonne)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Confronto tra le fasce calcolate con Series.apply (riga per riga) e le funzioni vettoriali di metriche.py.
+
+Uso:
+    python benchmarks/bench_metriche.py --righe 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import metriche  # noqa: E402
+
+FARMACI = ["adrenalina 1mg", "Aspirina 250mg OS", "paracetamolo", "atropina", "amiodarone", "ossigeno"]
+
+
+# ----------------------------
+# Dati sintetici
+# ----------------------------
+def genera_interventi(n, seed=42):
+    rng = np.random.default_rng(seed)
+    eta = rng.integers(0, 100, n).astype(str).astype(object)
+    eta[rng.random(n) < 0.1] = "circa 40 anni"
+
+    scelte = rng.integers(0, len(FARMACI), (n, 3))
+    quanti = rng.integers(0, 4, n)
+    farmaci = [
+        [FARMACI[j] if j % 2 else {"nome": FARMACI[j], "dose": "1 fl"} for j in scelte[i, :quanti[i]]]
+        for i in range(n)
+    ]
+    return pd.DataFrame({
+        "durata_minuti": rng.integers(0, 90, n),
+        "ora_chiamata": rng.integers(0, 24 * 60, n),
+        "eta": eta,
+        "count": rng.integers(1, 500, n),
+        "farmaci_somministrati": farmaci,
+    })
+
+
+# ----------------------------
+# Percorso riga per riga (come in app.py prima di metriche.py)
+# ----------------------------
+def fascia_temporale(d):
+    if d <= 10:
+        return '≤10 min'
+    elif d <= 20:
+        return '11–20 min'
+    elif d <= 30:
+        return '21–30 min'
+    else:
+        return '>30 min'
+
+
+def fascia_oraria(h):
+    if 6 <= h < 10:
+        return "06:00 - 09:59"
+    elif 10 <= h < 14:
+        return "10:00 - 13:59"
+    elif 14 <= h < 18:
+        return "14:00 - 17:59"
+    elif 18 <= h < 22:
+        return "18:00 - 21:59"
+    elif 22 <= h or h < 2:
+        return "22:00 - 01:59"
+    else:
+        return "02:00 - 05:59"
+
+
+def fascia_eta(e):
+    if e <= 18:
+        return "0–18"
+    elif e <= 35:
+        return "19–35"
+    elif e <= 60:
+        return "36–60"
+    else:
+        return "60+"
+
+
+def estrai_farmaci(record):
+    if isinstance(record, list):
+        nomi = []
+        for f in record:
+            if isinstance(f, dict) and "nome" in f:
+                nomi.append(f["nome"].lower())
+            elif isinstance(f, str):
+                nomi.append(f.lower())
+        return nomi
+    return []
+
+
+def _raggio_apply(conteggi):
+    max_count = conteggi.max()
+    return conteggi.apply(lambda count: 3000 + (count / max_count) * 15000)
+
+
+CON_APPLY = {
+    "durata": lambda df: df["durata_minuti"].apply(fascia_temporale),
+    "oraria": lambda df: (df["ora_chiamata"] // 60).apply(fascia_oraria),
+    # Le età non numeriche sono escluse, come nelle funzioni vettoriali
+    "eta": lambda df: pd.to_numeric(df["eta"], errors="coerce").dropna().apply(fascia_eta),
+    "raggio": lambda df: _raggio_apply(df["count"]),
+    "farmaci": lambda df: df["farmaci_somministrati"].apply(estrai_farmaci).explode().dropna(),
+}
+
+VETTORIALI = {
+    "durata": lambda df: metriche.fascia_durata(df["durata_minuti"]),
+    "oraria": lambda df: metriche.fascia_oraria(df["ora_chiamata"] // 60),
+    "eta": lambda df: metriche.fascia_eta(df["eta"]).dropna(),
+    "raggio": lambda df: metriche.raggio(df["count"]),
+    "farmaci": lambda df: metriche.nomi_farmaci(df["farmaci_somministrati"]),
+}
+
+
+def cronometra(funzione, df, ripetizioni):
+    migliore, risultato = float("inf"), None
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        risultato = funzione(df)
+        migliore = min(migliore, time.perf_counter() - inizio)
+    return migliore, risultato
+
+
+def stessi_risultati(a, b):
+    if pd.api.types.is_float_dtype(a):
+        return np.allclose(a.to_numpy(dtype=float), b.to_numpy(dtype=float))
+    conteggi = [s.astype(str).value_counts().sort_index() for s in (a, b)]
+    return conteggi[0].equals(conteggi[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--righe", type=int, default=1_000_000)
+    parser.add_argument("--ripetizioni", type=int, default=3)
+    args = parser.parse_args()
+
+    df = genera_interventi(args.righe)
+
+    print(f"{'metrica':<10} {'apply (s)':>10} {'vettoriale (s)':>15} {'speedup':>8}  risultati")
+    for chiave in CON_APPLY:
+        t_apply, r_apply = cronometra(CON_APPLY[chiave], df, args.ripetizioni)
+        t_vett, r_vett = cronometra(VETTORIALI[chiave], df, args.ripetizioni)
+        esito = "identici" if stessi_risultati(r_apply, r_vett) else "DIVERSI"
+        print(f"{chiave:<10} {t_apply:>10.3f} {t_vett:>15.3f} {t_apply / t_vett:>7.1f}x  {esito}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Confronto dei tempi del job di analisi tra il motore Spark e il motore locale (DuckDB).
+
+Entrambi i motori leggono l'intera collezione `interventi` configurata in db.py
+(sola lettura: gli output in output/ non vengono toccati). Per Spark l'avvio
+della sessione (JVM e connettore) è misurato a parte.
+
+Uso (richiede un mongod locale; per Spark anche Java e PySpark):
+    python benchmarks/bench_motori_analisi.py
+    python benchmarks/bench_motori_analisi.py --motori locale --ripetizioni 5
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import analisi_locale  # noqa: E402
+import db  # noqa: E402
+from metriche import SOGLIA_LENTO, SOGLIA_RAPIDO  # noqa: E402
+
+
+def cronometra(funzione, ripetizioni):
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        risultato = funzione()
+        tempi.append(time.perf_counter() - inizio)
+    return min(tempi), risultato
+
+
+def normalizza(tempi, conteggi):
+    """Risultati in forma confrontabile: ordine delle righe e tipi non dipendono dal motore."""
+    tempi = tempi.astype(object).where(tempi.notna(), None)
+    conteggi = conteggi.astype(object).where(conteggi.notna(), None)
+    chiave = lambda df: sorted(map(repr, df.itertuples(index=False)))  # noqa: E731
+    return chiave(tempi), chiave(conteggi)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default=db.MONGO_URI)
+    parser.add_argument("--motori", nargs="+", choices=["spark", "locale"], default=["spark", "locale"])
+    parser.add_argument("--ripetizioni", type=int, default=3)
+    args = parser.parse_args()
+
+    fine = datetime.now(timezone.utc)
+    risultati = {}
+    righe = []
+
+    if "locale" in args.motori:
+        secondi, risultati["locale"] = cronometra(
+            lambda: analisi_locale.calcola(None, fine, SOGLIA_RAPIDO, SOGLIA_LENTO, uri=args.uri), args.ripetizioni
+        )
+        righe.append(("locale", 0.0, secondi))
+
+    if "spark" in args.motori:
+        import analisi_spark
+
+        inizio = time.perf_counter()
+        spark = analisi_spark.crea_sessione(args.uri)
+        avvio = time.perf_counter() - inizio
+        try:
+            secondi, risultati["spark"] = cronometra(
+                lambda: analisi_spark.calcola(None, fine, SOGLIA_RAPIDO, SOGLIA_LENTO, spark=spark, uri=args.uri),
+                args.ripetizioni,
+            )
+        finally:
+            spark.stop()
+        righe.append(("spark", avvio, secondi))
+
+    documenti = len(next(iter(risultati.values()))[0])
+    print(f"{documenti} interventi, migliore di {args.ripetizioni} esecuzioni")
+    print(pd.DataFrame(righe, columns=["motore", "avvio (s)", "calcolo (s)"]).assign(
+        **{"totale (s)": lambda df: df["avvio (s)"] + df["calcolo (s)"]}
+    ).to_string(index=False, float_format="{:.3f}".format))
+
+    if len(risultati) == 2:
+        uguali = normalizza(*risultati["spark"]) == normalizza(*risultati["locale"])
+        print("risultati:", "identici" if uguali else "DIVERSI")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Pre-estrazione a regole (preestrazione.py): token risparmiati nel prompt e concordanza dei campi.
+
+Le trascrizioni di esempio sono dettature sintetiche generate dalle cartelle in
+cartella_clinica/*.json (che fanno da risposta attesa), con formulazioni dei parametri
+vitali variate (anche non coperte dalle regole) e con le soglie ("sotto i 60").
+Restano testi costruiti a partire dai campi attesi: la concordanza su queste
+dettature verifica le regole, non è una misura di accuratezza. Per quella serve
+--trascrizioni, una cartella di coppie nome.txt (trascrizione reale o scritta a mano)
++ nome.json (cartella corretta).
+
+I token sono stimati contando parole e segni di punteggiatura: il valore assoluto
+dipende dal tokenizer del modello, il rapporto tra prompt completo e ridotto no.
+
+Uso:
+    python benchmarks/bench_preestrazione.py --ms-token 25
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import estrazione  # noqa: E402
+import preestrazione  # noqa: E402
+from testo import normalizza  # noqa: E402
+
+PAROLE = re.compile(r"\w+|[^\w\s]")
+NUMERI = re.compile(r"\d+(?:[.,]\d+)?")
+CONFRONTO = re.compile(r"^\s*(?:([<≤]|sotto|inferiore|meno)|([>≥]|sopra|superiore|oltre|più))", re.IGNORECASE)
+CAMPI_NUMERICI = {"telefono_chiamante", "cap", "numero_civico", "eta", "data"}
+
+
+def stima_token(testo):
+    return len(PAROLE.findall(testo))
+
+
+# ----------------------------
+# Dettature sintetiche
+# ----------------------------
+# Formulazioni dei parametri vitali; alcune volutamente non riconosciute dalle regole
+FORMULAZIONI = {
+    "frequenza_cardiaca": ["frequenza cardiaca {}", "FC {}", "{} battiti al minuto", "polso {}", "cuore a {}"],
+    "frequenza_respiratoria": ["{} atti al minuto", "frequenza respiratoria {}", "respira {} volte al minuto"],
+    "saturazione_ossigeno": ["saturazione {} per cento", "SpO2 {}%", "satura al {}", "ossigeno al {} per cento"],
+    "glicemia": ["glicemia {}", "HGT {}", "zuccheri a {}"],
+    "temperatura": ["temperatura {} gradi", "TC {}", "febbre a {}"],
+}
+FORMULAZIONI_PRESSIONE = ["pressione {} su {}", "PA {}/{}", "massima {} e minima {}"]
+SOGLIE = {"<": ["sotto i {}", "inferiore a {}", "meno di {}", "<{}"], ">": ["sopra i {}", "oltre {}", "più di {}", ">{}"]}
+
+
+def confronto(valore):
+    """"<" o ">" se il valore atteso è una soglia ("<60 bpm", "oltre 25 atti"), altrimenti ""."""
+    trovato = CONFRONTO.match(str(valore or ""))
+    return "" if not trovato else "<" if trovato.group(1) else ">"
+
+
+def _numero(valore):
+    trovato = NUMERI.search(str(valore or ""))
+    return trovato.group().replace(".", ",") if trovato else None
+
+
+def _misura(valore, caso):
+    """Numero del valore atteso, con la soglia detta a parole o col simbolo ("sotto i 60")."""
+    numero = _numero(valore)
+    segno = confronto(valore)
+    return caso.choice(SOGLIE[segno]).format(numero) if numero and segno else numero
+
+
+def dettatura(c, variante=0):
+    """Testo in stile dettatura dei soccorritori costruito dai campi della cartella."""
+    caso = random.Random(variante)
+    frasi = []
+    if c.get("numero_intervento"):
+        frasi.append(f"Intervento numero {c['numero_intervento']}" + (f" del {c['data']}" if c.get("data") else "") + ".")
+    chiamata = f"Chiamata ricevuta alle {c['ora_chiamata']}" if c.get("ora_chiamata") else "Chiamata ricevuta"
+    if c.get("telefono_chiamante"):
+        chiamata += f" dal numero {c['telefono_chiamante']}"
+    if c.get("codice_uscita"):
+        chiamata += [f", codice di uscita {c['codice_uscita']}", f", uscita in codice {c['codice_uscita']}"][variante % 2]
+    frasi.append(chiamata + ".")
+
+    luogo = c.get("indirizzo_intervento") or " ".join(
+        str(p) for p in (c.get("via"), c.get("numero_civico")) if p
+    )
+    if c.get("citta") and c["citta"] not in luogo:
+        luogo += f", {c['citta']}"
+    partenza = f"Partenza dell'ambulanza alle {c['ora_partenza_ambulanza']}" if c.get("ora_partenza_ambulanza") else "Partiti"
+    arrivo = f", arrivati sul posto alle {c['ora_arrivo_sul_posto']}" if c.get("ora_arrivo_sul_posto") else ""
+    frasi.append(partenza + arrivo + (f" in {luogo}" if luogo else "") + ".")
+
+    paziente = "Paziente"
+    if c.get("eta") and _numero(c["eta"]):
+        paziente += f" di {_numero(c['eta'])} anni"
+    if c.get("stato_coscienza"):
+        paziente += f", {c['stato_coscienza']}"
+    frasi.append(paziente + ".")
+    if c.get("sintomi"):
+        frasi.append("Riferisce " + ", ".join(map(str, c["sintomi"])) + ".")
+
+    for i, r in enumerate(c.get("parametri_vitali") or []):
+        parti = []
+        for campo, formulazioni in FORMULAZIONI.items():
+            misura = _misura(r.get(campo), caso)
+            if misura:
+                parti.append(caso.choice(formulazioni).format(misura))
+            if campo == "frequenza_cardiaca":
+                pressione = NUMERI.findall(str(r.get("pressione_arteriosa") or ""))
+                if len(pressione) == 2:
+                    parti.append(caso.choice(FORMULAZIONI_PRESSIONE).format(*pressione))
+        if parti:
+            frasi.append(("Parametri: " if i == 0 else "Seconda rilevazione: ") + ", ".join(parti) + ".")
+
+    if c.get("note_intervento"):
+        frasi.append(str(c["note_intervento"]).rstrip(" .") + ".")
+    ritorno = []
+    if c.get("ora_partenza_dal_posto"):
+        ritorno.append(f"Ripartiti dal posto alle {c['ora_partenza_dal_posto']}")
+    if c.get("ora_arrivo_ps"):
+        ritorno.append(f"arrivo in pronto soccorso alle {c['ora_arrivo_ps']}")
+    if c.get("codice_rientro"):
+        ritorno.append(f"codice di rientro {c['codice_rientro']}")
+    if ritorno:
+        frasi.append(", ".join(ritorno) + ".")
+    if c.get("ora_rientro_sede"):
+        frasi.append(f"Liberi e operativi alle {c['ora_rientro_sede']}.")
+    return " ".join(frasi)
+
+
+def carica(trascrizioni):
+    """Coppie (nome, trascrizione, cartella attesa)."""
+    if trascrizioni:
+        coppie = []
+        for percorso in sorted(glob.glob(os.path.join(trascrizioni, "*.txt"))):
+            with open(percorso, "r", encoding="utf-8") as f, open(percorso[:-4] + ".json", "r", encoding="utf-8") as g:
+                coppie.append((os.path.basename(percorso), f.read(), json.load(g)))
+        return coppie
+    coppie = []
+    for i, percorso in enumerate(sorted(glob.glob("cartella_clinica/*.json"))):
+        with open(percorso, "r", encoding="utf-8") as f:
+            cartella = json.load(f)
+        coppie.append((os.path.basename(percorso), dettatura(cartella, i), cartella))
+    return coppie
+
+
+# ----------------------------
+# Concordanza
+# ----------------------------
+def concorda(campo, estratto, atteso):
+    if atteso in (None, "", []):
+        return None  # campo non verificabile
+    if campo.startswith("ora_") or campo in CAMPI_NUMERICI:
+        return re.sub(r"\D", "", str(estratto)) == re.sub(r"\D", "", str(atteso))
+    a, b = normalizza(str(estratto)), normalizza(str(atteso))
+    return a == b or a in b or b in a
+
+
+def concorda_parametro(estratto, atteso):
+    if not NUMERI.search(str(atteso or "")):
+        return None
+    numeri = lambda v: [float(n.replace(",", ".")) for n in NUMERI.findall(str(v))]  # noqa: E731
+    # "60 bpm" non concorda con "<60 bpm": una soglia letta come misura è un errore
+    return numeri(estratto) == numeri(atteso) and confronto(estratto) == confronto(atteso)
+
+
+def confronta(trovati, atteso):
+    esiti = []
+    for campo, valore in trovati.items():
+        if campo == "parametri_vitali":
+            attese = atteso.get("parametri_vitali") or []
+            for i, rilevazione in enumerate(valore):
+                for chiave, v in rilevazione.items():
+                    esiti.append(concorda_parametro(v, attese[i].get(chiave)) if i < len(attese) else False)
+        else:
+            esiti.append(concorda(campo, valore, atteso.get(campo)))
+    return [e for e in esiti if e is not None]
+
+
+def copertura_parametri(trovati, atteso):
+    """(parametri vitali attesi trovati dalle regole, parametri vitali attesi): il resto va al modello."""
+    attese = [r for r in atteso.get("parametri_vitali") or [] if isinstance(r, dict)]
+    estratte = trovati.get("parametri_vitali") or []
+    attesi = [(i, campo) for i, r in enumerate(attese) for campo in FORMULAZIONI if _numero(r.get(campo))]
+    ricavati = [(i, campo) for i, campo in attesi if i < len(estratte) and campo in estratte[i]]
+    return len(ricavati), len(attesi)
+
+
+def risposta_attesa(atteso, campi):
+    """La cartella attesa ridotta ai campi richiesti: approssima l'output del modello."""
+    risposta = {k: atteso.get(k, v) for k, v in campi.items()}
+    chiavi = set(campi["parametri_vitali"][0])
+    risposta["parametri_vitali"] = [
+        {k: v for k, v in r.items() if k in chiavi} for r in atteso.get("parametri_vitali") or [] if isinstance(r, dict)
+    ]
+    return json.dumps(risposta, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trascrizioni", default=None, help="Cartella di coppie .txt/.json (default: dettature sintetiche)")
+    parser.add_argument("--ms-token", type=float, default=25.0, help="Millisecondi per token generato, per la stima della latenza")
+    parser.add_argument("--ripetizioni", type=int, default=200)
+    parser.add_argument("--mostra", action="store_true", help="Stampa la prima trascrizione e i campi trovati")
+    args = parser.parse_args()
+
+    coppie = carica(args.trascrizioni)
+    preestrazione.preestrai(coppie[0][1])  # caricamento del gazetteer fuori dalla misura
+
+    righe, esiti_totali, secondi = [], [], 0.0
+    coperti, attesi = 0, 0
+    for nome, testo, atteso in coppie:
+        inizio = time.perf_counter()
+        for _ in range(args.ripetizioni):
+            trovati = preestrazione.preestrai(testo)
+        secondi += (time.perf_counter() - inizio) / args.ripetizioni
+
+        esiti = confronta(trovati, atteso)
+        esiti_totali += esiti
+        parametri = copertura_parametri(trovati, atteso)
+        coperti, attesi = coperti + parametri[0], attesi + parametri[1]
+        ridotto = estrazione.modello_ridotto(trovati)
+        righe.append({
+            "file": nome,
+            "campi_regole": len(trovati) - ("parametri_vitali" in trovati) + sum(
+                len(r) for r in trovati.get("parametri_vitali", [])
+            ),
+            "concordanti": sum(esiti),
+            "prompt_completo": stima_token(estrazione.prompt_estrazione(testo)),
+            "prompt_ridotto": stima_token(estrazione.prompt_estrazione(testo, trovati)),
+            "output_completo": stima_token(risposta_attesa(atteso, estrazione.MODELLO_CARTELLA)),
+            "output_ridotto": stima_token(risposta_attesa(atteso, ridotto)),
+        })
+    if args.mostra:
+        print(coppie[0][1], "\n", json.dumps(preestrazione.preestrai(coppie[0][1]), indent=1, ensure_ascii=False), "\n")
+
+    colonne = list(righe[0])
+    print("  ".join(f"{c:>16}" for c in colonne))
+    for riga in righe:
+        print("  ".join(f"{riga[c]!s:>16}" for c in colonne))
+
+    totale = {c: sum(r[c] for r in righe) for c in colonne[1:]}
+    print()
+    print(f"Documenti: {len(righe)}, pre-estrazione media {secondi / len(righe) * 1e6:.0f} µs")
+    origine = "trascrizioni fornite" if args.trascrizioni else "dettature sintetiche, non è una misura di accuratezza"
+    print(f"Campi dalle regole: {totale['campi_regole']}, concordanza con la cartella attesa ({origine}): "
+          f"{sum(esiti_totali)}/{len(esiti_totali)} ({sum(esiti_totali) / max(len(esiti_totali), 1):.1%})")
+    print(f"Parametri vitali attesi ricavati dalle regole: {coperti}/{attesi} (gli altri restano al modello)")
+    for tipo in ("prompt", "output"):
+        completo, ridotto = totale[f"{tipo}_completo"], totale[f"{tipo}_ridotto"]
+        print(f"Token {tipo}: {completo} -> {ridotto} (-{1 - ridotto / completo:.1%})")
+    risparmio = (totale["output_completo"] - totale["output_ridotto"]) * args.ms_token / 1000 / len(righe)
+    print(f"Generazione stimata a {args.ms_token:g} ms/token: -{risparmio:.1f} s per cartella")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""Suite di benchmark end-to-end su interventi sintetici, con confronto rispetto a una baseline salvata.
+
+Misura, su un database dedicato di un mongod locale:
+  - ingestione dei file JSON (ingestione.py, con normalizzazione)
+  - job di analisi (motore locale; Spark con --spark) e scrittura degli output Parquet
+  - preparazione dei dati di ogni sezione della dashboard (stesse trasformazioni di app_data.py)
+  - rendering LaTeX delle cartelle (e compilazione PDF con --pdf, se pdflatex è installato)
+
+I tempi sono il migliore di --ripetizioni esecuzioni (l'ingestione è eseguita una volta).
+Con --salva-baseline i risultati diventano la baseline per quel numero di documenti;
+senza, vengono confrontati con la baseline e le fasi più lente oltre --tolleranza sono
+segnalate come regressioni (codice di uscita 1).
+
+Uso (richiede un mongod locale):
+    python benchmarks/bench_suite.py --documenti 100000 --salva-baseline
+    python benchmarks/bench_suite.py --documenti 100000
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import db  # noqa: E402
+from genera_interventi import genera, scrivi_json  # noqa: E402
+
+DB_BENCH = "bench_cartella_clinica_db"
+CARTELLA_BASELINE = os.path.join(os.path.dirname(__file__), "baseline")
+TOLLERANZA = 0.2
+SOGLIA_RUMORE = 0.005  # secondi: differenze più piccole non sono regressioni
+RICERCHE = ["ros", "bianchi m", "mario", "de lu", "xyz"]
+
+
+def cronometra(funzione, ripetizioni):
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        risultato = funzione()
+        tempi.append(time.perf_counter() - inizio)
+    return min(tempi), risultato
+
+
+def commit_corrente():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+# ----------------------------
+# Sezioni della dashboard (stesse trasformazioni di app_data.py, senza Streamlit)
+# ----------------------------
+def sezione_mappa(gazetteer, cartella):
+    import metriche
+    import risultati
+
+    df = risultati.leggi(risultati.TOP_CITTA, cartella=cartella)
+    if "lat" not in df.columns or "lon" not in df.columns:
+        df = gazetteer.geocodifica(df, colonna="citta")
+    df_map = df.dropna(subset=["lat", "lon"])
+    return df_map.assign(radius=metriche.raggio(df_map["count"]))
+
+
+def tempi_dashboard(cartella):
+    import risultati
+
+    df_tempo = risultati.leggi(risultati.TEMPI, ["durata_minuti", "tempo_di_intervento", "ora_chiamata"], cartella)
+    return df_tempo[df_tempo["durata_minuti"] >= 0]
+
+
+def sezione_tempi(cartella):
+    import metriche
+
+    df_tempo = tempi_dashboard(cartella)
+    df_fasce = metriche.fascia_durata(df_tempo["durata_minuti"]).value_counts(sort=False).reset_index()
+    return df_fasce, df_tempo["tempo_di_intervento"].mean()
+
+
+def sezione_distribuzione(cartella):
+    import risultati
+
+    df_dist = risultati.leggi(risultati.DISTRIBUZIONE, cartella=cartella)
+    df_dist["percentuale_fascia_media"] = 100 - df_dist["percentuale_rapidi"] - df_dist["percentuale_lenti"]
+    return df_dist.melt(
+        id_vars=["citta"],
+        value_vars=["percentuale_rapidi", "percentuale_fascia_media", "percentuale_lenti"],
+        var_name="Tipo",
+        value_name="Percentuale",
+    )
+
+
+def sezione_fasce_orarie(cartella):
+    import metriche
+
+    df_tempo = tempi_dashboard(cartella)
+    return metriche.fascia_oraria(df_tempo["ora_chiamata"] // 60).value_counts(sort=False).reset_index()
+
+
+def sezione_decessi(collection):
+    import app_data
+
+    df = app_data.QUERY["esiti_interventi"](collection)
+    decessi = df[df["decesso_sul_posto"] == True]  # noqa: E712
+    df["citta"] = df["citta"].fillna("Non specificata")
+    df_citta = df.groupby("citta").size().reset_index(name="interventi_totali")
+    df_decessi = decessi.groupby("citta").size().reset_index(name="decessi")
+    return pd.merge(df_citta, df_decessi, on="citta", how="left").fillna(0)
+
+
+# ----------------------------
+# Fasi della suite
+# ----------------------------
+def misura(args, cartella_lavoro):
+    import analisi
+    import analisi_locale
+    import analisi_mongo
+    import ricerca_pazienti
+    import risultati
+    from cartella_latex import genera_latex
+    from gazetteer import Gazetteer
+    from ingestione import ingerisci
+    from metriche import SOGLIA_LENTO, SOGLIA_RAPIDO
+
+    misure = {}
+    r = args.ripetizioni
+
+    def registra(fase, secondi):
+        misure[fase] = secondi
+        print(f"  {fase:<26} {secondi:>10.4f} s")
+
+    cartella_json = os.path.join(cartella_lavoro, "json")
+    cartella_output = os.path.join(cartella_lavoro, "output")
+    inizio = time.perf_counter()
+    scrivi_json(genera(args.documenti, args.seed, args.pazienti), cartella_json)
+    # Costo della suite, non del codice misurato: escluso dal confronto con la baseline
+    print(f"  {'(generazione dei dati)':<26} {time.perf_counter() - inizio:>10.4f} s")
+
+    client = db.crea_client(args.uri)
+    client.drop_database(DB_BENCH)
+    collection = client[DB_BENCH][db.COLLECTION_NAME]
+
+    inizio = time.perf_counter()
+    riepilogo = ingerisci(cartella_json, args.uri, os.path.join(cartella_lavoro, "manifest.json"), processi=args.processi)
+    registra("ingestione", time.perf_counter() - inizio)
+    if riepilogo["inseriti"] != args.documenti:
+        print(f"Attenzione: {riepilogo['inseriti']} documenti inseriti su {args.documenti}")
+
+    # Job di analisi sull'intera collezione
+    fine = datetime.now(timezone.utc)
+    secondi, (tempi, parziali) = cronometra(
+        lambda: analisi_locale.calcola(None, fine, SOGLIA_RAPIDO, SOGLIA_LENTO, uri=args.uri), r
+    )
+    registra("analisi.locale", secondi)
+    if args.spark:
+        import analisi_spark
+
+        inizio = time.perf_counter()
+        spark = analisi_spark.crea_sessione(args.uri)
+        registra("analisi.spark_avvio", time.perf_counter() - inizio)
+        try:
+            secondi, _ = cronometra(
+                lambda: analisi_spark.calcola(None, fine, SOGLIA_RAPIDO, SOGLIA_LENTO, spark=spark, uri=args.uri), r
+            )
+        finally:
+            spark.stop()
+        registra("analisi.spark", secondi)
+
+    def scrivi_output():
+        conteggi = analisi.unisci_conteggi(pd.DataFrame(columns=analisi.COLONNE_CONTEGGI), parziali)
+        risultati.scrivi(tempi, risultati.TEMPI, cartella=cartella_output)
+        risultati.scrivi(analisi.distribuzione_estremi(conteggi), risultati.DISTRIBUZIONE, cartella=cartella_output)
+        risultati.scrivi(analisi.top_citta(conteggi), risultati.TOP_CITTA, cartella=cartella_output)
+
+    registra("analisi.output", cronometra(scrivi_output, r)[0])
+
+    # Pagina Ambulanze
+    inizio = time.perf_counter()
+    gazetteer = Gazetteer()
+    registra("ambulanze.gazetteer", time.perf_counter() - inizio)
+    registra("ambulanze.mappa", cronometra(lambda: sezione_mappa(gazetteer, cartella_output), r)[0])
+    registra("ambulanze.tempi", cronometra(lambda: sezione_tempi(cartella_output), r)[0])
+    registra("ambulanze.distribuzione", cronometra(lambda: sezione_distribuzione(cartella_output), r)[0])
+    registra("ambulanze.fasce_orarie", cronometra(lambda: sezione_fasce_orarie(cartella_output), r)[0])
+    registra("ambulanze.decessi", cronometra(lambda: sezione_decessi(collection), r)[0])
+
+    # Pagina Pazienti
+    secondi, indice = cronometra(lambda: ricerca_pazienti.IndicePazienti(ricerca_pazienti.nomi_pazienti(collection)), r)
+    registra("pazienti.indice", secondi)
+    secondi, trovati = cronometra(lambda: [indice.cerca(testo) for testo in RICERCHE], r)
+    registra("pazienti.ricerca", secondi / len(RICERCHE))
+    nome = next((t[0] for t in trovati if t), None)
+    if nome:
+        registra("pazienti.scheda", cronometra(lambda: ricerca_pazienti.interventi_paziente(collection, nome), r)[0])
+    registra("pazienti.sintomi", cronometra(lambda: analisi_mongo.sintomi_frequenti(collection, limite=15), r)[0])
+    registra("pazienti.fasce_eta", cronometra(lambda: analisi_mongo.sintomi_per_fascia_eta(collection, top_sintomi=10), r)[0])
+    registra("pazienti.farmaci", cronometra(lambda: analisi_mongo.farmaci_frequenti(collection, limite=15), r)[0])
+
+    # Cartelle cliniche: rendering LaTeX (ed eventualmente PDF) di un campione
+    campione = list(collection.find({}, {"_id": 0}).limit(args.latex))
+    secondi, sorgenti = cronometra(lambda: [genera_latex(doc) for doc in campione], r)
+    registra("latex.render", secondi / max(len(campione), 1))
+    if args.pdf and shutil.which("pdflatex"):
+        import compila_pdf
+
+        documenti = {f"sintetico_{i:05d}": sorgente for i, sorgente in enumerate(sorgenti[: args.pdf])}
+        inizio = time.perf_counter()
+        compila_pdf.compila(
+            documenti, os.path.join(cartella_lavoro, "pdf"), os.path.join(cartella_lavoro, "latex"), forza=True
+        )
+        registra("pdf.compilazione", (time.perf_counter() - inizio) / len(documenti))
+    elif args.pdf:
+        print("  pdflatex non trovato: compilazione PDF non misurata")
+
+    if not args.mantieni:
+        client.drop_database(DB_BENCH)
+    client.close()
+    return misure
+
+
+# ----------------------------
+# Baseline
+# ----------------------------
+def percorso_baseline(documenti):
+    return os.path.join(CARTELLA_BASELINE, f"suite_{documenti}.json")
+
+
+def salva_baseline(percorso, misure, args):
+    os.makedirs(os.path.dirname(percorso), exist_ok=True)
+    contenuto = {
+        "documenti": args.documenti,
+        "seed": args.seed,
+        "commit": commit_corrente(),
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "ambiente": {"python": platform.python_version(), "sistema": platform.platform(), "cpu": os.cpu_count()},
+        "misure": misure,
+    }
+    with open(percorso + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(contenuto, f, indent=1)
+    os.replace(percorso + ".tmp", percorso)
+
+
+def confronta(misure, baseline, tolleranza):
+    """Tabella fase/tempo/baseline/rapporto e lista delle fasi in regressione."""
+    righe, regressioni = [], []
+    for fase, secondi in misure.items():
+        riferimento = baseline["misure"].get(fase)
+        rapporto = secondi / riferimento if riferimento else None
+        regressione = (
+            rapporto is not None and rapporto > 1 + tolleranza and secondi - riferimento > SOGLIA_RUMORE
+        )
+        if regressione:
+            regressioni.append(fase)
+        righe.append((fase, secondi, riferimento, rapporto, "REGRESSIONE" if regressione else ""))
+    return pd.DataFrame(righe, columns=["fase", "secondi", "baseline", "rapporto", ""]), regressioni
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default=db.MONGO_URI)
+    parser.add_argument("--documenti", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--pazienti", type=int, default=None, help="Anagrafiche distinte (default: un terzo dei documenti)")
+    parser.add_argument("--processi", type=int, default=None, help="Processi per il parsing nell'ingestione")
+    parser.add_argument("--ripetizioni", type=int, default=3)
+    parser.add_argument("--latex", type=int, default=1000, help="Cartelle del campione per il rendering LaTeX")
+    parser.add_argument("--pdf", type=int, default=0, help="Cartelle del campione da compilare in PDF (0: nessuna)")
+    parser.add_argument("--spark", action="store_true", help="Misura anche il job Spark (richiede Java e PySpark)")
+    parser.add_argument("--salva-baseline", action="store_true", help="Salva i risultati come nuova baseline")
+    parser.add_argument("--tolleranza", type=float, default=TOLLERANZA, help="Rallentamento ammesso rispetto alla baseline")
+    parser.add_argument("--mantieni", action="store_true", help="Non cancella il database di benchmark alla fine")
+    args = parser.parse_args()
+    args.pazienti = args.pazienti or max(1, args.documenti // 3)
+
+    # Tutti i moduli leggono il nome del database da db.py: la suite lavora su un database dedicato
+    db.DB_NAME = DB_BENCH
+
+    print(f"Suite su {args.documenti} interventi sintetici (seed {args.seed}), migliore di {args.ripetizioni} esecuzioni")
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as cartella_lavoro:
+        misure = misura(args, cartella_lavoro)
+
+    percorso = percorso_baseline(args.documenti)
+    if args.salva_baseline:
+        salva_baseline(percorso, misure, args)
+        print(f"\nBaseline salvata in {percorso}")
+        return
+    if not os.path.exists(percorso):
+        print(f"\nNessuna baseline per {args.documenti} documenti: eseguire con --salva-baseline")
+        return
+
+    with open(percorso, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    tabella, regressioni = confronta(misure, baseline, args.tolleranza)
+    print(f"\nConfronto con la baseline del {baseline['data']} (commit {baseline['commit'] or '?'}):")
+    print(tabella.to_string(index=False, float_format="{:.4f}".format, na_rep="-"))
+    if regressioni:
+        print(f"\nRegressioni oltre il {args.tolleranza:.0%}: {', '.join(regressioni)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""Generatore riproducibile di interventi sintetici con lo schema di cartella_clinica/json_1.json.
+
+Le distribuzioni imitano il servizio reale: città pesate per popolazione con una
+coda di comuni minori, chiamate concentrate nelle ore diurne, tempi delle fasi
+log-normali (con passaggio della mezzanotte), scenari clinici che determinano
+sintomi, farmaci, parametri vitali ed esito. I valori hanno le stesse varianti di
+formato prodotte dall'LLM ("78 anni", "circa 40 anni", "<60 bpm", "GIALLO", ...).
+
+Uso:
+    python benchmarks/genera_interventi.py 100000 --formato json --uscita dati/sintetici
+    python benchmarks/genera_interventi.py 1000000 --formato jsonl --uscita dati/sintetici.jsonl
+    python benchmarks/genera_interventi.py 1000000 --formato mongo --db bench_cartella_clinica_db
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import db  # noqa: E402
+
+PERCORSO_MODELLO = "cartella_clinica/json_1.json"
+PERCORSO_COMUNI = "dati/comuni_italiani.csv"
+LOTTO = 10000
+
+# ----------------------------
+# Tabelle delle distribuzioni
+# ----------------------------
+# (città, provincia, cap, ospedali, peso ~ popolazione in migliaia)
+CITTA = [
+    ("Roma", "RM", "00172", ["Ospedale Sandro Pertini", "Policlinico Umberto I", "Ospedale San Camillo"], 2750),
+    ("Milano", "MI", "20121", ["Ospedale Niguarda", "Ospedale San Raffaele, Milano", "Policlinico di Milano"], 1370),
+    ("Napoli", "NA", "80121", ["Ospedale Cardarelli", "Ospedale del Mare"], 910),
+    ("Torino", "TO", "10121", ["Ospedale Molinette", "Ospedale Maria Vittoria"], 840),
+    ("Palermo", "PA", "90121", ["Ospedale Civico di Palermo", "Policlinico Paolo Giaccone"], 630),
+    ("Genova", "GE", "16121", ["Ospedale San Martino", "Ospedale Galliera"], 560),
+    ("Bologna", "BO", "40123", ["Ospedale Maggiore, Bologna", "Policlinico Sant'Orsola"], 390),
+    ("Firenze", "FI", "50123", ["Ospedale Careggi, Firenze", "Ospedale Santa Maria Nuova"], 360),
+    ("Bari", "BA", "70121", ["Policlinico di Bari", "Ospedale Di Venere"], 320),
+    ("Verona", "VR", "37121", ["Ospedale Borgo Trento"], 255),
+    ("Padova", "PD", "35121", ["Azienda Ospedaliera di Padova"], 210),
+    ("Parma", "PR", "43121", ["Ospedale Maggiore di Parma"], 195),
+    ("Modena", "MO", "41121", ["Policlinico di Modena", "Ospedale di Baggiovara"], 185),
+    ("Reggio Emilia", "RE", "42121", ["Arcispedale Santa Maria Nuova"], 170),
+    ("Piacenza", "PC", "29121", ["Ospedale Guglielmo da Saliceto, Piacenza"], 103),
+    ("Arezzo", "AR", "52100", ["Ospedale San Donato di Arezzo"], 98),
+    ("Pisa", "PI", "56121", ["Ospedale Cisanello"], 90),
+    ("Siena", "SI", "53100", ["Ospedale Santa Maria alle Scotte"], 53),
+    ("Empoli", "FI", "50053", ["Ospedale San Giuseppe di Empoli"], 48),
+    ("Fidenza", "PR", "43036", ["Ospedale di Vaio", "Ospedale di Fidenza"], 27),
+]
+PESO_CODA = 0.08  # quota di interventi nei comuni minori (dal file dei comuni, senza cap né ospedale noto)
+
+# Chiamate per ora del giorno (profilo diurno tipico del 118)
+PESI_ORA = [
+    2.0, 1.6, 1.3, 1.1, 1.0, 1.1, 1.6, 2.6, 3.6, 4.2, 4.5, 4.6,
+    4.4, 4.1, 4.0, 4.1, 4.3, 4.4, 4.3, 4.0, 3.6, 3.2, 2.8, 2.4,
+]
+
+# Minuti tra una fase e la successiva: (mediana, dispersione log-normale)
+FASI = [
+    ("ora_partenza_ambulanza", 3, 0.5),
+    ("ora_arrivo_sul_posto", 9, 0.45),
+    ("ora_partenza_dal_posto", 18, 0.45),
+    ("ora_arrivo_ps", 14, 0.5),
+    ("ora_rientro_sede", 20, 0.5),
+]
+
+# Codici di uscita/rientro con le varianti di scrittura osservate: (uscita, rientro, peso)
+CODICI = [
+    (["Rosso", "ROSSO", "D1"], ["Giallo", "Nero", "D2"], 0.15),
+    (["Giallo", "GIALLO", "D2"], ["Verde", "VERDE", "D3"], 0.5),
+    (["Verde", "VERDE", "D3"], ["Verde", "Bianco", "D4"], 0.3),
+    (["D4", "Bianco"], ["D5", "Bianco"], 0.05),
+]
+
+# Scenario clinico: sintomi, farmaci, stato di coscienza, probabilità di decesso sul posto, peso
+SCENARI = {
+    "respiratorio": (
+        ["dispnea", "tosse", "bradipnea", "tachipnea", "cianosi periferica", "respirazione rumorosa con russamento",
+         "sibili espiratori", "affanno a riposo", "febbre"],
+        ["ossigeno", "salbutamolo aerosol", "idrocortisone 100mg", "metilprednisolone"],
+        ["vigile", "agitato ma cosciente", "confuso"], 0.005, 0.18,
+    ),
+    "cardiaco": (
+        ["dolore toracico", "dolore toracico irradiato al braccio sinistro", "sudorazione profusa", "palpitazioni",
+         "nausea", "dispnea", "pallore", "ipotensione"],
+        ["aspirina 250mg OS", "nitroglicerina sublinguale", "ossigeno", "morfina 4mg", "eparina 5000 UI"],
+        ["vigile", "vigile e orientato", "agitato"], 0.01, 0.2,
+    ),
+    "neurologico": (
+        ["emiparesi destra con deviazione della rima orale", "difficoltà a parlare", "stato confusionale",
+         "cefalea intensa", "convulsioni", "perdita di coscienza transitoria", "vertigini"],
+        ["diazepam 10mg", "glucosio 33%", "ossigeno"],
+        ["confuso", "risponde solo a stimoli verbali", "semicosciente, confuso"], 0.01, 0.14,
+    ),
+    "trauma": (
+        ["dolore alla caviglia destra", "ferita lacero-contusa al capo", "dolore al polso sinistro", "trauma cranico",
+         "impossibilità a deambulare", "escoriazioni multiple", "dolore lombare", "deformità dell'arto"],
+        ["paracetamolo", "ketorolac 30mg", "fentanyl 50mcg", "ghiaccio istantaneo"],
+        ["vigile e orientato", "vigile", "confuso"], 0.005, 0.25,
+    ),
+    "metabolico": (
+        ["ipoglicemia", "sudorazione fredda", "astenia", "vomito", "disorientamento", "iperglicemia"],
+        ["glucosio 33%", "soluzione glucosata 10%", "insulina rapida"],
+        ["confuso", "vigile", "sonnolento"], 0.003, 0.1,
+    ),
+    "arresto": (
+        ["arresto cardiorespiratorio", "assenza di polso", "apnea", "midriasi fissa", "cianosi generalizzata"],
+        ["adrenalina 1mg (x3)", "adrenalina 1mg (x4)", "amiodarone", "atropina"],
+        ["incosciente"], 0.65, 0.03,
+    ),
+    "altro": (
+        ["malessere generale", "dolore addominale", "febbre", "lipotimia", "agitazione psicomotoria", "ansia"],
+        ["paracetamolo", "monitoraggio continuo", "soluzione fisiologica"],
+        ["vigile", "vigile e orientata", "agitata ma cosciente"], 0.002, 0.1,
+    ),
+}
+
+NOMI_M = ["Mario", "Luca", "Giuseppe", "Marco", "Andrea", "Francesco", "Alessandro", "Giovanni", "Paolo", "Stefano",
+          "Roberto", "Antonio", "Davide", "Matteo", "Lorenzo", "Simone", "Franco", "Bruno", "Sergio", "Enrico"]
+NOMI_F = ["Maria", "Anna", "Giulia", "Francesca", "Laura", "Sara", "Elena", "Chiara", "Paola", "Giovanna",
+          "Lucia", "Rosa", "Silvia", "Martina", "Valentina", "Federica", "Carla", "Teresa", "Angela", "Marta"]
+COGNOMI = ["Rossi", "Russo", "Ferrari", "Esposito", "Bianchi", "Romano", "Colombo", "Ricci", "Marino", "Greco",
+           "Bruno", "Gallo", "Conti", "De Luca", "Mancini", "Costa", "Giordano", "Rizzo", "Lombardi", "Moretti",
+           "Barbieri", "Fontana", "Santoro", "Mariani", "Rinaldi", "Caruso", "Ferrara", "Galli", "Martini", "Leone"]
+VIE = ["Roma", "Garibaldi", "Mazzini", "Verdi", "Dante", "Cavour", "Matteotti", "Marconi", "XX Settembre", "Venezia",
+       "Gramsci", "della Repubblica", "Nazionale", "Manzoni", "Puccini"]
+RELAZIONI = ["figlio", "figlia", "moglie", "marito", "parente", "vicino di casa", "passante", "collega", "amico", ""]
+RUOLI = ["autista soccorritore", "soccorritore", "infermiere", "capoequipaggio", "medico"]
+PATOLOGIE = ["ipertensione", "diabete mellito", "BPCO", "fibrillazione atriale", "scompenso cardiaco", "asma bronchiale",
+             "infarto pregresso", "artrosi"]
+MESI = ["gennaio", "febbraio", "marzo", "aprile", "maggio", "giugno", "luglio", "agosto", "settembre", "ottobre",
+        "novembre", "dicembre"]
+
+
+def _carica_modello(percorso=PERCORSO_MODELLO):
+    with open(percorso, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _comuni_minori(percorso=PERCORSO_COMUNI):
+    noti = {c[0] for c in CITTA}
+    comuni = []
+    with open(percorso, "r", encoding="utf-8") as f:
+        next(f)
+        for riga in f:
+            parti = riga.rstrip("\n").split(",")
+            if len(parti) >= 2 and parti[0] not in noti:
+                comuni.append((parti[0], parti[1]))
+    return comuni
+
+
+def _cumulati(pesi):
+    totale, cumulati = 0.0, []
+    for peso in pesi:
+        totale += peso
+        cumulati.append(totale)
+    return cumulati
+
+
+# ----------------------------
+# Generatore
+# ----------------------------
+class GeneratoreInterventi:
+    """Documenti sintetici riproducibili: stesso seed, stessa sequenza di documenti."""
+
+    def __init__(self, seed=42, giorni=365, fine=date(2025, 6, 30), pazienti=None):
+        self.rng = random.Random(seed)
+        self.modello = _carica_modello()
+        self.comuni_minori = _comuni_minori()
+        self.pesi_citta = _cumulati([c[4] for c in CITTA])
+        self.pesi_ora = _cumulati(PESI_ORA)
+        self.pesi_codici = _cumulati([c[2] for c in CODICI])
+        self.scenari = list(SCENARI)
+        self.pesi_scenari = _cumulati([SCENARI[s][4] for s in self.scenari])
+        self.giorni = [fine - timedelta(days=i) for i in range(giorni)]
+        # Anagrafiche ripetute: uno stesso paziente ha più interventi (come nella ricerca per nome)
+        self.pazienti = pazienti
+        self.anagrafiche = {}
+
+    def _scegli(self, valori, cumulati):
+        return valori[self._indice(cumulati)]
+
+    def _indice(self, cumulati):
+        soglia = self.rng.random() * cumulati[-1]
+        basso, alto = 0, len(cumulati) - 1
+        while basso < alto:
+            medio = (basso + alto) // 2
+            if cumulati[medio] < soglia:
+                basso = medio + 1
+            else:
+                alto = medio
+        return basso
+
+    def _anagrafica(self, i, giorno):
+        chiave = self.rng.randrange(self.pazienti) if self.pazienti else i
+        if chiave in self.anagrafiche:
+            return self.anagrafiche[chiave]
+        rng = self.rng
+        maschio = rng.random() < 0.5
+        nome = rng.choice(NOMI_M if maschio else NOMI_F)
+        # Età sbilanciata verso gli anziani, come la casistica del soccorso
+        eta = min(102, max(0, int(rng.triangular(0, 100, 82))))
+        nascita = giorno - timedelta(days=eta * 365 + rng.randrange(365))
+        anagrafica = (f"{rng.choice(COGNOMI)} {nome}", maschio, nascita)
+        if self.pazienti:
+            self.anagrafiche[chiave] = anagrafica
+        return anagrafica
+
+    def _orari(self, chiamata):
+        orari = {"ora_chiamata": chiamata}
+        minuti = chiamata
+        for campo, mediana, dispersione in FASI:
+            minuti += max(1, round(mediana * math.exp(self.rng.gauss(0, dispersione))))
+            orari[campo] = minuti
+        return {campo: f"{(m // 60) % 24:02d}:{m % 60:02d}" for campo, m in orari.items()}
+
+    def _eta(self, eta):
+        forma = self.rng.random()
+        if forma < 0.45:
+            return str(eta)
+        if forma < 0.8:
+            return f"{eta} anni"
+        if forma < 0.9:
+            return f"circa {round(eta, -1) or 5} anni"
+        return self.rng.choice(["", None])
+
+    def _data_nascita(self, nascita):
+        forma = self.rng.random()
+        if forma < 0.6:
+            return nascita.isoformat()
+        if forma < 0.75:
+            return nascita.strftime("%d/%m/%Y")
+        if forma < 0.85:
+            return f"{nascita.day} {MESI[nascita.month - 1]} {nascita.year}"
+        return self.rng.choice(["", None])
+
+    def _parametri(self, scenario, decesso, ora):
+        rng = self.rng
+        if decesso:
+            return [{
+                "tempo_rilevazione": ora, "frequenza_cardiaca": "0", "pressione_arteriosa": "0",
+                "frequenza_respiratoria": "0", "saturazione_ossigeno": "0",
+                "glicemia": f"{rng.randint(80, 130)} mg/dL", "temperatura": f"{rng.uniform(33, 35.5):.1f} °C",
+                "AVPU": "U", "pupille_PEARL": "fisse e dilatate", "ECG": "linea piatta",
+            }]
+        alterato = scenario in ("respiratorio", "cardiaco", "arresto")
+        rilevazioni = []
+        for _ in range(1 if rng.random() < 0.7 else 2):
+            fc = rng.randint(95, 130) if alterato else rng.randint(55, 100)
+            fr = rng.randint(12, 32 if alterato else 20)
+            sistolica = rng.randint(90, 170)
+            rilevazioni.append({
+                "tempo_rilevazione": ora if rng.random() < 0.8 else "",
+                "frequenza_cardiaca": "<60 bpm" if fc < 60 else rng.choice([str(fc), f"{fc} bpm"]),
+                "pressione_arteriosa": rng.choice([f"{sistolica}/{sistolica - rng.randint(30, 60)}", ""])
+                if rng.random() < 0.9 else "",
+                "frequenza_respiratoria": rng.choice([str(fr), f"{fr} atti al minuto"]),
+                "saturazione_ossigeno": rng.choice([f"{rng.randint(86 if alterato else 94, 100)}%", ""]),
+                "glicemia": rng.choice([f"{rng.randint(70, 180)} mg/dL", str(rng.randint(70, 180)), ""]),
+                "temperatura": rng.choice([f"{rng.uniform(35.8, 38.5):.1f}°C", f"{rng.uniform(35.8, 38.5):.1f}", ""]),
+                "AVPU": rng.choice(["A", "V", "A"]),
+                "pupille_PEARL": "reagenti e simmetriche",
+                "ECG": rng.choice(["ritmo sinusale", "tachicardia sinusale", "fibrillazione atriale", ""]),
+            })
+        return rilevazioni
+
+    def documento(self, i):
+        """L'i-esimo documento della sequenza (chiamare con i crescenti per la riproducibilità)."""
+        rng = self.rng
+        doc = dict.fromkeys(self.modello)
+
+        giorno = rng.choice(self.giorni)
+        if rng.random() < PESO_CODA:
+            citta, provincia = rng.choice(self.comuni_minori)
+            cap, ospedale = "", ""
+        else:
+            citta, provincia, cap, ospedali, _ = self._scegli(CITTA, self.pesi_citta)
+            ospedale = rng.choice(ospedali)
+        chiamata = self._indice(self.pesi_ora) * 60 + rng.randrange(60)
+        orari = self._orari(chiamata)
+        uscite, rientri, _ = self._scegli(CODICI, self.pesi_codici)
+        scenario = self._scegli(self.scenari, self.pesi_scenari)
+        sintomi, farmaci, coscienza, p_decesso, _ = SCENARI[scenario]
+        decesso = rng.random() < p_decesso
+        nome, maschio, nascita = self._anagrafica(i, giorno)
+        eta = giorno.year - nascita.year - ((giorno.month, giorno.day) < (nascita.month, nascita.day))
+        via, civico = rng.choice(VIE), str(rng.randint(1, 180))
+
+        doc.update(orari)
+        doc.update({
+            "data": giorno.isoformat() if rng.random() < 0.8 else "",
+            "codice_uscita": rng.choice(uscite),
+            "codice_rientro": "Nero" if decesso else rng.choice(rientri),
+            "tipo_mezzo": rng.choice(["ambulanza", "MSA", "MSB", "ambulanza"]),
+            "numero_intervento": f"{provincia or 'XX'}{i:08d}",
+            "indirizzo_intervento": f"via {via} {civico}, {citta}",
+            "via": via,
+            "numero_civico": civico,
+            "citta": citta,
+            "provincia": provincia if rng.random() < 0.85 else rng.choice([None, ""]),
+            "cap": cap if rng.random() < 0.8 else rng.choice([None, ""]),
+            "telefono_chiamante": rng.choice(["3", "0"]) + "".join(str(rng.randrange(10)) for _ in range(9)),
+            "cognome_nome_paziente": nome,
+            "sesso": rng.choice(["M", "maschile"] if maschio else ["F", "femminile"]) if rng.random() < 0.9 else None,
+            "data_nascita": self._data_nascita(nascita),
+            "eta": self._eta(eta),
+            "residenza": f"via {rng.choice(VIE)} {rng.randint(1, 120)}, {citta}",
+            "citta_residenza": citta,
+            "relazione_con_paziente": rng.choice(RELAZIONI),
+            "stato_coscienza": "incosciente" if decesso else rng.choice(coscienza),
+            "sintomi": rng.sample(sintomi, rng.randint(1, min(len(sintomi), 6))),
+            "allergie": rng.choice(["nessuna nota", "nessuna nota", "penicillina", "non note", ""]),
+            "patologie_pregresse": ", ".join(rng.sample(PATOLOGIE, rng.randint(0, 2))),
+            "parametri_vitali": self._parametri(scenario, decesso, orari["ora_arrivo_sul_posto"]),
+            "ossigenoterapia": rng.choice([True, False, "sì", "no"]),
+            "flusso_ossigeno": rng.choice(["", "4 L/min", "6 L/min", "15 L/min"]),
+            "farmaci_somministrati": rng.sample(farmaci, rng.randint(0, min(len(farmaci), 3))),
+            "accesso_venoso": rng.choice([None, "sì", "no", "posizionato accesso venoso periferico"]),
+            "monitoraggio_continuo": rng.random() < 0.7,
+            "mezzo_trasporto": "ambulanza",
+            "ospedale_destinazione": "" if decesso else ospedale,
+            "paziente_rifiuto_trasporto": not decesso and rng.random() < 0.03,
+            "forze_dell'ordine_presenti": rng.random() < 0.15,
+            "decesso_sul_posto": decesso,
+            "paziente_consegnato_ps": not decesso,
+            "ruolo_soccorritore_1": rng.choice(RUOLI),
+            "ruolo_soccorritore_2": rng.choice(RUOLI),
+            "note_intervento": "",
+        })
+        if decesso:
+            doc["ora_arrivo_ps"] = ""
+        if rng.random() < 0.1:
+            # Come nelle trascrizioni reali, alcuni farmaci sono registrati con dose e via
+            doc["farmaci_somministrati"] = [
+                {"nome": f.split()[0], "dose": " ".join(f.split()[1:]), "via": "ev"} for f in doc["farmaci_somministrati"]
+            ]
+        return doc
+
+    def genera(self, n, inizio=0):
+        for i in range(inizio, inizio + n):
+            yield self.documento(i)
+
+
+def genera(n, seed=42, pazienti=None):
+    """n documenti sintetici (con `pazienti` anagrafiche distinte, default una per intervento)."""
+    return GeneratoreInterventi(seed, pazienti=pazienti).genera(n)
+
+
+# ----------------------------
+# Scrittura
+# ----------------------------
+def scrivi_json(documenti, cartella):
+    """Un file JSON per documento, come in cartella_clinica/ (input di ingestione.py)."""
+    os.makedirs(cartella, exist_ok=True)
+    scritti = 0
+    for doc in documenti:
+        with open(os.path.join(cartella, f"sintetico_{scritti:08d}.json"), "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False)
+        scritti += 1
+    return scritti
+
+
+def scrivi_jsonl(documenti, percorso):
+    """Un documento per riga, come `mongoexport` (snapshot per analisi.py --motore locale)."""
+    scritti = 0
+    with open(percorso, "w", encoding="utf-8") as f:
+        for doc in documenti:
+            f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+            scritti += 1
+    return scritti
+
+
+def scrivi_mongo(documenti, collection, lotto=LOTTO):
+    """Inserimento diretto a lotti (documenti grezzi, senza passare dall'ingestione)."""
+    scritti, buffer = 0, []
+    for doc in documenti:
+        buffer.append(doc)
+        if len(buffer) == lotto:
+            collection.insert_many(buffer, ordered=False)
+            scritti += len(buffer)
+            buffer = []
+    if buffer:
+        collection.insert_many(buffer, ordered=False)
+        scritti += len(buffer)
+    return scritti
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("documenti", type=int, help="Numero di interventi da generare")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--pazienti", type=int, default=None, help="Anagrafiche distinte (default: una per intervento)")
+    parser.add_argument("--formato", choices=["json", "jsonl", "mongo"], default="jsonl")
+    parser.add_argument("--uscita", default="dati/sintetici.jsonl", help="Cartella (json) o file (jsonl) di destinazione")
+    parser.add_argument("--uri", default=db.MONGO_URI)
+    parser.add_argument("--db", default="bench_cartella_clinica_db", help="Database di destinazione con --formato mongo")
+    args = parser.parse_args()
+
+    inizio = time.perf_counter()
+    documenti = genera(args.documenti, args.seed, args.pazienti)
+    if args.formato == "json":
+        scritti = scrivi_json(documenti, args.uscita)
+    elif args.formato == "jsonl":
+        scritti = scrivi_jsonl(documenti, args.uscita)
+    else:
+        client = db.crea_client(args.uri)
+        scritti = scrivi_mongo(documenti, client[args.db][db.COLLECTION_NAME])
+    secondi = time.perf_counter() - inizio
+    print(f"{scritti} interventi generati in {secondi:.1f} s ({scritti / secondi:.0f} documenti/s)")
+
+
+if __name__ == "__main__":
+    main()
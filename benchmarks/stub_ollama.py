@@ -0,0 +1,113 @@
+"""Server locale che imita /api/generate di Ollama, per i benchmark senza GPU né modello.
+
+Risponde con una cartella clinica di esempio (racchiusa in un blocco ```json``` e
+seguita da un commento, come fanno i modelli reali) emessa token per token con
+un ritardo fisso. Può limitare le generazioni contemporanee e restituire errori
+503 a intervalli regolari per provare i retry.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMMENTO = (
+    "\n```\n\nHo compilato i campi presenti nel testo; i campi non menzionati sono stati lasciati vuoti "
+    "come richiesto. Se servono altre informazioni posso aggiornare il JSON."
+)
+
+
+def tokenizza(testo, caratteri=4):
+    return [testo[i:i + caratteri] for i in range(0, len(testo), caratteri)]
+
+
+class StubOllama(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, risposta, ms_token=1.0, ms_prefill=50.0, parallelo=1, errori=0.0, porta=0):
+        super().__init__(("127.0.0.1", porta), GestoreGenerate)
+        self.token = tokenizza("```json\n" + json.dumps(risposta, indent=2, ensure_ascii=False) + COMMENTO)
+        self.ms_token = ms_token
+        self.ms_prefill = ms_prefill
+        self.errori = errori
+        self.semaforo = threading.BoundedSemaphore(parallelo)
+        self.connessioni = 0
+        self.richieste = 0
+        self.token_inviati = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/api/generate"
+
+    def conta(self, **incrementi):
+        with self._lock:
+            for nome, valore in incrementi.items():
+                setattr(self, nome, getattr(self, nome) + valore)
+
+    def fallisce(self):
+        # Deterministico: con errori=0.2 fallisce una richiesta ogni cinque
+        with self._lock:
+            return int(self.richieste * self.errori) != int((self.richieste - 1) * self.errori)
+
+    def azzera(self):
+        self.connessioni = self.richieste = self.token_inviati = 0
+
+    def avvia(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class GestoreGenerate(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, come Ollama
+
+    def setup(self):
+        super().setup()
+        self.server.conta(connessioni=1)
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, stato, corpo):
+        dati = json.dumps(corpo).encode()
+        self.send_response(stato)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dati)))
+        self.end_headers()
+        self.wfile.write(dati)
+
+    def do_POST(self):
+        richiesta = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.conta(richieste=1)
+        if self.server.fallisce():
+            self._json(503, {"error": "server occupato"})
+            return
+
+        with self.server.semaforo:
+            time.sleep(self.server.ms_prefill / 1000)
+            if not richiesta.get("stream", True):
+                # La generazione è comunque token per token: la risposta parte solo alla fine
+                for _ in self.server.token:
+                    time.sleep(self.server.ms_token / 1000)
+                self.server.conta(token_inviati=len(self.server.token))
+                self._json(200, {"model": richiesta["model"], "response": "".join(self.server.token), "done": True})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for token in self.server.token:
+                    time.sleep(self.server.ms_token / 1000)
+                    self._chunk({"model": richiesta["model"], "response": token, "done": False})
+                    self.server.conta(token_inviati=1)
+                self._chunk({"model": richiesta["model"], "response": "", "done": True})
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # Il client ha chiuso lo stream: la generazione si interrompe
+                self.close_connection = True
+
+    def _chunk(self, corpo):
+        dati = json.dumps(corpo).encode() + b"\n"
+        self.wfile.write(f"{len(dati):X}\r\n".encode() + dati + b"\r\n")
+        self.wfile.flush()
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# ----------------------------
+# Cache persistente delle risposte LLM
+# ----------------------------
+# Ogni risposta è indicizzata dall'hash di (modello, versione del template, testo in ingresso):
+# rieseguire il notebook o il batch su un corpus già elaborato interroga il modello solo
+# per gli ingressi cambiati. Oltre la dimensione massima vengono eliminate le voci usate meno di recente.
+
+PERCORSO_CACHE = "dati/cache_llm.sqlite"
+DIMENSIONE_MAX = 256 * 1024 * 1024  # byte
+RIEMPIMENTO_DOPO_PULIZIA = 0.9  # la pulizia libera spazio fino al 90% del massimo
+
+
+def versione_template(*parti):
+    """Versione di un template: hash del suo contenuto, così ogni modifica invalida le voci vecchie."""
+    return hashlib.sha256(json.dumps(parti, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def chiave(modello, versione, testo):
+    return hashlib.sha256(json.dumps([modello, versione, testo], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class CacheLLM:
+    """Cache su SQLite condivisibile tra thread (e tra processi, grazie al journal WAL)."""
+
+    def __init__(self, percorso=PERCORSO_CACHE, dimensione_max=DIMENSIONE_MAX):
+        if os.path.dirname(percorso):
+            os.makedirs(os.path.dirname(percorso), exist_ok=True)
+        self.percorso = percorso
+        self.dimensione_max = dimensione_max
+        self.hit = 0
+        self.miss = 0
+        self.eliminate = 0
+        self._lock = threading.Lock()
+        self._connessione = sqlite3.connect(percorso, check_same_thread=False, timeout=30)
+        with self._connessione:
+            self._connessione.execute("PRAGMA journal_mode=WAL")
+            self._connessione.execute(
+                """CREATE TABLE IF NOT EXISTS risposte (
+                    chiave TEXT PRIMARY KEY,
+                    modello TEXT NOT NULL,
+                    versione TEXT NOT NULL,
+                    risposta TEXT NOT NULL,
+                    dimensione INTEGER NOT NULL,
+                    creata_il REAL NOT NULL,
+                    usata_il REAL NOT NULL,
+                    accessi INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            self._connessione.execute("CREATE INDEX IF NOT EXISTS risposte_usata_il ON risposte (usata_il)")
+
+    def chiudi(self):
+        self._connessione.close()
+
+    def leggi(self, modello, versione, testo):
+        """Risposta salvata per questi ingressi, o None."""
+        k = chiave(modello, versione, testo)
+        with self._lock, self._connessione:
+            riga = self._connessione.execute("SELECT risposta FROM risposte WHERE chiave = ?", (k,)).fetchone()
+            if riga is None:
+                self.miss += 1
+                return None
+            self.hit += 1
+            self._connessione.execute(
+                "UPDATE risposte SET usata_il = ?, accessi = accessi + 1 WHERE chiave = ?", (time.time(), k)
+            )
+            return riga[0]
+
+    def scrivi(self, modello, versione, testo, risposta):
+        k = chiave(modello, versione, testo)
+        adesso = time.time()
+        with self._lock, self._connessione:
+            self._connessione.execute(
+                "INSERT OR REPLACE INTO risposte (chiave, modello, versione, risposta, dimensione, creata_il, usata_il) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (k, modello, versione, risposta, len(risposta.encode("utf-8")), adesso, adesso),
+            )
+            self._pulisci()
+
+    def _pulisci(self):
+        totale = self._connessione.execute("SELECT COALESCE(SUM(dimensione), 0) FROM risposte").fetchone()[0]
+        if totale <= self.dimensione_max:
+            return
+        da_liberare = totale - int(self.dimensione_max * RIEMPIMENTO_DOPO_PULIZIA)
+        vittime = []
+        for k, dimensione in self._connessione.execute("SELECT chiave, dimensione FROM risposte ORDER BY usata_il"):
+            if da_liberare <= 0:
+                break
+            vittime.append((k,))
+            da_liberare -= dimensione
+        self._connessione.executemany("DELETE FROM risposte WHERE chiave = ?", vittime)
+        self.eliminate += len(vittime)
+
+    def ottieni(self, modello, versione, testo, calcola):
+        """Risposta in cache o, se manca, `calcola()` salvata per le volte successive.
+
+        Le risposte None (es. JSON non valido) non vengono salvate: saranno ritentate.
+        """
+        risposta = self.leggi(modello, versione, testo)
+        if risposta is None:
+            risposta = calcola()
+            if risposta is not None:
+                self.scrivi(modello, versione, testo, risposta)
+        return risposta
+
+    def statistiche(self):
+        with self._lock:
+            voci, byte = self._connessione.execute(
+                "SELECT COUNT(*), COALESCE(SUM(dimensione), 0) FROM risposte"
+            ).fetchone()
+        richieste = self.hit + self.miss
+        return {
+            "voci": voci,
+            "megabyte": round(byte / 1024 ** 2, 2),
+            "hit": self.hit,
+            "miss": self.miss,
+            "hit_rate": round(self.hit / richieste, 3) if richieste else None,
+            "eliminate": self.eliminate,
+        }
@@ -0,0 +1,366 @@
+import argparse
+import functools
+import json
+import os
+import re
+import unicodedata
+
+from testo import normalizza
+
+# ----------------------------
+# Compilazione deterministica del modulo LaTeX della cartella clinica
+# ----------------------------
+# Il template (modelli/cartella_clinica.tex) contiene segnaposto <<nome>>: ogni
+# segnaposto viene sostituito con LaTeX generato dai campi del JSON estratto,
+# senza una seconda chiamata al modello.
+
+PERCORSO_TEMPLATE = "modelli/cartella_clinica.tex"
+SEGNAPOSTO = re.compile(r"<<(\w+)>>")
+
+CARATTERI_SPECIALI = {
+    "\\": r"\textbackslash{}",
+    "&": r"\&",
+    "%": r"\%",
+    "$": r"\$",
+    "#": r"\#",
+    "_": r"\_",
+    "{": r"\{",
+    "}": r"\}",
+    "~": r"\textasciitilde{}",
+    "^": r"\textasciicircum{}",
+    # Con i font OT1 del template "<" e ">" verrebbero stampati come "¡" e "¿" ("<60 bpm")
+    "<": r"\textless{}",
+    ">": r"\textgreater{}",
+    # Simboli che inputenc utf8 non sa comporre
+    "≤": r"$\leq$",
+    "≥": r"$\geq$",
+    "≠": r"$\neq$",
+    "≈": r"$\approx$",
+    "→": r"$\rightarrow$",
+    "←": r"$\leftarrow$",
+    "↑": r"$\uparrow$",
+    "↓": r"$\downarrow$",
+    "μ": r"$\mu$",
+}
+_SPECIALI = re.compile("|".join(re.escape(c) for c in CARATTERI_SPECIALI))
+
+# Oltre il Latin-1, inputenc utf8 conosce solo la punteggiatura tipografica e l'euro
+SUPPORTATI = set("‐–—‘’‚“”„†‡•…‰‹›€™")
+_NON_LATIN1 = re.compile(r"[^\x00-\xff]")
+
+# Valori testuali che equivalgono a "no" nei campi sì/no compilati dal modello
+NEGATIVI = {"", "no", "false", "falso", "0", "nessuno", "nessuna", "null", "none"}
+
+CODICI_USCITA = [("B", "bianco"), ("V", "verde"), ("G", "giallo"), ("R", "rosso")]
+CODICI_RIENTRO = ["0", "1", "2", "3", "4"]
+
+# Caselle dei sintomi principali: etichetta e radici che le attivano
+SINTOMI_PRINCIPALI = [
+    ("Dolore toracico", ("torac", "petto")),
+    ("Difficoltà respiratoria", ("respir", "dispnea", "affanno")),
+    ("Trauma", ("trauma", "frattur", "contusion")),
+]
+
+AUTORITA = [
+    ("Polizia", ("polizia",)),
+    ("Carabinieri", ("carabinier",)),
+    ("Vigili del fuoco", ("vigili del fuoco", "pompier")),
+]
+
+PARAMETRI_VITALI = [
+    ("FC (battiti/min)", "frequenza_cardiaca"),
+    ("PA (pressione)", "pressione_arteriosa"),
+    ("FR (atti/min)", "frequenza_respiratoria"),
+    (r"SpO2 (\%)", "saturazione_ossigeno"),
+    ("Glicemia", "glicemia"),
+    ("Temperatura", "temperatura"),
+    ("AVPU", "AVPU"),
+    ("Pupille (PEARL)", "pupille_PEARL"),
+    ("ECG", "ECG"),
+]
+
+
+# ----------------------------
+# Conversioni di base
+# ----------------------------
+def _carattere_componibile(carattere):
+    """Il carattere se pdflatex lo compone, altrimenti la sua forma ASCII ("ﬁ" -> "fi") o "?"."""
+    if carattere in SUPPORTATI:
+        return carattere
+    ascii_ = unicodedata.normalize("NFKD", carattere).encode("ascii", "ignore").decode("ascii")
+    return _SPECIALI.sub(lambda m: CARATTERI_SPECIALI[m.group()], ascii_) or "?"
+
+
+def escape(valore):
+    """Testo sicuro per LaTeX; None diventa stringa vuota, i ritorni a capo \\newline."""
+    if valore is None:
+        return ""
+    if isinstance(valore, bool):
+        return "sì" if valore else "no"
+    testo = _SPECIALI.sub(lambda m: CARATTERI_SPECIALI[m.group()], str(valore).strip())
+    testo = _NON_LATIN1.sub(lambda m: _carattere_componibile(m.group()), testo)
+    return re.sub(r"\s*\n\s*", r" \\newline ", testo)
+
+
+def vero(valore):
+    """Interpreta un campo sì/no: booleani, numeri o testo ("sì", "iniziata in maschera", "non necessarie")."""
+    if isinstance(valore, bool):
+        return valore
+    if valore is None:
+        return False
+    if isinstance(valore, (int, float)):
+        return valore != 0
+    testo = normalizza(valore)
+    return not (testo in NEGATIVI or testo.startswith(("no ", "non ", "nessun")))
+
+
+def _testo(valore):
+    """Valore testuale di un campo, vuoto se mancante o booleano."""
+    if valore is None or isinstance(valore, bool):
+        return ""
+    return str(valore).strip()
+
+
+def casella(spuntata, etichetta):
+    return (r"\checkedbox " if spuntata else r"\checkbox ") + etichetta
+
+
+def _contiene(testo, radici):
+    return any(radice in testo for radice in radici)
+
+
+# ----------------------------
+# Campi composti
+# ----------------------------
+def luogo_intervento(dati):
+    indirizzo = _testo(dati.get("indirizzo_intervento")) or " ".join(
+        p for p in (_testo(dati.get("via")), _testo(dati.get("numero_civico"))) if p
+    )
+    citta = _testo(dati.get("citta"))
+    provincia = _testo(dati.get("provincia"))
+    if citta and normalizza(citta) not in normalizza(indirizzo):
+        citta += f" ({provincia})" if provincia else ""
+        indirizzo = f"{indirizzo}, {citta}" if indirizzo else citta
+    return escape(indirizzo)
+
+
+def equipaggio(dati):
+    """Assegna i soccorritori alle righe del modulo in base al ruolo."""
+    righe = {"autista": "", "infermiere": "", "medico": "", "soccorritore_1": "", "soccorritore_2": "", "soccorritore_3": ""}
+    liberi = ["soccorritore_1", "soccorritore_2", "soccorritore_3"]
+    for i in (1, 2, 3):
+        nome = _testo(dati.get(f"nome_soccorritore_{i}"))
+        ruolo = _testo(dati.get(f"ruolo_soccorritore_{i}"))
+        if not nome:
+            continue
+        r = normalizza(ruolo)
+        if "autista" in r and not righe["autista"]:
+            riga = "autista"
+        elif "infermier" in r and not righe["infermiere"]:
+            riga = "infermiere"
+        elif "medic" in r and not righe["medico"]:
+            riga = "medico"
+        else:
+            riga = liberi.pop(0)
+            nome = f"{nome} ({ruolo})" if ruolo and normalizza(ruolo) not in ("soccorritore", "soccorritrice") else nome
+        righe[riga] = escape(nome)
+    return righe
+
+
+def codice_uscita(valore):
+    testo = normalizza(valore)
+    scelto = next((lettera for lettera, colore in CODICI_USCITA if testo in (lettera.lower(), colore)), None)
+    caselle = " ".join(casella(lettera == scelto, lettera) for lettera, _ in CODICI_USCITA)
+    # Codici di altri sistemi (es. "D4") restano leggibili accanto alle caselle
+    return caselle if scelto or not testo else f"{caselle} ({escape(valore)})"
+
+
+def codice_rientro(valore):
+    testo = _testo(valore)
+    trovato = re.fullmatch(r"[A-Za-z]?\s*([0-4])", testo)
+    scelto = trovato.group(1) if trovato else None
+    caselle = " ".join(casella(codice == scelto, codice) for codice in CODICI_RIENTRO)
+    return caselle if scelto or not testo else f"{caselle} ({escape(testo)})"
+
+
+def sesso(valore):
+    testo = normalizza(valore)
+    return f"{casella(testo.startswith('m'), 'M')} {casella(testo.startswith('f'), 'F')}"
+
+
+def sintomi(valori):
+    valori = [_testo(v) for v in (valori if isinstance(valori, list) else [valori]) if _testo(v)]
+    spuntati, altri = set(), []
+    for sintomo in valori:
+        testo = normalizza(sintomo)
+        etichette = [e for e, radici in SINTOMI_PRINCIPALI if _contiene(testo, radici)]
+        spuntati.update(etichette)
+        if not etichette:
+            altri.append(sintomo)
+    caselle = [casella(etichetta in spuntati, etichetta) for etichetta, _ in SINTOMI_PRINCIPALI]
+    caselle.append(casella(bool(altri), "Altro: " + escape(", ".join(altri))))
+    return " ".join(caselle)
+
+
+def trattamenti(dati):
+    ossigeno = vero(dati.get("ossigenoterapia")) or vero(dati.get("flusso_ossigeno"))
+    immobilizzazione = vero(dati.get("immobilizzazioni"))
+    medicazione = "medicazion" in normalizza(dati.get("note_intervento"))
+    caselle = " ".join([
+        casella(ossigeno, "Ossigeno"),
+        casella(immobilizzazione, "Immobilizzazione"),
+        casella(medicazione, "Medicazione"),
+    ])
+
+    dettagli = []
+    if ossigeno:
+        descrizione = ", ".join(
+            t for t in (_testo(dati.get("ossigenoterapia")), _testo(dati.get("flusso_ossigeno"))) if vero(t)
+        )
+        if descrizione:
+            dettagli.append(f"Ossigeno: {descrizione}")
+    if immobilizzazione and vero(_testo(dati.get("immobilizzazioni"))):
+        dettagli.append(f"Immobilizzazione: {_testo(dati.get('immobilizzazioni'))}")
+    return caselle + "".join(r" \newline " + escape(d) for d in dettagli)
+
+
+def farmaci(valori):
+    nomi = []
+    for farmaco in valori if isinstance(valori, list) else []:
+        if isinstance(farmaco, dict):
+            parti = [_testo(farmaco.get("nome")), _testo(farmaco.get("dose"))]
+            descrizione = " ".join(p for p in parti if p)
+            if _testo(farmaco.get("via")):
+                descrizione += f" ({_testo(farmaco.get('via'))})"
+        else:
+            descrizione = _testo(farmaco)
+        if descrizione:
+            nomi.append(descrizione)
+    return escape(", ".join(nomi)) if nomi else "Nessuno"
+
+
+def autorita(valore):
+    testo = normalizza(valore) if isinstance(valore, str) else ""
+    spuntate = [etichetta for etichetta, radici in AUTORITA if _contiene(testo, radici)]
+    # Presenza indicata senza dire quali forze: si spunta "Altri"
+    altri = valore is True or (isinstance(valore, str) and vero(valore) and not spuntate)
+    dettaglio = escape(valore) if isinstance(valore, str) and altri else ""
+    caselle = [casella(etichetta in spuntate, etichetta) for etichetta, _ in AUTORITA]
+    caselle.append(casella(altri, "Altri: " + dettaglio))
+    return " ".join(caselle)
+
+
+def esito(dati):
+    return " ".join([
+        casella(vero(dati.get("paziente_consegnato_ps")), "Trasporto in PS"),
+        casella(vero(dati.get("paziente_rifiuto_trasporto")), "Rifiuto trattamento"),
+        casella(vero(dati.get("decesso_sul_posto")), "Decesso"),
+    ])
+
+
+def ospedale(dati):
+    ospedale, reparto = _testo(dati.get("ospedale_destinazione")), _testo(dati.get("reparto_destinazione"))
+    return escape(f"{ospedale} ({reparto})" if ospedale and reparto else ospedale or reparto)
+
+
+def note(dati):
+    parti = [_testo(dati.get("note_intervento"))]
+    if _testo(dati.get("condizioni_consegna")):
+        parti.append(f"Condizioni alla consegna: {_testo(dati.get('condizioni_consegna'))}")
+    if _testo(dati.get("problemi_riscontrati")):
+        parti.append(f"Problemi riscontrati: {_testo(dati.get('problemi_riscontrati'))}")
+    return r" \newline ".join(escape(p) for p in parti if p)
+
+
+def tabella_parametri(rilevazioni):
+    """Tabella dei parametri vitali: una colonna per rilevazione (almeno tre, come nel modulo cartaceo)."""
+    rilevazioni = [r for r in (rilevazioni if isinstance(rilevazioni, list) else []) if isinstance(r, dict)]
+    colonne = max(3, len(rilevazioni))
+    larghezza = f"{12 / colonne:.2f}cm"
+    righe = [
+        r"\begin{tabular}{|L{3cm}|" + f"L{{{larghezza}}}|" * colonne + "}",
+        r"\hline",
+    ]
+    intestazioni = []
+    for i in range(colonne):
+        orario = _testo(rilevazioni[i].get("tempo_rilevazione")) if i < len(rilevazioni) else ""
+        intestazioni.append(r"\graycell{" + f"T{i + 1} ({escape(orario) or 'orario'})" + "}")
+    righe.append(" & " + " & ".join(intestazioni) + r" \\ \hline")
+    for etichetta, campo in PARAMETRI_VITALI:
+        valori = [escape(_testo(r.get(campo))) for r in rilevazioni] + [""] * (colonne - len(rilevazioni))
+        righe.append(f"{etichetta} & " + " & ".join(valori) + r" \\ \hline")
+    righe.append(r"\end{tabular}")
+    return "\n".join(righe)
+
+
+# ----------------------------
+# Compilazione
+# ----------------------------
+SEMPLICI = [
+    "data", "ora_chiamata", "ora_partenza_ambulanza", "ora_arrivo_sul_posto", "stato_coscienza",
+    "ora_partenza_dal_posto", "ora_arrivo_ps", "ora_rientro_sede", "telefono_chiamante", "tipo_mezzo",
+    "numero_intervento", "cognome_nome_paziente", "data_nascita", "luogo_nascita", "firma_responsabile",
+]
+
+
+def valori_segnaposto(dati):
+    """LaTeX (già escapato) per ogni segnaposto del template."""
+    valori = {campo: escape(_testo(dati.get(campo))) for campo in SEMPLICI}
+    valori.update(equipaggio(dati))
+    valori.update({
+        "luogo_intervento": luogo_intervento(dati),
+        "codice_uscita": codice_uscita(dati.get("codice_uscita")),
+        "codice_rientro": codice_rientro(dati.get("codice_rientro")),
+        "sesso": sesso(dati.get("sesso")),
+        "parametri_vitali": tabella_parametri(dati.get("parametri_vitali")),
+        "sintomi": sintomi(dati.get("sintomi")),
+        "trattamenti": trattamenti(dati),
+        "farmaci_somministrati": farmaci(dati.get("farmaci_somministrati")),
+        "autorita": autorita(dati.get("forze_dell'ordine_presenti")),
+        "esito": esito(dati),
+        "ospedale_destinazione": ospedale(dati),
+        "note": note(dati),
+    })
+    return valori
+
+
+@functools.lru_cache(maxsize=None)
+def carica_template(percorso=PERCORSO_TEMPLATE):
+    with open(percorso, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def genera_latex(dati, template=None):
+    """Sorgente LaTeX della cartella clinica compilato con i dati estratti (dizionario o testo JSON)."""
+    if isinstance(dati, str):
+        dati = json.loads(dati)
+    valori = valori_segnaposto(dati)
+    template = carica_template() if template is None else template
+
+    def sostituisci(corrispondenza):
+        nome = corrispondenza.group(1)
+        if nome not in valori:
+            raise KeyError(f"Segnaposto senza valore nel template: {nome}")
+        return valori[nome]
+
+    return SEGNAPOSTO.sub(sostituisci, template)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compila il modulo LaTeX della cartella clinica da file JSON.")
+    parser.add_argument("json", nargs="+", help="File JSON delle cartelle cliniche")
+    parser.add_argument("--uscita", default="latex_output", help="Cartella dei file .tex")
+    args = parser.parse_args()
+
+    os.makedirs(args.uscita, exist_ok=True)
+    for percorso in args.json:
+        with open(percorso, "r", encoding="utf-8") as f:
+            latex = genera_latex(json.load(f))
+        destinazione = os.path.join(args.uscita, os.path.splitext(os.path.basename(percorso))[0] + ".tex")
+        with open(destinazione, "w", encoding="utf-8") as f:
+            f.write(latex)
+        print(f"Salvato: {destinazione}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+
+# ----------------------------
+# Configurazione
+# ----------------------------
+OLLAMA_URL = "http://127.0.0.1:11434/api/generate"
+CONCORRENZA = 2  # richieste contemporanee verso il server (vedi OLLAMA_NUM_PARALLEL)
+# Timeout (s): connessione, attesa del primo token, attesa tra due token. Il primo token arriva
+# dopo la valutazione dell'intero prompt, che per una cartella su CPU può durare molti minuti
+TIMEOUT = (
+    5,
+    float(os.environ.get("VOICE2CARE_OLLAMA_TIMEOUT_PRIMO_TOKEN") or 1800),
+    float(os.environ.get("VOICE2CARE_OLLAMA_TIMEOUT_TOKEN") or 120),
+)
+TENTATIVI = 3
+ATTESA_BASE = 0.5  # s, raddoppia a ogni tentativo
+
+# Errori per cui ha senso ritentare: il server è occupato o si sta riavviando
+STATI_TEMPORANEI = {429, 500, 502, 503, 504}
+
+
+class ErroreOllama(Exception):
+    pass
+
+
+class ErroreTemporaneo(ErroreOllama):
+    pass
+
+
+class ErroreTimeout(ErroreOllama):
+    """Il modello non ha risposto entro il timeout: ritentare lo stesso prompt con lo stesso limite non serve."""
+
+
+def _timeout_lettura(errore):
+    # Durante lo stream requests riporta il timeout di urllib3 come ConnectionError
+    return isinstance(errore, requests.ReadTimeout) or any(isinstance(a, ReadTimeoutError) for a in errore.args)
+
+
+def _imposta_timeout(risposta, secondi):
+    """Cambia il timeout di lettura del socket di una risposta già iniziata."""
+    sock = getattr(getattr(risposta.raw, "connection", None), "sock", None)
+    if sock is not None:
+        sock.settimeout(secondi)
+
+
+# ----------------------------
+# Rilevamento della fine del primo oggetto JSON nello stream
+# ----------------------------
+class RilevatoreJson:
+    """Segue la profondità delle graffe (ignorando quelle nelle stringhe) sui token in arrivo.
+
+    `aggiungi` restituisce il testo del primo oggetto JSON di primo livello
+    appena la sua graffa di chiusura arriva, altrimenti None.
+    """
+
+    def __init__(self):
+        self.testo = []
+        self.profondita = 0
+        self.inizio = None
+        self.posizione = 0
+        self.in_stringa = False
+        self.escape = False
+
+    def aggiungi(self, token):
+        self.testo.append(token)
+        for carattere in token:
+            posizione = self.posizione
+            self.posizione += 1
+            if self.in_stringa:
+                if self.escape:
+                    self.escape = False
+                elif carattere == "\\":
+                    self.escape = True
+                elif carattere == '"':
+                    self.in_stringa = False
+            elif carattere == '"' and self.inizio is not None:
+                self.in_stringa = True
+            elif carattere == "{":
+                if self.inizio is None:
+                    self.inizio = posizione
+                self.profondita += 1
+            elif carattere == "}" and self.inizio is not None:
+                self.profondita -= 1
+                if self.profondita == 0:
+                    return "".join(self.testo)[self.inizio:self.posizione]
+        return None
+
+
+# ----------------------------
+# Client
+# ----------------------------
+class ClientOllama:
+    """Client per /api/generate con connessioni keep-alive, concorrenza limitata, streaming e retry.
+
+    Un'unica istanza può essere usata da più thread: il semaforo limita le
+    richieste in corso a `concorrenza`, le altre attendono il proprio turno.
+    `timeout` è (connessione, primo token, tra due token) in secondi.
+    """
+
+    def __init__(self, url=OLLAMA_URL, concorrenza=CONCORRENZA, timeout=TIMEOUT, tentativi=TENTATIVI, attesa_base=ATTESA_BASE):
+        self.url = url
+        self.concorrenza = concorrenza
+        self.timeout = timeout
+        self.tentativi = tentativi
+        self.attesa_base = attesa_base
+        self._semaforo = threading.BoundedSemaphore(concorrenza)
+        self._sessione = requests.Session()
+        adattatore = HTTPAdapter(pool_connections=1, pool_maxsize=concorrenza)
+        self._sessione.mount("http://", adattatore)
+        self._sessione.mount("https://", adattatore)
+
+    def chiudi(self):
+        self._sessione.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *eccezione):
+        self.chiudi()
+
+    def _richiesta(self, prompt, modello, fino_a_json, opzioni):
+        payload = {"model": modello, "prompt": prompt, "stream": True}
+        if opzioni:
+            payload["options"] = opzioni
+        connessione, primo_token, tra_token = self.timeout
+        try:
+            # Ollama invia le intestazioni con il primo token: fino ad allora vale il timeout del primo token
+            risposta = self._sessione.post(self.url, json=payload, stream=True, timeout=(connessione, primo_token))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if _timeout_lettura(e):
+                raise ErroreTimeout(f"Nessun token entro {primo_token:g} s (VOICE2CARE_OLLAMA_TIMEOUT_PRIMO_TOKEN)") from e
+            raise ErroreTemporaneo(str(e)) from e
+
+        with risposta:
+            if risposta.status_code in STATI_TEMPORANEI:
+                raise ErroreTemporaneo(f"Errore {risposta.status_code}: {risposta.text}")
+            if risposta.status_code != 200:
+                raise ErroreOllama(f"Errore {risposta.status_code}: {risposta.text}")
+
+            rilevatore = RilevatoreJson() if fino_a_json else None
+            testo = []
+            try:
+                for riga in risposta.iter_lines():
+                    if not riga:
+                        continue
+                    if not testo:
+                        _imposta_timeout(risposta, tra_token)
+                    parte = json.loads(riga)
+                    if "error" in parte:
+                        raise ErroreOllama(parte["error"])
+                    token = parte.get("response", "")
+                    testo.append(token)
+                    if rilevatore is not None:
+                        oggetto = rilevatore.aggiungi(token)
+                        if oggetto is not None:
+                            # Il resto della generazione non serve: chiudere la connessione interrompe il modello
+                            return oggetto
+                    if parte.get("done"):
+                        break
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError, requests.Timeout) as e:
+                if _timeout_lettura(e):
+                    limite = tra_token if testo else primo_token
+                    raise ErroreTimeout(f"Generazione ferma da {limite:g} s") from e
+                raise ErroreTemporaneo(str(e)) from e
+        return "".join(testo).strip()
+
+    def genera(self, prompt, modello, fino_a_json=False, opzioni=None):
+        """Testo generato per `prompt`.
+
+        Con `fino_a_json=True` la lettura si ferma alla chiusura del primo
+        oggetto JSON e viene restituito solo quell'oggetto (come testo).
+        Gli errori temporanei vengono ritentati con attesa esponenziale; i timeout
+        no (ErroreTimeout): con lo stesso prompt e lo stesso limite scadrebbero di nuovo.
+        """
+        for tentativo in range(self.tentativi):
+            try:
+                with self._semaforo:
+                    return self._richiesta(prompt, modello, fino_a_json, opzioni)
+            except ErroreTemporaneo:
+                if tentativo == self.tentativi - 1:
+                    raise
+                # Jitter: i thread respinti insieme non ritornano tutti nello stesso istante
+                time.sleep(self.attesa_base * 2 ** tentativo * (1 + random.random()))
+
+    def genera_json(self, prompt, modello, opzioni=None):
+        """Primo oggetto JSON generato per `prompt` (None se il modello non ne produce uno valido)."""
+        testo = self.genera(prompt, modello, fino_a_json=True, opzioni=opzioni)
+        try:
+            dati = json.loads(testo)
+        except json.JSONDecodeError:
+            return None
+        return dati if isinstance(dati, dict) else None
+
+    def mappa(self, funzione, elementi):
+        """Applica `funzione(client, elemento)` in parallelo (al massimo `concorrenza` alla volta), in ordine."""
+        with ThreadPoolExecutor(self.concorrenza) as esecutore:
+            yield from esecutore.map(lambda elemento: funzione(self, elemento), elementi)
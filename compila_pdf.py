@@ -0,0 +1,298 @@
+import argparse
+import functools
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# ----------------------------
+# Compilazione parallela e incrementale dei PDF delle cartelle cliniche
+# ----------------------------
+# Ogni documento viene compilato da pdflatex in una cartella temporanea propria
+# (niente .aux/.log condivisi tra compilazioni contemporanee) da un pool di processi.
+# Un indice degli hash dei sorgenti permette di saltare i documenti invariati e,
+# se i documenti condividono il preambolo, questo viene precompilato una volta
+# in un file di formato (.fmt) che riduce l'avvio di ogni compilazione.
+
+CARTELLA_LATEX = "latex_output"
+CARTELLA_PDF = "pdf_output"
+FILE_INDICE = "indice_pdf.json"  # nella cartella dei PDF: nome -> hash del sorgente
+FILE_INTERVENTI = "interventi_pdf.json"  # nella cartella dei PDF: nome -> numero_intervento (per archivio_pdf)
+TIMEOUT = 120  # secondi per documento
+INIZIO_DOCUMENTO = "\\begin{document}"
+
+
+def estrai_latex(testo):
+    """Codice LaTeX da una stringa, anche se racchiuso in un blocco markdown ```latex```."""
+    corrispondenza = re.search(r"```latex(.*?)```", testo, re.DOTALL)
+    if corrispondenza:
+        return corrispondenza.group(1).strip()
+    return testo.strip()
+
+
+def impronta(testo):
+    return hashlib.sha256(testo.encode("utf-8")).hexdigest()
+
+
+def dividi_preambolo(sorgente):
+    """(preambolo, corpo) separati prima di \\begin{document}; preambolo vuoto se manca."""
+    posizione = sorgente.find(INIZIO_DOCUMENTO)
+    if posizione < 0:
+        return "", sorgente
+    return sorgente[:posizione], sorgente[posizione:]
+
+
+def pdflatex():
+    eseguibile = shutil.which("pdflatex")
+    if eseguibile is None:
+        raise FileNotFoundError("pdflatex non trovato: installare una distribuzione TeX (es. TeX Live o MiKTeX)")
+    return eseguibile
+
+
+# ----------------------------
+# Preambolo precompilato
+# ----------------------------
+CARTELLA_FORMATI = os.path.join(CARTELLA_LATEX, ".formati")
+
+
+@functools.lru_cache(maxsize=None)
+def versione_pdflatex():
+    """Eseguibile e output di `pdflatex --version`: un .fmt vale solo per il binario che l'ha creato."""
+    eseguibile = pdflatex()
+    processo = subprocess.run(
+        [eseguibile, "--version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, errors="replace", timeout=TIMEOUT,
+    )
+    return eseguibile + "\n" + processo.stdout
+
+
+def percorso_formato(preambolo, cartella=CARTELLA_FORMATI):
+    # Dopo un aggiornamento di TeX la chiave cambia e il formato viene ricreato
+    return os.path.join(cartella, "cartella_" + impronta(versione_pdflatex() + preambolo)[:16] + ".fmt")
+
+
+def prepara_formato(preambolo, cartella=CARTELLA_FORMATI):
+    """Percorso del file .fmt con il preambolo già caricato (creato una volta per preambolo), o None se fallisce."""
+    os.makedirs(cartella, exist_ok=True)
+    formato = percorso_formato(preambolo, cartella)
+    nome = os.path.splitext(os.path.basename(formato))[0]
+    if os.path.exists(formato):
+        return formato
+
+    with tempfile.TemporaryDirectory(prefix="formato_") as lavoro:
+        with open(os.path.join(lavoro, nome + ".tex"), "w", encoding="utf-8") as f:
+            f.write(preambolo + "\n\\dump\n")
+        processo = subprocess.run(
+            [pdflatex(), "-ini", "-interaction=nonstopmode", "-halt-on-error", f"-jobname={nome}", "&pdflatex", nome + ".tex"],
+            cwd=lavoro, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace", timeout=TIMEOUT,
+        )
+        generato = os.path.join(lavoro, nome + ".fmt")
+        if processo.returncode != 0 or not os.path.exists(generato):
+            print("Attenzione: preambolo non precompilabile, compilazione completa dei documenti.")
+            print(processo.stdout[-2000:])
+            return None
+        shutil.move(generato, formato + ".tmp")
+        os.replace(formato + ".tmp", formato)
+    return formato
+
+
+# ----------------------------
+# Singola compilazione (eseguita nei processi del pool)
+# ----------------------------
+def _esegui_pdflatex(nome, sorgente, cartella_pdf, formato=None):
+    """(riuscita, log) di una compilazione; se riesce il PDF è già in `cartella_pdf`."""
+    with tempfile.TemporaryDirectory(prefix="latex_") as lavoro:
+        comando = [pdflatex(), "-interaction=nonstopmode", "-halt-on-error"]
+        if formato:
+            shutil.copy(formato, os.path.join(lavoro, os.path.basename(formato)))
+            comando.append("-fmt=" + os.path.splitext(os.path.basename(formato))[0])
+            sorgente = dividi_preambolo(sorgente)[1]
+        with open(os.path.join(lavoro, "documento.tex"), "w", encoding="utf-8") as f:
+            f.write(sorgente)
+
+        try:
+            processo = subprocess.run(
+                comando + ["documento.tex"],
+                cwd=lavoro, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace", timeout=TIMEOUT,
+            )
+            riuscita, log = processo.returncode == 0, processo.stdout
+        except subprocess.TimeoutExpired:
+            riuscita, log = False, f"pdflatex interrotto dopo {TIMEOUT} s"
+
+        generato = os.path.join(lavoro, "documento.pdf")
+        if riuscita and os.path.exists(generato):
+            destinazione = os.path.join(cartella_pdf, nome + ".pdf")
+            # Copia accanto alla destinazione e rinomina: chi legge non vede mai un PDF a metà
+            shutil.move(generato, destinazione + ".tmp")
+            os.replace(destinazione + ".tmp", destinazione)
+            return True, log
+    return False, log
+
+
+def compila_documento(nome, sorgente, cartella_pdf, formato=None):
+    """Compila `sorgente` in una cartella temporanea e sposta il PDF in `cartella_pdf`.
+
+    Con `formato` il sorgente viene compilato a partire da \\begin{document}: il
+    preambolo è già nel file .fmt. Se così non riesce (es. formato non più valido
+    per il pdflatex installato) si ritenta la compilazione completa.
+    """
+    inizio = time.perf_counter()
+    riuscita, log = _esegui_pdflatex(nome, sorgente, cartella_pdf, formato)
+    if not riuscita and formato:
+        riuscita, log = _esegui_pdflatex(nome, sorgente, cartella_pdf)
+    if riuscita:
+        return {"nome": nome, "esito": "compilato", "secondi": round(time.perf_counter() - inizio, 3), "errore": ""}
+
+    errori = [riga for riga in log.splitlines() if riga.startswith("!")]
+    return {
+        "nome": nome,
+        "esito": "errore",
+        "secondi": round(time.perf_counter() - inizio, 3),
+        "errore": "\n".join(errori) or log[-1000:],
+    }
+
+
+# ----------------------------
+# Compilazione di un lotto
+# ----------------------------
+def _leggi_indice(percorso):
+    try:
+        with open(percorso, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _scrivi_indice(percorso, indice):
+    with open(percorso + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(indice, f, indent=2, sort_keys=True)
+    os.replace(percorso + ".tmp", percorso)
+
+
+def compila(documenti, cartella_pdf=CARTELLA_PDF, cartella_latex=CARTELLA_LATEX, processi=None, formato=True, forza=False,
+            interventi=None):
+    """Compila in parallelo i documenti {nome: sorgente LaTeX}; restituisce il report per documento.
+
+    I sorgenti vengono salvati in `cartella_latex`; i documenti il cui sorgente non è
+    cambiato dall'ultima compilazione riuscita (e il cui PDF esiste) vengono saltati.
+    `interventi` ({nome: numero_intervento}) viene registrato accanto ai PDF, così
+    archivio_pdf.py collega ogni PDF al suo intervento qualunque sia il nome del file.
+    """
+    os.makedirs(cartella_pdf, exist_ok=True)
+    os.makedirs(cartella_latex, exist_ok=True)
+    if interventi:
+        percorso_interventi = os.path.join(cartella_pdf, FILE_INTERVENTI)
+        registrati = _leggi_indice(percorso_interventi)
+        registrati.update({nome: numero for nome, numero in interventi.items() if numero})
+        _scrivi_indice(percorso_interventi, registrati)
+    percorso_indice = os.path.join(cartella_pdf, FILE_INDICE)
+    indice = _leggi_indice(percorso_indice)
+
+    report, da_compilare = [], {}
+    for nome, sorgente in documenti.items():
+        sorgente = estrai_latex(sorgente)
+        with open(os.path.join(cartella_latex, nome + ".tex"), "w", encoding="utf-8") as f:
+            f.write(sorgente)
+        invariato = indice.get(nome) == impronta(sorgente) and os.path.exists(os.path.join(cartella_pdf, nome + ".pdf"))
+        if invariato and not forza:
+            report.append({"nome": nome, "esito": "invariato", "secondi": 0.0, "errore": ""})
+        else:
+            da_compilare[nome] = sorgente
+    if not da_compilare:
+        return report
+
+    # Il preambolo si precompila solo se è comune a più documenti (o se il formato esiste già)
+    file_formato = {}
+    cartella_formati = os.path.join(cartella_latex, ".formati")
+    if formato:
+        preamboli = {}
+        for nome, sorgente in da_compilare.items():
+            preambolo = dividi_preambolo(sorgente)[0]
+            if preambolo:
+                preamboli.setdefault(preambolo, []).append(nome)
+        for preambolo, nomi in preamboli.items():
+            if len(nomi) > 1 or os.path.exists(percorso_formato(preambolo, cartella_formati)):
+                percorso = prepara_formato(preambolo, cartella_formati)
+                file_formato.update(dict.fromkeys(nomi, percorso))
+
+    processi = processi or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(processi, len(da_compilare))) as pool:
+        futuri = {
+            pool.submit(compila_documento, nome, sorgente, cartella_pdf, file_formato.get(nome)): nome
+            for nome, sorgente in da_compilare.items()
+        }
+        for futuro in as_completed(futuri):
+            risultato = futuro.result()
+            report.append(risultato)
+            if risultato["esito"] == "compilato":
+                indice[risultato["nome"]] = impronta(da_compilare[risultato["nome"]])
+            else:
+                indice.pop(risultato["nome"], None)
+    _scrivi_indice(percorso_indice, indice)
+    return report
+
+
+def stampa_report(report):
+    larghezza = max([len(r["nome"]) for r in report] + [9])
+    print(f"{'documento':<{larghezza}}  {'esito':<10}  {'secondi':>8}")
+    for riga in sorted(report, key=lambda r: r["nome"]):
+        print(f"{riga['nome']:<{larghezza}}  {riga['esito']:<10}  {riga['secondi']:>8.3f}")
+        if riga["errore"]:
+            print("    " + riga["errore"].replace("\n", "\n    "))
+    conteggi = {}
+    for riga in report:
+        conteggi[riga["esito"]] = conteggi.get(riga["esito"], 0) + 1
+    print(", ".join(f"{esito}: {n}" for esito, n in sorted(conteggi.items())),
+          f"- tempo di compilazione totale {sum(r['secondi'] for r in report):.2f} s")
+
+
+def salva_e_compila_latex(risposta_latex, nome_file_base="cartella_clinica", numero_intervento=None):
+    """Salva e compila un singolo documento (come la cella originale di LLM_NER.ipynb)."""
+    report = compila({nome_file_base: risposta_latex}, interventi={nome_file_base: numero_intervento})
+    stampa_report(report)
+    return report[0]
+
+
+# ----------------------------
+# Esecuzione da riga di comando
+# ----------------------------
+def leggi_documenti(percorsi):
+    """({nome: sorgente}, {nome: numero_intervento}) da file .tex, o da file .json delle cartelle (compilati con cartella_latex)."""
+    documenti, interventi = {}, {}
+    for percorso in percorsi:
+        nome, estensione = os.path.splitext(os.path.basename(percorso))
+        with open(percorso, "r", encoding="utf-8") as f:
+            if estensione == ".json":
+                from cartella_latex import genera_latex
+
+                dati = json.load(f)
+                documenti[nome] = genera_latex(dati)
+                interventi[nome] = dati.get("numero_intervento")
+            else:
+                documenti[nome] = f.read()
+    return documenti, interventi
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compila in parallelo i PDF delle cartelle cliniche.")
+    parser.add_argument("file", nargs="+", help="File .tex, o .json delle cartelle cliniche")
+    parser.add_argument("--pdf", default=CARTELLA_PDF, help="Cartella dei PDF")
+    parser.add_argument("--latex", default=CARTELLA_LATEX, help="Cartella dei sorgenti .tex")
+    parser.add_argument("--processi", type=int, default=None, help="Compilazioni parallele (default: numero di core)")
+    parser.add_argument("--senza-formato", action="store_true", help="Non precompilare il preambolo comune")
+    parser.add_argument("--forza", action="store_true", help="Ricompila anche i documenti invariati")
+    args = parser.parse_args()
+
+    documenti, interventi = leggi_documenti(args.file)
+    report = compila(
+        documenti, args.pdf, args.latex, args.processi, formato=not args.senza_formato, forza=args.forza, interventi=interventi
+    )
+    stampa_report(report)
+
+
+if __name__ == "__main__":
+    main()
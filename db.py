@@ -0,0 +1,67 @@
+import pymongo
+
+# ----------------------------
+# Configurazione MongoDB
+# ----------------------------
+MONGO_URI = "mongodb://localhost:27017"
+DB_NAME = "cartella_clinica_db"
+COLLECTION_NAME = "interventi"
+
+# Bucket GridFS dei PDF delle cartelle cliniche (collezioni pdf_cartelle.files/.chunks)
+PDF_BUCKET = "pdf_cartelle"
+
+# Collezione con i contatori di versione delle altre collezioni
+META_COLLECTION = "meta"
+
+
+def crea_client(uri=MONGO_URI, **opzioni):
+    """Client con pool di connessioni, da condividere per tutta la durata del processo."""
+    opzioni.setdefault("maxPoolSize", 20)
+    opzioni.setdefault("serverSelectionTimeoutMS", 5000)
+    return pymongo.MongoClient(uri, **opzioni)
+
+
+def crea_indici(db):
+    """Crea (se mancano) gli indici usati dall'app sulla collezione `interventi`."""
+    collection = db[COLLECTION_NAME]
+    collection.create_index("cognome_nome_paziente", name="paziente")
+    # Finestra dei job di analisi incrementali
+    collection.create_index("ingerito_il", name="ingestione")
+    # Filtri per città e intervalli sull'orario di chiamata (campi tipizzati di normalizzazione.py)
+    collection.create_index([("citta", pymongo.ASCENDING), ("chiamata_il", pymongo.ASCENDING)], name="citta_chiamata")
+    collection.create_index([("citta", pymongo.ASCENDING), ("minuto_chiamata", pymongo.ASCENDING)], name="citta_minuto_chiamata")
+    # Esiti per città (decessi sul posto)
+    collection.create_index([("decesso_sul_posto", pymongo.ASCENDING), ("citta", pymongo.ASCENDING)], name="decesso_citta")
+    # PDF di un intervento (archivio_pdf)
+    db[f"{PDF_BUCKET}.files"].create_index("metadata.numeri_intervento", name="pdf_intervento")
+
+
+def versione_collezione(db, nome=COLLECTION_NAME):
+    """Versione corrente della collezione (0 se non è mai stata modificata)."""
+    doc = db[META_COLLECTION].find_one({"_id": nome}, {"versione": 1})
+    return doc["versione"] if doc else 0
+
+
+def incrementa_versione(db, nome=COLLECTION_NAME):
+    """Segnala una modifica della collezione: invalida i risultati in cache che la riguardano.
+
+    Va chiamata da ogni processo che scrive nella collezione (es. l'ingestione).
+    """
+    doc = db[META_COLLECTION].find_one_and_update(
+        {"_id": nome},
+        {"$inc": {"versione": 1}},
+        upsert=True,
+        return_document=pymongo.ReturnDocument.AFTER,
+    )
+    return doc["versione"]
+
+
+def rimozioni_collezione(db, nome=COLLECTION_NAME):
+    """Documenti rimossi finora dalla collezione (0 se non ne è mai stato rimosso nessuno)."""
+    doc = db[META_COLLECTION].find_one({"_id": nome}, {"rimozioni": 1})
+    return doc.get("rimozioni", 0) if doc else 0
+
+
+def registra_rimozioni(db, quanti, nome=COLLECTION_NAME):
+    """Segnala ai job incrementali che `quanti` documenti già elaborati non esistono più."""
+    db[META_COLLECTION].update_one({"_id": nome}, {"$inc": {"rimozioni": quanti}}, upsert=True)
@@ -0,0 +1,192 @@
+import functools
+import json
+
+import cache_llm
+import preestrazione
+from client_ollama import ClientOllama
+
+# ----------------------------
+# Estrazione dei dati della cartella clinica da testo libero (LLM via Ollama)
+# ----------------------------
+MODELLO = "mistral-large"
+
+# Campi della cartella clinica richiesti al modello, con il valore di default
+MODELLO_CARTELLA = {
+    "data": "",
+    "ora_chiamata": "",
+    "ora_partenza_ambulanza": "",
+    "ora_arrivo_sul_posto": "",
+    "ora_partenza_dal_posto": "",
+    "ora_arrivo_ps": "",
+    "ora_rientro_sede": "",
+    "codice_uscita": "",
+    "codice_rientro": "",
+    "tipo_mezzo": "",
+    "numero_intervento": "",
+    "indirizzo_intervento": "",
+    "via": "",
+    "numero_civico": "",
+    "citta": "",
+    "provincia": "",
+    "cap": "",
+    "telefono_chiamante": "",
+    "cognome_nome_paziente": "",
+    "sesso": "",
+    "data_nascita": "",
+    "eta": "",
+    "luogo_nascita": "",
+    "provincia_nascita": "",
+    "residenza": "",
+    "indirizzo_residenza": "",
+    "citta_residenza": "",
+    "provincia_residenza": "",
+    "codice_fiscale": "",
+    "nome_chiamante": "",
+    "cognome_chiamante": "",
+    "relazione_con_paziente": "",
+    "stato_coscienza": "",
+    "sintomi": [],
+    "dolore_localizzato": "",
+    "allergie": "",
+    "patologie_pregresse": "",
+    "farmaci_assunti": "",
+    "parametri_vitali": [
+        {
+            "tempo_rilevazione": "",
+            "frequenza_cardiaca": "",
+            "pressione_arteriosa": "",
+            "frequenza_respiratoria": "",
+            "saturazione_ossigeno": "",
+            "glicemia": "",
+            "temperatura": "",
+            "AVPU": "",
+            "pupille_PEARL": "",
+            "ECG": "",
+        }
+    ],
+    "ossigenoterapia": "",
+    "flusso_ossigeno": "",
+    "farmaci_somministrati": [],
+    "accesso_venoso": "",
+    "soluzione_endovenosa": "",
+    "immobilizzazioni": "",
+    "monitoraggio_continuo": "",
+    "mezzo_trasporto": "",
+    "posizionamento_paziente": "",
+    "ospedale_destinazione": "",
+    "reparto_destinazione": "",
+    "paziente_rifiuto_trasporto": False,
+    "forze_dell'ordine_presenti": None,
+    "decesso_sul_posto": False,
+    "paziente_consegnato_ps": True,
+    "condizioni_consegna": "",
+    "nome_soccorritore_1": "",
+    "ruolo_soccorritore_1": "",
+    "nome_soccorritore_2": "",
+    "ruolo_soccorritore_2": "",
+    "nome_soccorritore_3": "",
+    "ruolo_soccorritore_3": "",
+    "firma_responsabile": "",
+    "note_intervento": "",
+    "problemi_riscontrati": "",
+}
+
+ISTRUZIONI = """
+Leggi il seguente testo clinico e restituisci un dizionario JSON con i seguenti campi:
+
+{campi}
+
+Se un’informazione non è presente, inserisci `null` o una stringa vuota. Non aggiungere commenti o testo fuori dal JSON. Ecco il testo:
+
+
+
+Testo clinico:
+
+"""
+
+
+# Parte della chiave di cache: cambia da sola quando cambiano le istruzioni, i campi o le regole di pre-estrazione
+VERSIONE_PROMPT = cache_llm.versione_template(ISTRUZIONI, MODELLO_CARTELLA)
+VERSIONE_PROMPT_REGOLE = cache_llm.versione_template(ISTRUZIONI, MODELLO_CARTELLA, preestrazione.VERSIONE)
+
+
+def modello_ridotto(trovati):
+    """Campi ancora da chiedere al modello, tolti quelli già ricavati dalle regole."""
+    campi = {k: v for k, v in MODELLO_CARTELLA.items() if k not in trovati or k == "parametri_vitali"}
+    rilevazioni = trovati.get("parametri_vitali") or []
+    if rilevazioni:
+        # Un parametro presente in tutte le rilevazioni trovate non serve al modello
+        noti = set.intersection(*(set(r) for r in rilevazioni))
+        campi["parametri_vitali"] = [
+            {k: v for k, v in MODELLO_CARTELLA["parametri_vitali"][0].items() if k not in noti}
+        ]
+    return campi
+
+
+def prompt_estrazione(testo, trovati=None):
+    """Prompt completo per estrarre la cartella clinica da una trascrizione (senza i campi in `trovati`)."""
+    campi = json.dumps(modello_ridotto(trovati) if trovati else MODELLO_CARTELLA, indent=2, ensure_ascii=False)
+    return ISTRUZIONI.format(campi=campi) + testo
+
+
+def unisci(dati, trovati):
+    """Risposta del modello completata con i campi delle regole, nell'ordine dei campi della cartella."""
+    unione = {**dati, **{k: v for k, v in trovati.items() if k != "parametri_vitali"}}
+    regole = trovati.get("parametri_vitali") or []
+    if regole:
+        generate = [r for r in dati.get("parametri_vitali") or [] if isinstance(r, dict)]
+        vuota = dict.fromkeys(MODELLO_CARTELLA["parametri_vitali"][0], "")
+        unione["parametri_vitali"] = [
+            {**vuota, **(generate[i] if i < len(generate) else {}), **(regole[i] if i < len(regole) else {})}
+            for i in range(max(len(regole), len(generate)))
+        ]
+    ordine = {campo: i for i, campo in enumerate(MODELLO_CARTELLA)}
+    return dict(sorted(unione.items(), key=lambda voce: ordine.get(voce[0], len(ordine))))
+
+
+@functools.lru_cache(maxsize=None)
+def client_predefinito():
+    """Client condiviso (connessioni keep-alive) usato quando non se ne passa uno esplicito."""
+    return ClientOllama()
+
+
+def query_ollama(prompt, model="mistral", client=None):
+    """Testo completo generato dal modello per `prompt`."""
+    return (client or client_predefinito()).genera(prompt, model)
+
+
+@functools.lru_cache(maxsize=None)
+def cache_predefinita():
+    """Cache delle risposte condivisa (dati/cache_llm.sqlite)."""
+    return cache_llm.CacheLLM()
+
+
+def _cache(cache):
+    # None: cache condivisa; False: nessuna cache
+    return cache_predefinita() if cache is None else cache or None
+
+
+def estrai_cartella(testo, modello=MODELLO, client=None, cache=None, regole=True):
+    """Dati strutturati della cartella clinica estratti da una trascrizione (None se la risposta non è JSON).
+
+    Con `regole` orari, codici, recapiti, indirizzo e parametri numerici vengono ricavati
+    da preestrazione.py e al modello si chiedono solo i campi rimanenti.
+    La generazione viene letta in streaming e interrotta appena il JSON della cartella è completo.
+    Le risposte valide restano in cache per (modello, versione del prompt, prompt completo):
+    il prompt dipende anche dai campi già trovati dalle regole, non solo dalla trascrizione.
+    """
+    client = client or client_predefinito()
+    cache = _cache(cache)
+    trovati = preestrazione.preestrai(testo) if regole else {}
+    versione = VERSIONE_PROMPT_REGOLE if regole else VERSIONE_PROMPT
+    prompt = prompt_estrazione(testo, trovati)
+
+    def calcola():
+        dati = client.genera_json(prompt, modello)
+        return json.dumps(dati, ensure_ascii=False) if dati is not None else None
+
+    risposta = cache.ottieni(modello, versione, prompt, calcola) if cache else calcola()
+    if risposta is None:
+        return None
+    dati = json.loads(risposta)
+    return unisci(dati, trovati) if isinstance(dati, dict) else dati
@@ -0,0 +1,147 @@
+import argparse
+import os
+
+import pandas as pd
+
+from testo import normalizza
+
+# ----------------------------
+# Configurazione
+# ----------------------------
+PERCORSO_COMUNI = "dati/comuni_italiani.csv"
+PERCORSO_CACHE = "dati/geocache.csv"
+COLONNE_CACHE = ["comune", "lat", "lon"]
+
+
+def leggi_tabella(percorso):
+    # Nessun valore mancante implicito: "None" (TO) è un comune
+    return pd.read_csv(percorso, usecols=COLONNE_CACHE, keep_default_na=False, na_values={"lat": [""], "lon": [""]})
+
+
+class Gazetteer:
+    """Tabella locale comune -> coordinate, con indice sui nomi normalizzati.
+
+    Le coordinate provengono dalla tabella dei comuni distribuita con il progetto e
+    dalla cache persistente, che raccoglie le città risolte in passato tramite
+    geocodifica online. Nessuna ricerca richiede accesso alla rete.
+    """
+
+    def __init__(self, percorso_comuni=PERCORSO_COMUNI, percorso_cache=PERCORSO_CACHE):
+        self.percorso_cache = percorso_cache
+
+        tabelle = [leggi_tabella(percorso_comuni)]
+        if os.path.exists(percorso_cache):
+            tabelle.append(leggi_tabella(percorso_cache))
+
+        coordinate = pd.concat(tabelle, ignore_index=True)
+        coordinate["chiave"] = coordinate["comune"].map(normalizza)
+        # In caso di duplicati prevale la tabella ufficiale, caricata per prima
+        self._indice = (
+            coordinate.drop_duplicates("chiave", keep="first")
+            .set_index("chiave")[["lat", "lon"]]
+        )
+
+    def __len__(self):
+        return len(self._indice)
+
+    def __contains__(self, nome):
+        return normalizza(nome) in self._indice.index
+
+    def coordinate(self, nome):
+        """Restituisce (lat, lon) della città, oppure (None, None) se sconosciuta."""
+        chiave = normalizza(nome)
+        if chiave not in self._indice.index:
+            return None, None
+        riga = self._indice.loc[chiave]
+        return float(riga["lat"]), float(riga["lon"])
+
+    def geocodifica(self, df, colonna="citta"):
+        """Aggiunge le colonne lat/lon a tutto il DataFrame con un'unica ricerca vettoriale."""
+        nomi = df[colonna]
+        # Si normalizzano solo i valori distinti, poi si propaga il risultato a tutte le righe
+        uniche = pd.unique(nomi.dropna())
+        chiavi = nomi.map({nome: normalizza(nome) for nome in uniche})
+
+        trovate = self._indice.reindex(chiavi.to_numpy())
+        risultato = df.copy()
+        risultato["lat"] = trovate["lat"].to_numpy()
+        risultato["lon"] = trovate["lon"].to_numpy()
+        return risultato
+
+    def mancanti(self, nomi):
+        """Elenca le città (distinte) che non compaiono nel gazetteer."""
+        return [nome for nome in pd.unique(pd.Series(nomi).dropna()) if nome not in self]
+
+    def completa(self, nomi, geocode):
+        """Risolve le città mancanti con `geocode` e le salva nella cache persistente.
+
+        `geocode` riceve il nome della città e restituisce (lat, lon) o (None, None).
+        Restituisce il numero di città aggiunte.
+        """
+        # Varianti dello stesso nome ("Forli", "FORLÌ") hanno la stessa chiave: una sola voce per chiave
+        nuove, chiavi = [], set()
+        for nome in self.mancanti(nomi):
+            chiave = normalizza(nome)
+            if chiave in chiavi:
+                continue
+            lat, lon = geocode(nome)
+            if lat is not None and lon is not None:
+                nuove.append({"comune": nome, "lat": lat, "lon": lon})
+                chiavi.add(chiave)
+
+        if not nuove:
+            return 0
+
+        df_nuove = pd.DataFrame(nuove, columns=COLONNE_CACHE)
+        cartella = os.path.dirname(self.percorso_cache)
+        if cartella:
+            os.makedirs(cartella, exist_ok=True)
+        scrivi_intestazione = not os.path.exists(self.percorso_cache)
+        df_nuove.to_csv(self.percorso_cache, mode="a", header=scrivi_intestazione, index=False)
+
+        df_nuove["chiave"] = df_nuove["comune"].map(normalizza)
+        self._indice = pd.concat([self._indice, df_nuove.set_index("chiave")[["lat", "lon"]]])
+        return len(nuove)
+
+
+def geocode_nominatim(user_agent="my_geocoder"):
+    """Crea una funzione di geocodifica online (Nominatim) per riempire la cache."""
+    from geopy.geocoders import Nominatim
+    from geopy.extra.rate_limiter import RateLimiter
+
+    geocode = RateLimiter(Nominatim(user_agent=user_agent).geocode, min_delay_seconds=1)
+
+    def risolvi(nome):
+        location = geocode(nome + ", Italy")
+        if location:
+            return location.latitude, location.longitude
+        return None, None
+
+    return risolvi
+
+
+# ----------------------------
+# Riga di comando: completamento della cache
+# ----------------------------
+def main():
+    parser = argparse.ArgumentParser(
+        description="Completa la cache del gazetteer geocodificando online le città mancanti."
+    )
+    parser.add_argument("csv", nargs="+", help="File CSV con una colonna di città")
+    parser.add_argument("--colonna", default="citta", help="Nome della colonna con le città")
+    args = parser.parse_args()
+
+    gazetteer = Gazetteer()
+    nomi = pd.concat([pd.read_csv(percorso)[args.colonna] for percorso in args.csv])
+    mancanti = gazetteer.mancanti(nomi)
+    if not mancanti:
+        print("Tutte le città sono già presenti nel gazetteer.")
+        return
+
+    print(f"Città da geocodificare: {len(mancanti)}")
+    aggiunte = gazetteer.completa(mancanti, geocode_nominatim())
+    print(f"Aggiunte alla cache: {aggiunte} ({gazetteer.percorso_cache})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from pymongo.errors import BulkWriteError
+
+import db
+import normalizzazione
+
+# ----------------------------
+# Configurazione
+# ----------------------------
+JSON_FOLDER = "./cartella_clinica"
+PERCORSO_MANIFEST = "dati/manifest_ingestione.json"
+DIMENSIONE_LOTTO = 1000
+
+# Codice di errore MongoDB per chiave duplicata
+DUPLICATE_KEY = 11000
+
+
+def hash_contenuto(data):
+    """SHA-256 della forma canonica del documento (indipendente da spaziature e ordine delle chiavi)."""
+    canonico = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+
+def id_documento(data, digest):
+    """Chiave del documento: numero_intervento più hash del contenuto."""
+    return f"{data.get('numero_intervento') or ''}:{digest}"
+
+
+def _leggi(percorso):
+    """Legge e prepara un file JSON (eseguita nei processi worker)."""
+    try:
+        with open(percorso, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        return percorso, None, f"Errore nel file {os.path.basename(percorso)}: {e}"
+
+    if not isinstance(data, dict):
+        return percorso, None, f"File non valido (non è un oggetto JSON): {os.path.basename(percorso)}"
+
+    digest = hash_contenuto(data)
+    data["_id"] = id_documento(data, digest)
+    data["hash_contenuto"] = digest
+    data["file_origine"] = os.path.basename(percorso)
+    # Campi tipizzati accanto a quelli grezzi (dopo l'hash: la chiave dipende solo dal contenuto del file)
+    normalizzazione.normalizza_documento(data)
+    return percorso, data, None
+
+
+# ----------------------------
+# Manifest dei file già caricati
+# ----------------------------
+def carica_manifest(percorso=PERCORSO_MANIFEST):
+    if not os.path.exists(percorso):
+        return {}
+    with open(percorso, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def salva_manifest(manifest, percorso=PERCORSO_MANIFEST):
+    cartella = os.path.dirname(percorso)
+    if cartella:
+        os.makedirs(cartella, exist_ok=True)
+    temporaneo = percorso + ".tmp"
+    with open(temporaneo, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False)
+    os.replace(temporaneo, percorso)
+
+
+def file_da_caricare(cartella, manifest, escludi=()):
+    """File JSON nuovi o modificati (mtime o dimensione diversi da quelli nel manifest)."""
+    escludi = {os.path.abspath(p) for p in escludi}
+    da_caricare = []
+    for entry in os.scandir(cartella):
+        if not (entry.is_file() and entry.name.endswith(".json")):
+            continue
+        percorso = os.path.normpath(entry.path)
+        if os.path.abspath(percorso) in escludi:
+            continue
+        stat = entry.stat()
+        noto = manifest.get(percorso)
+        if noto and noto["mtime"] == stat.st_mtime and noto["size"] == stat.st_size:
+            continue
+        da_caricare.append((percorso, stat.st_mtime, stat.st_size))
+    return da_caricare
+
+
+# ----------------------------
+# Scrittura su MongoDB
+# ----------------------------
+def _inserisci_lotto(collection, documenti):
+    """insert_many non ordinato: i documenti già presenti (stessa chiave) vengono ignorati."""
+    try:
+        return len(collection.insert_many(documenti, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        errori = e.details.get("writeErrors", [])
+        altri = [err for err in errori if err.get("code") != DUPLICATE_KEY]
+        if altri:
+            raise
+        return e.details.get("nInserted", 0)
+
+
+def ingerisci(cartella=JSON_FOLDER, uri=db.MONGO_URI, percorso_manifest=PERCORSO_MANIFEST,
+              lotto=DIMENSIONE_LOTTO, processi=None):
+    """Carica in `interventi` i file JSON nuovi o modificati e restituisce un riepilogo."""
+    inizio = time.perf_counter()
+    manifest = carica_manifest(percorso_manifest)
+    da_caricare = file_da_caricare(cartella, manifest, escludi=[percorso_manifest])
+
+    riepilogo = {"file": len(da_caricare), "inseriti": 0, "invariati": 0, "rimossi": 0, "scartati": 0}
+    if not da_caricare:
+        riepilogo["secondi"] = time.perf_counter() - inizio
+        riepilogo["documenti_al_secondo"] = 0.0
+        return riepilogo
+
+    client = db.crea_client(uri)
+    database = client[db.DB_NAME]
+    collection = database[db.COLLECTION_NAME]
+    db.crea_indici(database)
+
+    stat_file = {percorso: (mtime, size) for percorso, mtime, size in da_caricare}
+    buffer, superati = [], []
+
+    def svuota():
+        # Timestamp assegnato subito prima della scrittura: è il riferimento dei job incrementali
+        ingerito_il = datetime.now(timezone.utc)
+        for data in buffer:
+            data["ingerito_il"] = ingerito_il
+        riepilogo["inseriti"] += _inserisci_lotto(collection, buffer)
+        buffer.clear()
+
+    with ProcessPoolExecutor(max_workers=processi) as executor:
+        for percorso, data, errore in executor.map(_leggi, stat_file, chunksize=64):
+            if errore:
+                print(f"[⚠️] {errore}")
+                riepilogo["scartati"] += 1
+                continue
+
+            mtime, size = stat_file[percorso]
+            precedente = manifest.get(percorso)
+            manifest[percorso] = {"mtime": mtime, "size": size, "hash": data["hash_contenuto"], "id": data["_id"]}
+            if precedente and precedente["hash"] == data["hash_contenuto"]:
+                # Solo il mtime è cambiato: il contenuto è già nel database
+                riepilogo["invariati"] += 1
+                continue
+            if precedente:
+                superati.append(precedente["id"])
+
+            buffer.append(data)
+            if len(buffer) >= lotto:
+                svuota()
+    if buffer:
+        svuota()
+
+    # Le versioni precedenti dei file modificati vengono rimosse, se nessun altro file le usa ancora
+    id_in_uso = {voce["id"] for voce in manifest.values()}
+    obsoleti = [i for i in superati if i not in id_in_uso]
+    if obsoleti:
+        riepilogo["rimossi"] = collection.delete_many({"_id": {"$in": obsoleti}}).deleted_count
+        if riepilogo["rimossi"]:
+            # I conteggi incrementali includono ancora le versioni rimosse: analisi.py li ricalcola
+            db.registra_rimozioni(database, riepilogo["rimossi"])
+
+    if riepilogo["inseriti"] or riepilogo["rimossi"]:
+        db.incrementa_versione(database)
+    salva_manifest(manifest, percorso_manifest)
+
+    secondi = time.perf_counter() - inizio
+    riepilogo["secondi"] = secondi
+    riepilogo["documenti_al_secondo"] = riepilogo["inseriti"] / secondi if secondi > 0 else 0.0
+    return riepilogo
+
+
+# ----------------------------
+# Riga di comando
+# ----------------------------
+def main():
+    parser = argparse.ArgumentParser(
+        description="Carica in MongoDB le cartelle cliniche JSON nuove o modificate."
+    )
+    parser.add_argument("cartella", nargs="?", default=JSON_FOLDER, help="Cartella con i file JSON")
+    parser.add_argument("--uri", default=db.MONGO_URI, help="URI di MongoDB")
+    parser.add_argument("--manifest", default=PERCORSO_MANIFEST, help="File manifest dei file già caricati")
+    parser.add_argument("--lotto", type=int, default=DIMENSIONE_LOTTO, help="Documenti per insert_many")
+    parser.add_argument("--processi", type=int, default=None, help="Processi per il parsing (default: numero di core)")
+    args = parser.parse_args()
+
+    r = ingerisci(args.cartella, args.uri, args.manifest, args.lotto, args.processi)
+    print(
+        f"Inserimento completato: {r['file']} file da elaborare, {r['inseriti']} documenti caricati, "
+        f"{r['invariati']} invariati, {r['rimossi']} versioni precedenti rimosse, {r['scartati']} file scartati."
+    )
+    print(f"Tempo: {r['secondi']:.2f} s ({r['documenti_al_secondo']:.0f} documenti/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+# ----------------------------
+# Definizioni condivise delle fasce e delle soglie
+# ----------------------------
+# Usate dalla dashboard, dalle pipeline MongoDB e dai job di analisi:
+# ogni fascia è definita una sola volta qui.
+
+# Soglie (minuti) per classificare un intervento come rapido o lento
+SOGLIA_RAPIDO = 8
+SOGLIA_LENTO = 20
+
+# Tempo di occupazione dell'ambulanza: (limite superiore incluso, etichetta)
+FASCE_DURATA = [(10, "≤10 min"), (20, "11–20 min"), (30, "21–30 min")]
+FASCIA_DURATA_OLTRE = ">30 min"
+
+# Età del paziente: (limite superiore incluso, etichetta)
+FASCE_ETA = [(18, "0–18"), (35, "19–35"), (60, "36–60")]
+FASCIA_ETA_OLTRE = "60+"
+
+# Fasce orarie della chiamata: (ora di inizio, etichetta), l'ultima scavalca la mezzanotte
+FASCE_ORARIE = [
+    (6, "06:00 - 09:59"),
+    (10, "10:00 - 13:59"),
+    (14, "14:00 - 17:59"),
+    (18, "18:00 - 21:59"),
+    (22, "22:00 - 01:59"),
+    (2, "02:00 - 05:59"),
+]
+
+# Raggio dei cerchi sulla mappa (metri)
+RAGGIO_BASE = 3000
+RAGGIO_SCALA = 15000
+
+
+def etichette(fasce, oltre=None):
+    """Etichette delle fasce nell'ordine di visualizzazione."""
+    nomi = [etichetta for _, etichetta in fasce]
+    return nomi + [oltre] if oltre else nomi
+
+
+def _taglia(valori, fasce, oltre):
+    limiti = [-np.inf] + [limite for limite, _ in fasce] + [np.inf]
+    numerici = pd.to_numeric(pd.Series(valori), errors="coerce")
+    return pd.cut(numerici, bins=limiti, labels=etichette(fasce, oltre), right=True)
+
+
+def fascia_durata(minuti):
+    """Fascia del tempo di occupazione (Categorical ordinato, NaN se la durata manca)."""
+    return _taglia(minuti, FASCE_DURATA, FASCIA_DURATA_OLTRE)
+
+
+def fascia_eta(eta):
+    """Fascia d'età (Categorical ordinato, NaN se l'età non è numerica)."""
+    return _taglia(eta, FASCE_ETA, FASCIA_ETA_OLTRE)
+
+
+def _fascia_per_ora():
+    """Per ognuna delle 24 ore, l'indice della fascia oraria a cui appartiene."""
+    indici = np.empty(24, dtype=np.int8)
+    for i, (inizio, _) in enumerate(FASCE_ORARIE):
+        fine = FASCE_ORARIE[(i + 1) % len(FASCE_ORARIE)][0]
+        ore = np.arange(inizio, fine if fine > inizio else fine + 24) % 24
+        indici[ore] = i
+    return indici
+
+
+_FASCIA_PER_ORA = _fascia_per_ora()
+
+
+def fascia_oraria(ore):
+    """Fascia oraria per una serie di ore (0-23); Categorical ordinato, NaN se l'ora manca."""
+    ore = pd.to_numeric(pd.Series(ore), errors="coerce")
+    valide = ore.notna() & ore.between(0, 23)
+    codici = np.full(len(ore), -1, dtype=np.int8)
+    codici[valide.to_numpy()] = _FASCIA_PER_ORA[ore[valide].to_numpy(dtype=np.int64)]
+    categorie = pd.Categorical.from_codes(codici, categories=etichette(FASCE_ORARIE), ordered=True)
+    return pd.Series(categorie, index=ore.index)
+
+
+def raggio(conteggi):
+    """Raggio proporzionale al numero di interventi rispetto al massimo."""
+    conteggi = pd.to_numeric(pd.Series(conteggi), errors="coerce").astype("float64")
+    return RAGGIO_BASE + conteggi / conteggi.max() * RAGGIO_SCALA
+
+
+def nomi_farmaci(farmaci):
+    """Nomi dei farmaci in minuscolo, una riga per somministrazione.
+
+    Ogni elemento della serie è una lista di farmaci, ciascuno stringa oppure
+    oggetto con il campo "nome"; i valori che non sono liste vengono ignorati.
+    """
+    farmaci = pd.Series(farmaci)
+    esplosi = farmaci[farmaci.map(type).eq(list)].explode().dropna()
+    tipi = esplosi.map(type)
+
+    stringhe = esplosi[tipi.eq(str)]
+    oggetti = esplosi[tipi.eq(dict)]
+    nomi_oggetti = pd.Series(
+        [nome if isinstance(nome := o.get("nome"), str) else None for o in oggetti],
+        index=oggetti.index,
+        dtype=object,
+    ).dropna()
+    nomi = pd.concat([stringhe, nomi_oggetti])
+
+    # Il minuscolo si calcola una volta per ogni nome distinto, non per ogni riga
+    codici, distinti = pd.factorize(nomi)
+    return pd.Series(pd.Index(distinti, dtype=object).str.lower().take(codici), index=nomi.index, dtype=object)
@@ -0,0 +1,228 @@
+import argparse
+import re
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+import db
+
+# ----------------------------
+# Normalizzazione dei documenti all'ingestione
+# ----------------------------
+# I campi grezzi (come li ha scritti il modello) restano invariati; accanto vengono
+# aggiunti campi tipizzati su cui MongoDB può filtrare e ordinare direttamente:
+#   - <fase>_il: data e ora di ogni fase (solo se la data dell'intervento è nota),
+#     con il passaggio della mezzanotte (un orario precedente al precedente è del giorno dopo)
+#   - minuto_chiamata: minuti dalla mezzanotte della chiamata (0-1439)
+#   - tempo_di_intervento: minuti dalla chiamata all'arrivo sul posto
+#   - durata_minuti: minuti dalla partenza dell'ambulanza all'arrivo in PS (tempo di occupazione)
+#   - eta_anni: età numerica
+#   - parametri_vitali_numerici: una rilevazione numerica per ogni rilevazione grezza
+# Le date e ore sono l'ora locale dell'intervento (salvata senza fuso orario).
+
+VERSIONE = 3  # da incrementare quando cambiano le regole: `python normalizzazione.py` riallinea i documenti
+LOTTO = 1000
+
+# Fasi dell'intervento in ordine cronologico: campo grezzo -> campo tipizzato
+FASI = [
+    ("ora_chiamata", "chiamata_il"),
+    ("ora_partenza_ambulanza", "partenza_ambulanza_il"),
+    ("ora_arrivo_sul_posto", "arrivo_sul_posto_il"),
+    ("ora_partenza_dal_posto", "partenza_dal_posto_il"),
+    ("ora_arrivo_ps", "arrivo_ps_il"),
+    ("ora_rientro_sede", "rientro_sede_il"),
+]
+
+FORMATI_DATA = ["%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y/%m/%d", "%d/%m/%y"]
+ORARIO = re.compile(r"^\s*(\d{1,2})[:.](\d{2})(?::\d{2})?\s*$")
+NUMERO = re.compile(r"\d+(?:[.,]\d+)?")
+# Valore fuori scala o soglia ("<60", ">= 200", "oltre 40", "sotto i 60"): il numero è solo un limite
+CONFRONTO = re.compile(
+    r"(?:[<>≤≥]=?|\b(?:meno|più|oltre|sotto|sopra|inferiore|superiore)(?:\s+(?:a|ai|al|agli|di|dei|del|degli|i|gli|le|il|lo))?)\s*$",
+    re.IGNORECASE,
+)
+ETA = re.compile(r"(\d+(?:[.,]\d+)?)\s*(anni|anno|mesi|mese|giorni|giorno)?", re.IGNORECASE)
+
+# Parametri vitali numerici: campo grezzo -> (intervallo plausibile)
+PARAMETRI = {
+    "frequenza_cardiaca": (0, 300),
+    "frequenza_respiratoria": (0, 80),
+    "saturazione_ossigeno": (0, 100),
+    "glicemia": (0, 2000),
+    "temperatura": (20, 45),
+}
+
+
+# ----------------------------
+# Conversioni dei singoli valori
+# ----------------------------
+def data(valore):
+    """Data dell'intervento come datetime a mezzanotte, o None."""
+    if isinstance(valore, datetime):
+        return valore.replace(hour=0, minute=0, second=0, microsecond=0)
+    if not isinstance(valore, str) or not valore.strip():
+        return None
+    for formato in FORMATI_DATA:
+        try:
+            return datetime.strptime(valore.strip(), formato)
+        except ValueError:
+            continue
+    return None
+
+
+def minuti_del_giorno(valore):
+    """Orario "HH:mm" (anche "H.mm" o "HH:mm:ss") in minuti dalla mezzanotte, o None."""
+    if not isinstance(valore, str):
+        return None
+    orario = ORARIO.match(valore)
+    if not orario:
+        return None
+    ore, minuti = int(orario.group(1)), int(orario.group(2))
+    return ore * 60 + minuti if ore < 24 and minuti < 60 else None
+
+
+def minuti_progressivi(documento):
+    """Minuti di ogni fase dalla mezzanotte del giorno della prima fase, con il passaggio della mezzanotte.
+
+    Ogni orario precedente a quello della fase prima viene spostato al giorno successivo.
+    """
+    progressivi = {}
+    precedente, giorni = None, 0
+    for campo, _ in FASI:
+        minuti = minuti_del_giorno(documento.get(campo))
+        if minuti is None:
+            continue
+        if precedente is not None and minuti + giorni * 1440 < precedente:
+            giorni += 1
+        precedente = minuti + giorni * 1440
+        progressivi[campo] = precedente
+    return progressivi
+
+
+def preceduto_da_confronto(testo, posizione):
+    """True se il numero che inizia in `posizione` è preceduto da un confronto ("<60"): un limite, non una misura."""
+    return bool(CONFRONTO.search(testo, 0, posizione))
+
+
+def numero(valore, minimo=None, massimo=None):
+    """Primo numero in un valore grezzo ("60 bpm", "36,8 °C", "97%").
+
+    None se assente, fuori intervallo o preceduto da un confronto ("<60", ">200").
+    """
+    if isinstance(valore, bool):
+        return None
+    if isinstance(valore, (int, float)):
+        trovato = float(valore)
+    else:
+        testo = str(valore or "")
+        corrispondenza = NUMERO.search(testo)
+        if not corrispondenza or preceduto_da_confronto(testo, corrispondenza.start()):
+            return None
+        trovato = float(corrispondenza.group().replace(",", "."))
+    if (minimo is not None and trovato < minimo) or (massimo is not None and trovato > massimo):
+        return None
+    return trovato
+
+
+def eta_anni(valore, data_nascita=None, giorno=None):
+    """Età numerica da "43", "circa 40 anni", "6 mesi"; in mancanza, dalla data di nascita."""
+    if isinstance(valore, (int, float)) and not isinstance(valore, bool):
+        return float(valore) if 0 <= valore <= 120 else None
+    corrispondenza = ETA.search(valore) if isinstance(valore, str) else None
+    if corrispondenza:
+        anni = float(corrispondenza.group(1).replace(",", "."))
+        unita = (corrispondenza.group(2) or "anni").lower()
+        if unita.startswith("mes"):
+            anni /= 12
+        elif unita.startswith("giorn"):
+            anni /= 365
+        return round(anni, 2) if anni <= 120 else None
+    nascita = data(data_nascita)
+    if nascita and giorno and nascita <= giorno:
+        return float(giorno.year - nascita.year - ((giorno.month, giorno.day) < (nascita.month, nascita.day)))
+    return None
+
+
+def parametri_numerici(rilevazione):
+    numerici = {campo: numero(rilevazione.get(campo), *intervallo) for campo, intervallo in PARAMETRI.items()}
+    testo = str(rilevazione.get("pressione_arteriosa") or "")
+    pressione = list(NUMERO.finditer(testo))
+    sistolica, diastolica = None, None
+    if len(pressione) >= 2 and not any(preceduto_da_confronto(testo, p.start()) for p in pressione[:2]):
+        sistolica, diastolica = float(pressione[0].group()), float(pressione[1].group())
+    numerici["pressione_sistolica"] = sistolica if sistolica and sistolica <= 300 else None
+    numerici["pressione_diastolica"] = diastolica if diastolica is not None and diastolica <= 200 else None
+    numerici["tempo_rilevazione"] = minuti_del_giorno(rilevazione.get("tempo_rilevazione"))
+    return numerici
+
+
+# ----------------------------
+# Documento
+# ----------------------------
+def campi_normalizzati(documento):
+    """Campi tipizzati da affiancare ai campi grezzi del documento."""
+    giorno = data(documento.get("data"))
+    progressivi = minuti_progressivi(documento)
+
+    campi = {"normalizzazione": VERSIONE}
+    for campo, tipizzato in FASI:
+        minuti = progressivi.get(campo)
+        campi[tipizzato] = giorno + timedelta(minutes=minuti) if giorno and minuti is not None else None
+
+    chiamata = progressivi.get("ora_chiamata")
+    campi["minuto_chiamata"] = chiamata % 1440 if chiamata is not None else None
+
+    def intervallo(da, a):
+        if da in progressivi and a in progressivi:
+            return progressivi[a] - progressivi[da]
+        return None
+
+    campi["tempo_di_intervento"] = intervallo("ora_chiamata", "ora_arrivo_sul_posto")
+    campi["durata_minuti"] = intervallo("ora_partenza_ambulanza", "ora_arrivo_ps")
+    campi["eta_anni"] = eta_anni(documento.get("eta"), documento.get("data_nascita"), giorno)
+
+    rilevazioni = documento.get("parametri_vitali")
+    campi["parametri_vitali_numerici"] = [
+        parametri_numerici(r) for r in (rilevazioni if isinstance(rilevazioni, list) else []) if isinstance(r, dict)
+    ]
+    return campi
+
+
+def normalizza_documento(documento):
+    """Aggiunge al documento i campi tipizzati (i campi grezzi non vengono modificati)."""
+    documento.update(campi_normalizzati(documento))
+    return documento
+
+
+# ----------------------------
+# Riallineamento dei documenti già presenti
+# ----------------------------
+def normalizza_collezione(collection, lotto=LOTTO):
+    """Aggiorna i documenti caricati prima della normalizzazione (o con una versione precedente)."""
+    aggiornati, operazioni = 0, []
+    for documento in collection.find({"normalizzazione": {"$ne": VERSIONE}}):
+        operazioni.append(UpdateOne({"_id": documento["_id"]}, {"$set": campi_normalizzati(documento)}))
+        if len(operazioni) >= lotto:
+            aggiornati += collection.bulk_write(operazioni, ordered=False).modified_count
+            operazioni = []
+    if operazioni:
+        aggiornati += collection.bulk_write(operazioni, ordered=False).modified_count
+    return aggiornati
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggiunge i campi tipizzati ai documenti di `interventi` già caricati.")
+    parser.add_argument("--uri", default=db.MONGO_URI, help="URI di MongoDB")
+    args = parser.parse_args()
+
+    client = db.crea_client(args.uri)
+    database = client[db.DB_NAME]
+    db.crea_indici(database)
+    aggiornati = normalizza_collezione(database[db.COLLECTION_NAME])
+    if aggiornati:
+        db.incrementa_versione(database)
+    print(f"Documenti normalizzati: {aggiornati}")
+
+
+if __name__ == "__main__":
+    main()
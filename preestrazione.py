@@ -0,0 +1,277 @@
+import functools
+import re
+
+import cache_llm
+from normalizzazione import CONFRONTO, preceduto_da_confronto
+from testo import normalizza
+
+# ----------------------------
+# Pre-estrazione a regole dei campi "meccanici" della cartella clinica
+# ----------------------------
+# Orari, codici, telefono, indirizzo, data, età e parametri vitali numerici si
+# riconoscono con espressioni regolari (e il gazetteer dei comuni per la città):
+# i campi trovati vengono tolti dal prompt, così il modello genera solo quelli
+# descrittivi (sintomi, stato di coscienza, note, ...). Le regole sono volutamente
+# prudenti: un campo non riconosciuto con certezza resta al modello.
+
+# Parole chiave che precedono un orario, nell'ordine in cui vengono provate:
+# le più specifiche prima ("partiti verso il pronto soccorso" è la partenza dal posto)
+ORARI = [
+    ("ora_rientro_sede", re.compile(r"rientr|liber[oiae]\b|operativ|in sede")),
+    ("ora_partenza_dal_posto", re.compile(
+        r"ripart|(?:partenza|partiti|partita|partito) dal (?:posto|luogo)|lasciat|verso (?:il |l'|lo )?(?:pronto soccorso|ps|ospedale)|inizio (?:del )?trasporto"
+    )),
+    ("ora_arrivo_ps", re.compile(r"pronto soccorso|\bps\b|ospedale|consegn")),
+    ("ora_arrivo_sul_posto", re.compile(r"sul posto|sul luogo|arriv|giunt")),
+    ("ora_partenza_ambulanza", re.compile(r"partenza|partit|uscit|usciti")),
+    ("ora_chiamata", re.compile(r"chiamat|telefonat|segnalazion|allert|ricevut")),
+]
+ORA = re.compile(r"\b(?:(?:alle|ore)\s+([01]?\d|2[0-3])\s+e\s+([0-5]\d)|([01]?\d|2[0-3])[:.]([0-5]\d))\b", re.IGNORECASE)
+
+COLORI = "bianco|verde|giallo|rosso|nero"
+CODICE = re.compile(
+    rf"\bcodice\s+(?:di\s+)?(?:(uscita|rientro|trasporto)\s+)?(?:[:è]\s*)?({COLORI}|d\s?[0-5])\b", re.IGNORECASE
+)
+CONTESTO_RIENTRO = re.compile(r"rientr|trasport")
+
+TELEFONO = re.compile(r"(?<![\w-])(?:\+39[\s.]?)?(?:3\d{2}|0\d{1,3})(?:[\s.\-‑]?\d){5,8}(?![\w-])")
+CONTESTO_TELEFONO = re.compile(r"telefon|numero|recapito|chiamante|cellulare|cell\b")
+
+VIA = re.compile(
+    r"\b((?i:via|viale|piazza|piazzale|corso|largo|vicolo|strada|località|contrada))\s+"
+    r"((?:(?:del|dello|della|dei|degli|delle|di|de|san|santa|sant)\s+|d'|dell')*[A-ZÀ-Ý][\w'’]*(?:\s+[A-ZÀ-Ý][\w'’]*)*)"
+    r"(?:\s*,?\s*(?:n\.?|numero|civico)?\s*(\d{1,4}[a-zA-Z]?)\b)?"
+)
+NOME_PROPRIO = re.compile(r"[A-ZÀ-Ý][\w'’]*(?:\s+(?:di\s+|del\s+)?[A-ZÀ-Ý][\w'’]*){0,2}")
+DOPO_CITTA = re.compile(r"\s*\(?([A-Z]{2})\)?(?![\w])")
+CAP = re.compile(r"\b(?:cap\s+)?(\d{5})\b", re.IGNORECASE)
+
+NUMERO_INTERVENTO = re.compile(
+    r"\b(?:(?:intervento|missione|servizio|scheda)\s+(?:numero\s+|n\.?\s*|nr\.?\s*)?|numero\s+(?:di\s+|dell')?intervento\s+)"
+    r"([A-Z]{1,4}[\s-]?\d[\w-]*|\d{3,}[\w-]*)",
+    re.IGNORECASE,
+)
+
+MESI = ["gennaio", "febbraio", "marzo", "aprile", "maggio", "giugno",
+        "luglio", "agosto", "settembre", "ottobre", "novembre", "dicembre"]
+DATA = re.compile(
+    rf"\b(?:(\d{{4}})-(\d{{2}})-(\d{{2}})|(\d{{1,2}})[/.-](\d{{1,2}})[/.-](\d{{4}})|(\d{{1,2}})\s+({'|'.join(MESI)})\s+(\d{{4}}))\b",
+    re.IGNORECASE,
+)
+ETA = re.compile(r"\b(\d{1,3})\s+anni\b", re.IGNORECASE)
+
+# Fine frase (il punto tra due cifre è un decimale)
+FRASI = re.compile(r"[;!?\n]|\.(?!\d)|(?<!\d)\.")
+CIFRA = re.compile(r"\d")
+
+# Parametri vitali: (campo, espressione sul testo minuscolo, intervallo plausibile, formato)
+PARAMETRI = [
+    ("frequenza_cardiaca", re.compile(
+        r"(?:frequenza\s+cardiaca|\bfc\b|battito|polso)\D{0,20}?(\d{1,3})\b|\b(\d{1,3})\s*(?:bpm|battiti)"
+    ), (0, 300), "{} bpm"),
+    ("pressione_arteriosa", re.compile(
+        r"(?:pressione(?:\s+arteriosa)?|\bpa\b)\D{0,20}?(\d{1,3})\s*(?:/|su|-)\s*(\d{1,3})\b"
+    ), (0, 300), "{}/{}"),
+    ("frequenza_respiratoria", re.compile(
+        r"(?:frequenza\s+respiratoria|\bfr\b)\D{0,20}?(\d{1,2})\b|\b(\d{1,2})\s*(?:atti|respiri)"
+    ), (0, 80), "{} atti/min"),
+    ("saturazione_ossigeno", re.compile(
+        r"(?:saturazione|satura|spo2|\bsat\b)\D{0,20}?(\d{1,3})\b"
+    ), (0, 100), "{}%"),
+    ("glicemia", re.compile(r"(?:glicemia|glucosio|destrostix|\bhgt\b)\D{0,20}?(\d{2,4})\b"), (10, 1000), "{} mg/dL"),
+    ("temperatura", re.compile(
+        r"(?:temperatura|\btc\b)\D{0,20}?(\d{2}(?:[.,]\d)?)\b|\b(\d{2}(?:[.,]\d)?)\s*(?:gradi|°)"
+    ), (25, 45), "{} °C"),
+]
+
+
+@functools.lru_cache(maxsize=1)
+def _comuni():
+    """Gazetteer dei comuni (None se la tabella non è disponibile)."""
+    try:
+        from gazetteer import Gazetteer
+
+        return Gazetteer()
+    except OSError:
+        return None
+
+
+# ----------------------------
+# Singoli estrattori
+# ----------------------------
+def orari(testo):
+    trovati = {}
+    inizio = 0
+    for ora in ORA.finditer(testo):
+        # Il contesto è il testo tra l'orario precedente e questo, entro la frase
+        contesto = testo[inizio:ora.start()]
+        contesto = re.split(r"[.;\n]", contesto)[-1].lower()
+        inizio = ora.end()
+        campo = next((campo for campo, chiavi in ORARI if chiavi.search(contesto)), None)
+        if campo and campo not in trovati:
+            ore, minuti = (ora.group(1), ora.group(2)) if ora.group(1) else (ora.group(3), ora.group(4))
+            trovati[campo] = f"{int(ore):02d}:{minuti}"
+    return trovati
+
+
+def _codice(valore):
+    valore = valore.replace(" ", "")
+    return valore.upper() if valore[0] in "dD" else valore.capitalize()
+
+
+def codici(testo):
+    trovati = {}
+    senza_tipo = []
+    for codice in CODICE.finditer(testo):
+        tipo = (codice.group(1) or "").lower()
+        if not tipo:
+            senza_tipo.append(codice)
+            continue
+        campo = "codice_uscita" if tipo == "uscita" else "codice_rientro"
+        trovati.setdefault(campo, _codice(codice.group(2)))
+    # "codice giallo" senza "di uscita"/"di rientro" vale solo per i campi non già indicati esplicitamente
+    for codice in senza_tipo:
+        precedente = normalizza(testo[max(0, codice.start() - 40):codice.start()])
+        rientro = CONTESTO_RIENTRO.search(precedente) or "codice_uscita" in trovati
+        trovati.setdefault("codice_rientro" if rientro else "codice_uscita", _codice(codice.group(2)))
+    return trovati
+
+
+def telefono(testo):
+    numeri = list(TELEFONO.finditer(testo))
+    if not numeri:
+        return {}
+    # Un numero preceduto da "telefono", "recapito", ... ha la precedenza
+    scelto = next(
+        (n for n in numeri if CONTESTO_TELEFONO.search(normalizza(testo[max(0, n.start() - 30):n.start()]))), numeri[0]
+    )
+    return {"telefono_chiamante": scelto.group().strip()}
+
+
+def _citta_dopo(testo, posizione, comuni):
+    """Città (nel gazetteer) che segue l'indirizzo, con provincia e posizione finale."""
+    seguito = re.match(r"\s*,?\s*(?:a\s+|in\s+)?", testo[posizione:])
+    candidato = NOME_PROPRIO.match(testo, posizione + seguito.end())
+    if not candidato:
+        return None, None, posizione
+    parole = candidato.group().split()
+    # Prima il nome più lungo: "Reggio Emilia" prima di "Reggio"
+    for n in range(len(parole), 0, -1):
+        nome = " ".join(parole[:n])
+        if nome in comuni:
+            fine = candidato.start() + len(nome)
+            provincia = DOPO_CITTA.match(testo, fine)
+            return nome, provincia.group(1) if provincia else None, provincia.end() if provincia else fine
+    return None, None, posizione
+
+
+def indirizzo(testo):
+    comuni = _comuni()
+    via = VIA.search(testo)
+    if not via:
+        return {}
+    trovati = {"via": f"{via.group(1).lower()} {via.group(2)}"}
+    if via.group(3):
+        trovati["numero_civico"] = via.group(3)
+    citta, provincia, fine = _citta_dopo(testo, via.end(), comuni) if comuni is not None else (None, None, via.end())
+    completo = " ".join(p for p in (trovati["via"], trovati.get("numero_civico")) if p)
+    if citta:
+        trovati["citta"] = citta
+        completo += f", {citta}"
+        if provincia:
+            trovati["provincia"] = provincia
+        cap = CAP.match(testo, fine + len(re.match(r"[\s,]*", testo[fine:]).group()))
+        if cap:
+            trovati["cap"] = cap.group(1)
+    trovati["indirizzo_intervento"] = completo
+    if "cap" not in trovati:
+        cap = re.search(r"\bcap\s+(\d{5})\b", testo, re.IGNORECASE)
+        if cap:
+            trovati["cap"] = cap.group(1)
+    return trovati
+
+
+def numero_intervento(testo):
+    numero = NUMERO_INTERVENTO.search(testo)
+    return {"numero_intervento": numero.group(1).replace(" ", "").upper()} if numero else {}
+
+
+def data(testo):
+    for trovata in DATA.finditer(testo):
+        # Le date di nascita non sono la data dell'intervento
+        if re.search(r"\bnat[oa]\b|nascita", normalizza(testo[max(0, trovata.start() - 25):trovata.start()])):
+            continue
+        g = trovata.groups()
+        if g[0]:
+            anno, mese, giorno = g[0], int(g[1]), int(g[2])
+        elif g[3]:
+            anno, mese, giorno = g[5], int(g[4]), int(g[3])
+        else:
+            anno, mese, giorno = g[8], MESI.index(g[7].lower()) + 1, int(g[6])
+        if 1 <= mese <= 12 and 1 <= giorno <= 31:
+            return {"data": f"{anno}-{mese:02d}-{giorno:02d}"}
+    return {}
+
+
+def eta(testo):
+    for trovata in ETA.finditer(testo):
+        # "diabetico da 10 anni", "fuma per 20 anni": durate, non età
+        if re.search(r"\b(?:da|per|fa|dopo)\s*$", testo[max(0, trovata.start() - 8):trovata.start()], re.IGNORECASE):
+            continue
+        if int(trovata.group(1)) <= 120:
+            return {"eta": f"{int(trovata.group(1))} anni"}
+    return {}
+
+
+def _parametri_frase(frase):
+    valori = {}
+    for campo, espressione, (minimo, massimo), formato in PARAMETRI:
+        for trovata in espressione.finditer(frase):
+            gruppi = [i for i, g in enumerate(trovata.groups(), 1) if g]
+            # "polso sotto i 60 bpm" è una soglia, non una misura: il campo resta al modello
+            if any(preceduto_da_confronto(frase, trovata.start(i)) for i in gruppi):
+                continue
+            numeri = [trovata.group(i).replace(",", ".") for i in gruppi]
+            if all(minimo <= float(n) <= massimo for n in numeri):
+                valori.setdefault(campo, formato.format(*numeri))
+    return valori
+
+
+def parametri_vitali(testo):
+    """Rilevazioni dei parametri vitali, una per ogni frase che ne elenca almeno due.
+
+    Un parametro citato da solo ("polso debole a 50 bpm") completa la prima
+    rilevazione solo se lì manca: non apre una nuova rilevazione.
+    """
+    rilevazioni, isolati = [], []
+    for frase in FRASI.split(testo.lower()):
+        if not CIFRA.search(frase):
+            continue
+        valori = _parametri_frase(frase)
+        (rilevazioni if len(valori) > 1 else isolati).append(valori)
+    if not rilevazioni:
+        rilevazioni = [{}]
+    for valori in isolati:
+        for campo, valore in valori.items():
+            rilevazioni[0].setdefault(campo, valore)
+    return {"parametri_vitali": rilevazioni} if rilevazioni[0] else {}
+
+
+ESTRATTORI = [orari, codici, telefono, indirizzo, numero_intervento, data, eta, parametri_vitali]
+
+
+def preestrai(testo):
+    """Campi ricavati dalla trascrizione senza modello (solo quelli trovati)."""
+    trovati = {}
+    for estrattore in ESTRATTORI:
+        trovati.update(estrattore(testo))
+    return trovati
+
+
+# Parte della chiave di cache dell'estrazione: il prompt ridotto dipende dalle regole
+VERSIONE = cache_llm.versione_template(
+    [chiavi.pattern for _, chiavi in ORARI],
+    [r.pattern for r in (ORA, CODICE, TELEFONO, VIA, CAP, NUMERO_INTERVENTO, DATA, ETA)],
+    [(campo, r.pattern, intervallo) for campo, r, intervallo, _ in PARAMETRI],
+    CONFRONTO.pattern,
+)
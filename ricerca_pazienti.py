@@ -0,0 +1,112 @@
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+from testo import normalizza
+
+# ----------------------------
+# Indice di ricerca sui nomi dei pazienti
+# ----------------------------
+CAMPO_NOME = "cognome_nome_paziente"
+LUNGHEZZA_NGRAM = 3
+
+
+def _ngram(testo, n=LUNGHEZZA_NGRAM):
+    return {testo[i:i + n] for i in range(len(testo) - n + 1)}
+
+
+class IndicePazienti:
+    """Indice in memoria per l'autocompletamento dei nomi dei pazienti.
+
+    I nomi sono confrontati in forma normalizzata (senza accenti, maiuscole e
+    punteggiatura). Prima vengono i nomi in cui ogni parola della ricerca è
+    prefisso di una parola del nome (vettore ordinato di parole e ricerca
+    binaria), poi quelli che contengono la ricerca come sottostringa, trovati
+    tramite un indice di trigrammi costruito alla prima ricerca che ne ha bisogno.
+    """
+
+    def __init__(self, nomi):
+        self.nomi = sorted({n for n in nomi if isinstance(n, str) and n.strip()})
+        self._normalizzati = [normalizza(n) for n in self.nomi]
+        self._trigrammi = None
+
+        parole = sorted(
+            (parola, i)
+            for i, nome in enumerate(self._normalizzati)
+            for parola in set(nome.split())
+        )
+        self._parole = [p for p, _ in parole]
+        # Gli id sono posizioni in `self.nomi`: ordinarli equivale a ordinare alfabeticamente
+        self._id_parole = np.fromiter((i for _, i in parole), dtype=np.uint32, count=len(parole))
+
+    def __len__(self):
+        return len(self.nomi)
+
+    def _per_prefisso(self, prefisso):
+        inizio = bisect_left(self._parole, prefisso)
+        fine = bisect_left(self._parole, prefisso + "\uffff", lo=inizio)
+        return np.unique(self._id_parole[inizio:fine])
+
+    def _indice_trigrammi(self):
+        if self._trigrammi is None:
+            trigrammi = {}
+            for i, nome in enumerate(self._normalizzati):
+                for trigramma in _ngram(nome):
+                    trigrammi.setdefault(trigramma, []).append(i)
+            # Liste di interi compatte: l'indice resta piccolo anche con milioni di nomi
+            self._trigrammi = {t: array("I", ids) for t, ids in trigrammi.items()}
+        return self._trigrammi
+
+    def _per_sottostringa(self, testo):
+        trigrammi = _ngram(testo)
+        if trigrammi:
+            # Si parte dalla lista più corta e si verifica la sottostringa sui candidati
+            indice = self._indice_trigrammi()
+            liste = sorted((indice.get(t, ()) for t in trigrammi), key=len)
+            candidati = set(liste[0]).intersection(*liste[1:])
+        else:
+            candidati = range(len(self._normalizzati))
+        return np.array(sorted(i for i in candidati if testo in self._normalizzati[i]), dtype=np.uint32)
+
+    def cerca(self, testo, limite=50):
+        """Nomi che corrispondono a `testo` (al massimo `limite`).
+
+        Prima le corrispondenze per prefisso di parola, poi le altre per sottostringa,
+        ciascun gruppo in ordine alfabetico.
+        """
+        query = normalizza(testo)
+        if not query:
+            return []
+
+        risultati = None
+        for parola in query.split():
+            trovati = self._per_prefisso(parola)
+            risultati = trovati if risultati is None else np.intersect1d(risultati, trovati, assume_unique=True)
+            if not len(risultati):
+                break
+
+        if len(risultati) < limite:
+            # "ossi" deve trovare "Rossi" anche se un altro nome ha una parola che inizia per "ossi"
+            altri = self._per_sottostringa(query)
+            risultati = np.concatenate([risultati, np.setdiff1d(altri, risultati, assume_unique=True)])
+
+        return [self.nomi[i] for i in risultati[:limite]]
+
+
+# ----------------------------
+# Query MongoDB
+# ----------------------------
+def nomi_pazienti(collection):
+    """Nomi distinti dei pazienti; con l'indice su `cognome_nome_paziente` il server legge solo l'indice."""
+    pipeline = [
+        {"$match": {CAMPO_NOME: {"$type": "string"}}},
+        {"$sort": {CAMPO_NOME: 1}},
+        {"$group": {"_id": "$" + CAMPO_NOME}},
+    ]
+    return sorted(doc["_id"] for doc in collection.aggregate(pipeline, allowDiskUse=True))
+
+
+def interventi_paziente(collection, nome):
+    """Tutti gli interventi del paziente, senza `_id`."""
+    return list(collection.find({CAMPO_NOME: nome}, {"_id": 0}))
@@ -0,0 +1,130 @@
+import glob
+import os
+import shutil
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ----------------------------
+# Output di analisi in formato colonnare (Parquet)
+# ----------------------------
+# Ogni tabella è una cartella `output/<nome>.parquet/` con uno o più file part-*.parquet:
+# i job incrementali aggiungono un nuovo file invece di riscrivere la tabella.
+
+OUTPUT_DIR = "output"
+COMPRESSIONE = "zstd"
+
+TEMPI = "tempi_occupazione_ambulanza"
+DISTRIBUZIONE = "distribuzione_ambulanze_estreme"
+TOP_CITTA = "top_citta_interventi"
+
+# Orari "HH:mm" salvati come minuti dalla mezzanotte (0-1439)
+COLONNE_ORARIO = ["ora_partenza_ambulanza", "ora_arrivo_ps", "ora_chiamata", "ora_arrivo_sul_posto"]
+COLONNE_MINUTI = ["durata_minuti", "tempo_di_intervento"]
+COLONNE_CONTEGGIO = ["count", "totale_interventi", "interventi_rapidi", "interventi_lenti"]
+COLONNE_PERCENTUALE = ["percentuale_rapidi", "percentuale_lenti"]
+
+
+def minuti_del_giorno(serie):
+    """Converte una colonna di orari "HH:mm" in minuti dalla mezzanotte (Int16, <NA> se non valido)."""
+    if pd.api.types.is_integer_dtype(serie):
+        return serie.astype("Int16")
+    parti = serie.astype("string").str.extract(r"^\s*(\d{1,2}):(\d{2})\s*$")
+    ore = pd.to_numeric(parti[0], errors="coerce")
+    minuti = pd.to_numeric(parti[1], errors="coerce")
+    valido = (ore < 24) & (minuti < 60)
+    return (ore * 60 + minuti).where(valido).astype("Int16")
+
+
+def tipizza(df):
+    """Assegna a ogni colonna nota il tipo definitivo, così la dashboard non deve riconvertirla."""
+    df = df.copy()
+    for colonna in df.columns:
+        if colonna in COLONNE_ORARIO:
+            df[colonna] = minuti_del_giorno(df[colonna])
+        elif colonna in COLONNE_MINUTI:
+            df[colonna] = pd.to_numeric(df[colonna], errors="coerce").round().astype("Int32")
+        elif colonna in COLONNE_CONTEGGIO:
+            df[colonna] = pd.to_numeric(df[colonna], errors="coerce").astype("Int64")
+        elif colonna in COLONNE_PERCENTUALE:
+            df[colonna] = pd.to_numeric(df[colonna], errors="coerce").astype("float64")
+        elif colonna == "citta":
+            df[colonna] = df[colonna].astype("string")
+    return df
+
+
+def percorso(nome, cartella=OUTPUT_DIR):
+    return os.path.join(cartella, f"{nome}.parquet")
+
+
+def _parti(nome, cartella=OUTPUT_DIR):
+    return sorted(glob.glob(os.path.join(percorso(nome, cartella), "part-*.parquet")))
+
+
+def scrivi(df, nome, accoda=False, cartella=OUTPUT_DIR):
+    """Scrive la tabella `nome`; con `accoda=True` aggiunge le righe come nuovo file part."""
+    destinazione = percorso(nome, cartella)
+    if not accoda and os.path.isdir(destinazione):
+        shutil.rmtree(destinazione)
+    os.makedirs(destinazione, exist_ok=True)
+
+    tabella = pa.Table.from_pandas(tipizza(df), preserve_index=False)
+    nome_parte = f"part-{time.time_ns():020d}.parquet"
+    temporaneo = os.path.join(destinazione, "." + nome_parte)
+    pq.write_table(tabella, temporaneo, compression=COMPRESSIONE)
+    # Il rename rende visibile il file solo quando è completo
+    os.replace(temporaneo, os.path.join(destinazione, nome_parte))
+
+
+def esiste(nome, cartella=OUTPUT_DIR):
+    return bool(_parti(nome, cartella))
+
+
+def _csv(nome, cartella=OUTPUT_DIR):
+    return os.path.join(cartella, f"{nome}.csv")
+
+
+def firma(nome, cartella=OUTPUT_DIR):
+    """Identifica il contenuto corrente della tabella (file con mtime e dimensione)."""
+    firme = []
+    for file in _parti(nome, cartella) + [_csv(nome, cartella)]:
+        if os.path.exists(file):
+            stat = os.stat(file)
+            firme.append((os.path.basename(file), stat.st_mtime_ns, stat.st_size))
+    return tuple(firme)
+
+
+def _csv_piu_recente(nome, parti, cartella=OUTPUT_DIR):
+    """Vero se il CSV è stato riscritto dopo l'ultima scrittura Parquet (es. dalle celle del notebook)."""
+    csv = _csv(nome, cartella)
+    if not os.path.exists(csv):
+        return False
+    return not parti or os.path.getmtime(csv) > max(os.path.getmtime(p) for p in parti)
+
+
+def leggi(nome, colonne=None, cartella=OUTPUT_DIR):
+    """Legge la tabella con memory mapping, limitandosi alle colonne richieste.
+
+    Se la versione Parquet manca o è più vecchia del CSV omonimo, legge il CSV convertendone i tipi.
+    """
+    parti = _parti(nome, cartella)
+    if _csv_piu_recente(nome, parti, cartella):
+        return tipizza(pd.read_csv(_csv(nome, cartella), usecols=colonne))
+
+    tabelle = [pq.read_table(parte, columns=colonne, memory_map=True) for parte in parti]
+    return pa.concat_tables(tabelle).to_pandas()
+
+
+def main():
+    """Converte in Parquet i CSV già presenti in output/ (migrazione una tantum)."""
+    for nome in (TEMPI, DISTRIBUZIONE, TOP_CITTA):
+        sorgente = _csv(nome)
+        if os.path.exists(sorgente):
+            scrivi(pd.read_csv(sorgente), nome)
+            print(f"Convertito: {sorgente} -> {percorso(nome)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ----------------------------
+# Strumentazione dei percorsi critici della dashboard
+# ----------------------------
+# Tre sorgenti di misure, raccolte in un registro di processo condiviso tra le sessioni:
+#   - span: durata di caricamento, trasformazione e grafico di ogni sezione
+#   - monitor_mongo: tempo e byte restituiti di ogni comando MongoDB (CommandListener di pymongo)
+#   - cache: richieste e ricalcoli delle cache dell'app, da cui la percentuale di hit
+# Le misure del rerun in corso sono tenute anche per thread (ogni sessione Streamlit
+# esegue lo script nel proprio thread): il pannello di debug mostra quelle dell'ultimo rerun.
+# Tutto è esportabile nel formato testuale di Prometheus.
+
+PREFISSO = "voice2care"
+# Limiti superiori (secondi) dei bucket degli istogrammi
+LIMITI = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Pannello di debug sempre visibile (altrimenti solo con ?debug=1 nell'URL)
+DEBUG = os.environ.get("VOICE2CARE_DEBUG") == "1"
+# Porta dell'endpoint /metrics per Prometheus (nessun server se non impostata) e indirizzo su cui ascolta:
+# solo locale se non indicato, per esporlo a un Prometheus remoto impostare ad es. 0.0.0.0
+PORTA_METRICHE = int(os.environ.get("VOICE2CARE_PORTA_METRICHE") or 0)
+HOST_METRICHE = os.environ.get("VOICE2CARE_HOST_METRICHE") or "127.0.0.1"
+# Dimensione delle risposte MongoDB, solo su richiesta: costa una serializzazione della risposta,
+# paragonabile alla sua lettura, nel thread della query (e gonfierebbe i tempi misurati)
+MISURA_BYTE = os.environ.get("VOICE2CARE_MISURA_BYTE") == "1"
+
+
+class Istogramma:
+    def __init__(self):
+        self.bucket = [0] * len(LIMITI)
+        self.conteggio = 0
+        self.somma = 0.0
+
+    def osserva(self, secondi):
+        self.conteggio += 1
+        self.somma += secondi
+        for i, limite in enumerate(LIMITI):
+            if secondi <= limite:
+                self.bucket[i] += 1
+                break
+
+
+class Registro:
+    """Misure cumulative del processo (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sezioni = {}  # (sezione, fase) -> Istogramma
+        self.rerun = {}  # pagina -> Istogramma
+        self.mongo = {}  # comando -> {"comandi", "errori", "secondi", "byte"}
+        self.cache = {}  # cache -> {"richieste", "calcoli"}
+
+    def osserva_sezione(self, sezione, fase, secondi):
+        with self._lock:
+            self.sezioni.setdefault((sezione, fase), Istogramma()).osserva(secondi)
+
+    def osserva_rerun(self, pagina, secondi):
+        with self._lock:
+            self.rerun.setdefault(pagina, Istogramma()).osserva(secondi)
+
+    def osserva_mongo(self, comando, secondi, byte, errore=False):
+        with self._lock:
+            voce = self.mongo.setdefault(comando, {"comandi": 0, "errori": 0, "secondi": 0.0, "byte": 0})
+            voce["comandi"] += 1
+            voce["errori"] += errore
+            voce["secondi"] += secondi
+            voce["byte"] += byte
+
+    def conta_cache(self, cache, calcolo=False):
+        with self._lock:
+            voce = self.cache.setdefault(cache, {"richieste": 0, "calcoli": 0})
+            voce["calcoli" if calcolo else "richieste"] += 1
+
+    def hit_cache(self):
+        """{cache: (richieste, hit, percentuale di hit)}."""
+        with self._lock:
+            voci = {nome: dict(voce) for nome, voce in self.cache.items()}
+        risultato = {}
+        for nome, voce in voci.items():
+            hit = max(voce["richieste"] - voce["calcoli"], 0)
+            risultato[nome] = (voce["richieste"], hit, hit / voce["richieste"] * 100 if voce["richieste"] else 0.0)
+        return risultato
+
+    def azzera(self):
+        with self._lock:
+            self.sezioni.clear()
+            self.rerun.clear()
+            self.mongo.clear()
+            self.cache.clear()
+
+
+REGISTRO = Registro()
+
+
+# ----------------------------
+# Rerun corrente (per thread)
+# ----------------------------
+_locale = threading.local()
+
+
+class Rerun:
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.inizio = time.perf_counter()
+        self.secondi = None
+        self.span = []  # (sezione, fase, secondi)
+        self.comandi = []  # (comando, secondi, byte, errore)
+
+
+def inizia_rerun(pagina):
+    """Apre la raccolta delle misure del rerun dello script nel thread corrente."""
+    _locale.rerun = Rerun(pagina)
+    return _locale.rerun
+
+
+def termina_rerun():
+    rerun = getattr(_locale, "rerun", None)
+    if rerun is not None and rerun.secondi is None:
+        rerun.secondi = time.perf_counter() - rerun.inizio
+        REGISTRO.osserva_rerun(rerun.pagina, rerun.secondi)
+    return rerun
+
+
+def rerun_corrente():
+    return getattr(_locale, "rerun", None)
+
+
+@contextmanager
+def rerun_frammento(pagina):
+    """Rerun di un frammento: se lo script principale non è in esecuzione, il frammento è il rerun."""
+    rerun = rerun_corrente()
+    if rerun is not None and rerun.secondi is None:
+        yield rerun
+        return
+    rerun = inizia_rerun(pagina)
+    try:
+        yield rerun
+    finally:
+        termina_rerun()
+
+
+@contextmanager
+def span(sezione, fase):
+    """Misura il blocco come fase ("caricamento", "trasformazione", "grafico", ...) di una sezione."""
+    inizio = time.perf_counter()
+    try:
+        yield
+    finally:
+        secondi = time.perf_counter() - inizio
+        REGISTRO.osserva_sezione(sezione, fase, secondi)
+        rerun = rerun_corrente()
+        if rerun is not None:
+            rerun.span.append((sezione, fase, secondi))
+
+
+def conta_richiesta(cache):
+    REGISTRO.conta_cache(cache)
+
+
+def conta_calcolo(cache):
+    """Da chiamare nel corpo della funzione in cache: viene eseguito solo quando il risultato manca."""
+    REGISTRO.conta_cache(cache, calcolo=True)
+
+
+# ----------------------------
+# Comandi MongoDB
+# ----------------------------
+def monitor_mongo(registro=REGISTRO, misura_byte=MISURA_BYTE):
+    """Listener con tempo (e, con `misura_byte`, byte restituiti) di ogni comando; per MongoClient(event_listeners=[...]).
+
+    pymongo viene importato qui, alla creazione del client, e non all'avvio dell'app.
+    """
+    import bson
+    from pymongo import monitoring
+
+    class MonitorMongo(monitoring.CommandListener):
+        def _registra(self, comando, secondi, byte, errore):
+            registro.osserva_mongo(comando, secondi, byte, errore)
+            # Gli eventi arrivano nel thread che esegue l'operazione, cioè quello del rerun
+            rerun = rerun_corrente()
+            if rerun is not None:
+                rerun.comandi.append((comando, secondi, byte, errore))
+
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            byte = len(bson.encode(event.reply)) if misura_byte else 0
+            self._registra(event.command_name, event.duration_micros / 1e6, byte, False)
+
+        def failed(self, event):
+            self._registra(event.command_name, event.duration_micros / 1e6, 0, True)
+
+    return MonitorMongo()
+
+
+# ----------------------------
+# Esportazione Prometheus
+# ----------------------------
+def _etichette(**etichette):
+    def escape(valore):
+        return str(valore).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{nome}="{escape(valore)}"' for nome, valore in etichette.items()) + "}"
+
+
+def _istogramma(righe, nome, descrizione, serie):
+    righe.append(f"# HELP {nome} {descrizione}")
+    righe.append(f"# TYPE {nome} histogram")
+    for etichette, istogramma in serie:
+        cumulato = 0
+        for limite, conteggio in zip(LIMITI, istogramma.bucket):
+            cumulato += conteggio
+            righe.append(f"{nome}_bucket{_etichette(**etichette, le=f'{limite:g}')} {cumulato}")
+        righe.append(f"{nome}_bucket{_etichette(**etichette, le='+Inf')} {istogramma.conteggio}")
+        righe.append(f"{nome}_sum{_etichette(**etichette)} {istogramma.somma:.6f}")
+        righe.append(f"{nome}_count{_etichette(**etichette)} {istogramma.conteggio}")
+
+
+def _contatore(righe, nome, descrizione, serie):
+    righe.append(f"# HELP {nome} {descrizione}")
+    righe.append(f"# TYPE {nome} counter")
+    for etichette, valore in serie:
+        righe.append(f"{nome}{_etichette(**etichette)} {valore if isinstance(valore, int) else f'{valore:.6f}'}")
+
+
+def esporta_prometheus(registro=REGISTRO, misura_byte=MISURA_BYTE):
+    """Misure del registro nel formato testuale di Prometheus (versione 0.0.4)."""
+    with registro._lock:
+        sezioni = sorted(registro.sezioni.items())
+        rerun = sorted(registro.rerun.items())
+        mongo = sorted((comando, dict(voce)) for comando, voce in registro.mongo.items())
+        cache = sorted((nome, dict(voce)) for nome, voce in registro.cache.items())
+
+    righe = []
+    _istogramma(righe, f"{PREFISSO}_rerun_secondi", "Durata dei rerun dello script Streamlit",
+                [({"pagina": pagina}, istogramma) for pagina, istogramma in rerun])
+    _istogramma(righe, f"{PREFISSO}_sezione_secondi", "Durata delle fasi delle sezioni della dashboard",
+                [({"sezione": sezione, "fase": fase}, istogramma) for (sezione, fase), istogramma in sezioni])
+    contatori_mongo = [
+        ("comandi", "Comandi MongoDB eseguiti"),
+        ("errori", "Comandi MongoDB falliti"),
+        ("secondi", "Tempo dei comandi MongoDB in secondi"),
+    ]
+    if misura_byte:
+        contatori_mongo.append(("byte", "Byte restituiti dai comandi MongoDB"))
+    for chiave, descrizione in contatori_mongo:
+        _contatore(righe, f"{PREFISSO}_mongo_{chiave}_total", descrizione,
+                   [({"comando": comando}, voce[chiave]) for comando, voce in mongo])
+    _contatore(righe, f"{PREFISSO}_cache_richieste_total", "Richieste alle cache dell'app",
+               [({"cache": nome}, voce["richieste"]) for nome, voce in cache])
+    _contatore(righe, f"{PREFISSO}_cache_calcoli_total", "Richieste non servite dalla cache (ricalcoli)",
+               [({"cache": nome}, voce["calcoli"]) for nome, voce in cache])
+    return "\n".join(righe) + "\n"
+
+
+class _GestoreMetriche(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        corpo = esporta_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def avvia_server_metriche(porta=PORTA_METRICHE, host=HOST_METRICHE):
+    """Serve /metrics in un thread daemon; da chiamare una volta per processo."""
+    server = ThreadingHTTPServer((host, porta), _GestoreMetriche)
+    threading.Thread(target=server.serve_forever, name="metriche-prometheus", daemon=True).start()
+    return server
@@ -0,0 +1,16 @@
+import re
+import unicodedata
+
+# ----------------------------
+# Normalizzazione dei nomi (città, pazienti, ...)
+# ----------------------------
+_SEPARATORI = re.compile(r"[\s'’`\-_.,/]+")
+
+
+def normalizza(testo):
+    """Riduce un nome alla forma canonica: senza accenti, minuscolo, spazi singoli."""
+    if not isinstance(testo, str):
+        return ""
+    decomposto = unicodedata.normalize("NFKD", testo)
+    senza_accenti = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return _SEPARATORI.sub(" ", senza_accenti.casefold()).strip()
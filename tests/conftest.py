@@ -0,0 +1,7 @@
+import os
+import sys
+
+# I moduli del progetto sono nella radice del repository
+RADICE = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, RADICE)
+os.chdir(RADICE)
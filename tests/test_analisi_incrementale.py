@@ -0,0 +1,58 @@
+import json
+import os
+
+import mongomock
+import pytest
+
+import analisi
+import db
+import ingestione
+
+
+def scrivi_intervento(cartella, nome, numero, citta, chiamata, arrivo):
+    with open(os.path.join(cartella, nome), "w", encoding="utf-8") as f:
+        json.dump({
+            "numero_intervento": numero,
+            "citta": citta,
+            "ora_chiamata": chiamata,
+            "ora_arrivo_sul_posto": arrivo,
+            "ora_partenza_ambulanza": chiamata,
+            "ora_arrivo_ps": arrivo,
+        }, f)
+
+
+def totali(conteggi):
+    return dict(zip(conteggi["citta"], conteggi["totale_interventi"]))
+
+
+@pytest.fixture
+def ambiente(tmp_path, monkeypatch):
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(db, "crea_client", lambda *args, **kwargs: client)
+    monkeypatch.setattr(analisi, "MARGINE_SECONDI", 0)
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("output")
+    os.makedirs("cartella")
+    return client
+
+
+def test_file_modificato_non_viene_contato_due_volte(ambiente):
+    scrivi_intervento("cartella", "a.json", "1", "Roma", "10:00", "10:05")
+    scrivi_intervento("cartella", "b.json", "2", "Milano", "11:00", "11:30")
+    ingestione.ingerisci("cartella", percorso_manifest="manifest.json", processi=1)
+    assert totali(analisi.esegui(motore="locale")) == {"Milano": 1, "Roma": 1}
+
+    # Stesso file, città corretta: la versione precedente viene rimossa dalla collezione
+    scrivi_intervento("cartella", "a.json", "1", "Napoli", "10:00", "10:05")
+    os.utime("cartella/a.json", (1, 1))
+    riepilogo = ingestione.ingerisci("cartella", percorso_manifest="manifest.json", processi=1)
+    assert riepilogo["rimossi"] == 1
+
+    conteggi = analisi.esegui(motore="locale")
+    assert totali(conteggi) == {"Milano": 1, "Napoli": 1}
+    assert ambiente[db.DB_NAME][db.COLLECTION_NAME].count_documents({}) == 2
+
+    # Senza nuove rimozioni il job resta incrementale
+    scrivi_intervento("cartella", "c.json", "3", "Milano", "12:00", "12:40")
+    ingestione.ingerisci("cartella", percorso_manifest="manifest.json", processi=1)
+    assert totali(analisi.esegui(motore="locale")) == {"Milano": 2, "Napoli": 1}
@@ -0,0 +1,41 @@
+import io
+
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+import app_data
+import archivio_pdf
+import db
+
+PDF = b"%PDF-1.5\n" + bytes(range(256)) * 1000
+
+
+class FileGridFS(io.IOBase):
+    """Come gridfs.GridOut: file-like derivato da io.IOBase, letto a chunk."""
+
+    def __init__(self, contenuto):
+        self._flusso = io.BytesIO(contenuto)
+
+    def read(self, dimensione=-1):
+        return self._flusso.read(dimensione)
+
+
+@pytest.fixture
+def archivio(monkeypatch):
+    pdf = {"42": PDF}
+    monkeypatch.setattr(app_data, "get_client", lambda: {db.DB_NAME: None})
+    monkeypatch.setattr(
+        archivio_pdf, "apri_pdf", lambda database, numero: FileGridFS(pdf[numero]) if numero in pdf else None
+    )
+
+
+def converti(dati):
+    # Stessa conversione applicata da Streamlit al risultato del callable di st.download_button
+    return convert_data_to_bytes_and_infer_mime(dati, unsupported_error=TypeError(type(dati)))[0]
+
+
+def test_pdf_scaricabile_da_download_button(archivio):
+    with pytest.raises(TypeError):
+        converti(FileGridFS(PDF))
+    assert converti(app_data.contenuto_pdf("42")) == PDF
+    assert converti(app_data.contenuto_pdf("43")) == b""
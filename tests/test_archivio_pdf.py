@@ -0,0 +1,62 @@
+import json
+import stat
+import sys
+
+import gridfs
+import mongomock
+import pytest
+
+import archivio_pdf
+import compila_pdf
+import db
+from cartella_latex import genera_latex
+
+PDFLATEX_FINTO = f"""#!{sys.executable}
+import shutil
+shutil.copy("documento.tex", "documento.pdf")
+"""
+
+
+class BucketFinto:
+    """Solo la scrittura dei metadati in <bucket>.files: mongomock non supporta GridFSBucket."""
+
+    def __init__(self, database):
+        self.files = database[f"{db.PDF_BUCKET}.files"]
+
+    def upload_from_stream_with_id(self, file_id, filename, flusso, metadata=None):
+        if self.files.find_one({"_id": file_id}):
+            raise gridfs.errors.FileExists(file_id)
+        self.files.insert_one({"_id": file_id, "filename": filename, "length": len(flusso.read()), "metadata": metadata})
+
+
+@pytest.fixture
+def ambiente(tmp_path, monkeypatch):
+    eseguibile = tmp_path / "pdflatex"
+    eseguibile.write_text(PDFLATEX_FINTO)
+    eseguibile.chmod(eseguibile.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(compila_pdf, "pdflatex", lambda: str(eseguibile))
+    monkeypatch.setattr(archivio_pdf, "bucket", BucketFinto)
+    return mongomock.MongoClient()[db.DB_NAME]
+
+
+def test_pdf_collegato_al_numero_intervento(ambiente, tmp_path):
+    with open("cartella_clinica/json_1.json", "r", encoding="utf-8") as f:
+        dati = json.load(f)
+    # Il JSON è nel database con il suo nome, il PDF ha il nome scelto dal notebook
+    ambiente[db.COLLECTION_NAME].insert_one({**dati, "file_origine": "json_1.json"})
+    cartella_pdf = str(tmp_path / "pdf")
+
+    report = compila_pdf.compila(
+        {"cartella_clinica_1": genera_latex(dati)}, cartella_pdf, str(tmp_path / "latex"), processi=1, formato=False,
+        interventi={"cartella_clinica_1": dati["numero_intervento"]},
+    )
+    assert [r["esito"] for r in report] == ["compilato"]
+
+    conteggi = archivio_pdf.carica_cartella(ambiente, cartella_pdf)
+    assert conteggi == {"caricati": 1, "duplicati": 0, "senza_intervento": 0}
+    assert archivio_pdf.interventi_con_pdf(ambiente, [dati["numero_intervento"], "altro"]) == {dati["numero_intervento"]}
+
+
+def test_pdf_con_il_nome_del_json(ambiente):
+    ambiente[db.COLLECTION_NAME].insert_one({"numero_intervento": "PR1", "file_origine": "json_1.json"})
+    assert archivio_pdf.numeri_per_file(ambiente, ["json_1", "cartella_clinica_1"]) == {"json_1": "PR1"}
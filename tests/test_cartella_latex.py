@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from cartella_latex import escape, genera_latex
+
+
+@pytest.mark.parametrize("valore, atteso", [
+    ("<60 bpm", r"\textless{}60 bpm"),
+    (">200 mg/dl", r"\textgreater{}200 mg/dl"),
+    ("SpO2 ≤ 90%", r"SpO2 $\leq$ 90\%"),
+    ("PA ≥ 180", r"PA $\geq$ 180"),
+    ("37,5 °C – stabile", "37,5 °C – stabile"),
+    ("ﬁbrillazione", "fibrillazione"),
+    ("dolore 😣", "dolore ?"),
+])
+def test_escape(valore, atteso):
+    assert escape(valore) == atteso
+
+
+@pytest.mark.parametrize("file", ["json_1.json", "json_4.json"])
+def test_parametri_vitali_con_confronti(file):
+    with open(f"cartella_clinica/{file}", "r", encoding="utf-8") as f:
+        latex = genera_latex(json.load(f))
+    corpo = latex[latex.index("\\begin{document}"):]
+    assert r"\textless{}" in corpo
+    assert "<" not in corpo and ">" not in corpo
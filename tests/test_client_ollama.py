@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+from client_ollama import ClientOllama, ErroreTimeout
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from stub_ollama import StubOllama  # noqa: E402
+
+CARTELLA = {"numero_intervento": "PR1", "sintomi": ["dolore toracico"]}
+
+
+@pytest.fixture
+def stub():
+    server = None
+
+    def avvia(**opzioni):
+        nonlocal server
+        server = StubOllama(CARTELLA, **opzioni).avvia()
+        return server
+
+    yield avvia
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+
+
+def test_valutazione_lunga_del_prompt(stub):
+    # Il primo token arriva dopo più del timeout tra due token, ma entro quello del primo token
+    server = stub(ms_prefill=600, ms_token=1)
+    with ClientOllama(server.url, timeout=(5, 5, 0.3)) as client:
+        assert client.genera_json("prompt", "modello") == CARTELLA
+
+
+def test_timeout_non_ritentato(stub):
+    server = stub(ms_prefill=600, ms_token=1)
+    with ClientOllama(server.url, timeout=(5, 0.2, 0.2), attesa_base=0.01) as client:
+        with pytest.raises(ErroreTimeout):
+            client.genera_json("prompt", "modello")
+    assert server.richieste == 1
+
+
+def test_generazione_ferma(stub):
+    server = stub(ms_prefill=1, ms_token=600)
+    with ClientOllama(server.url, timeout=(5, 5, 0.2), attesa_base=0.01) as client:
+        with pytest.raises(ErroreTimeout):
+            client.genera_json("prompt", "modello")
+    assert server.richieste == 1
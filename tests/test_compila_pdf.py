@@ -0,0 +1,52 @@
+import os
+import stat
+import sys
+
+import pytest
+
+import compila_pdf
+
+# pdflatex finto: rifiuta ogni formato precompilato, come dopo un aggiornamento di TeX
+PDFLATEX_FINTO = f"""#!{sys.executable}
+import sys
+if "--version" in sys.argv:
+    print("pdfTeX 3.141592653-2.6-1.40.26 (finto)")
+elif any(a.startswith("-fmt=") for a in sys.argv):
+    print("---! documento.fmt made by different executable version")
+    sys.exit(1)
+else:
+    open("documento.pdf", "wb").write(b"%PDF-1.5")
+"""
+
+
+@pytest.fixture(autouse=True)
+def versione_non_in_cache():
+    compila_pdf.versione_pdflatex.cache_clear()
+    yield
+    compila_pdf.versione_pdflatex.cache_clear()
+
+
+def installa_pdflatex(tmp_path, monkeypatch, testo=PDFLATEX_FINTO):
+    eseguibile = tmp_path / "pdflatex"
+    eseguibile.write_text(testo)
+    eseguibile.chmod(eseguibile.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(compila_pdf, "pdflatex", lambda: str(eseguibile))
+    compila_pdf.versione_pdflatex.cache_clear()
+
+
+def test_formato_non_valido_compilazione_completa(tmp_path, monkeypatch):
+    installa_pdflatex(tmp_path, monkeypatch)
+    formato = tmp_path / "cartella_vecchio.fmt"
+    formato.write_bytes(b"formato di un altro pdflatex")
+    sorgente = "\\documentclass{article}\n\\begin{document}\nciao\n\\end{document}\n"
+
+    risultato = compila_pdf.compila_documento("doc", sorgente, str(tmp_path), str(formato))
+    assert risultato["esito"] == "compilato"
+    assert os.path.exists(tmp_path / "doc.pdf")
+
+
+def test_formato_dipende_dalla_versione_di_pdflatex(tmp_path, monkeypatch):
+    installa_pdflatex(tmp_path, monkeypatch)
+    prima = compila_pdf.percorso_formato("\\documentclass{article}\n")
+    installa_pdflatex(tmp_path, monkeypatch, PDFLATEX_FINTO.replace("1.40.26", "1.40.27"))
+    assert compila_pdf.percorso_formato("\\documentclass{article}\n") != prima
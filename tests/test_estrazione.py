@@ -0,0 +1,31 @@
+import cache_llm
+import estrazione
+import preestrazione
+
+
+class ClientFinto:
+    def __init__(self):
+        self.prompt = []
+
+    def genera_json(self, prompt, modello):
+        self.prompt.append(prompt)
+        return {"sintomi": ["dolore toracico"]}
+
+
+def test_chiave_di_cache_dipende_dai_campi_preestratti(tmp_path, monkeypatch):
+    cache = cache_llm.CacheLLM(str(tmp_path / "cache.sqlite"))
+    client = ClientFinto()
+    testo = "Chiamata alle 10:15, paziente con dolore toracico."
+
+    monkeypatch.setattr(preestrazione, "preestrai", lambda t: {})
+    estrazione.estrai_cartella(testo, client=client, cache=cache)
+    estrazione.estrai_cartella(testo, client=client, cache=cache)
+    assert len(client.prompt) == 1
+
+    # Stessa trascrizione e stessa versione delle regole, ma un campo in più trovato: prompt diverso
+    monkeypatch.setattr(preestrazione, "preestrai", lambda t: {"ora_chiamata": "10:15"})
+    dati = estrazione.estrai_cartella(testo, client=client, cache=cache)
+    assert len(client.prompt) == 2
+    assert '"ora_chiamata"' not in client.prompt[1]
+    assert dati["ora_chiamata"] == "10:15"
+    cache.chiudi()
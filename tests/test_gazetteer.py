@@ -0,0 +1,34 @@
+import pandas as pd
+
+from gazetteer import Gazetteer
+
+
+def crea(tmp_path, righe):
+    comuni = tmp_path / "comuni.csv"
+    pd.DataFrame(righe, columns=["comune", "provincia", "regione", "lat", "lon"]).to_csv(comuni, index=False)
+    return Gazetteer(str(comuni), str(tmp_path / "geocache.csv"))
+
+
+def test_tabella_completa_dei_comuni():
+    gazetteer = Gazetteer(percorso_cache="/nonesiste.csv")
+    assert len(gazetteer) > 7900
+    assert gazetteer.coordinate("Castelnuovo di Porto") != (None, None)
+    # Comuni bilingui con entrambi i nomi, e "None" (TO) non è un valore mancante
+    assert "Bozen" in gazetteer and "Bolzano" in gazetteer
+    assert gazetteer.coordinate("None") != (None, None)
+
+
+def test_completa_una_voce_per_chiave(tmp_path):
+    gazetteer = crea(tmp_path, [("Roma", "RM", "Lazio", 41.9, 12.5)])
+    chiamate = []
+
+    def geocode(nome):
+        chiamate.append(nome)
+        return 44.2, 12.0
+
+    aggiunte = gazetteer.completa(["Forli", "FORLÌ", "forlì", "Roma"], geocode)
+
+    assert aggiunte == 1 and chiamate == ["Forli"]
+    assert gazetteer._indice.index.is_unique
+    assert len(pd.read_csv(tmp_path / "geocache.csv")) == 1
+    assert gazetteer.coordinate("Forlì") == (44.2, 12.0)
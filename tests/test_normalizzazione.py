@@ -0,0 +1,42 @@
+import pytest
+
+from normalizzazione import numero, parametri_numerici
+
+
+@pytest.mark.parametrize("valore, atteso", [
+    ("60 bpm", 60.0),
+    ("36,8 °C", 36.8),
+    ("97%", 97.0),
+    (88, 88.0),
+    ("<60", None),
+    ("> 200 mg/dl", None),
+    ("≥ 40", None),
+    ("oltre 40", None),
+    ("sotto i 60 bpm", None),
+    ("inferiore a 60", None),
+    ("non rilevabile", None),
+])
+def test_numero(valore, atteso):
+    assert numero(valore) == atteso
+
+
+def test_valori_fuori_scala_non_diventano_misure():
+    numerici = parametri_numerici({
+        "frequenza_cardiaca": "<60",
+        "glicemia": ">200",
+        "saturazione_ossigeno": "95%",
+        "pressione_arteriosa": ">180/100",
+        "tempo_rilevazione": "10:30",
+    })
+    assert numerici["frequenza_cardiaca"] is None
+    assert numerici["glicemia"] is None
+    assert numerici["saturazione_ossigeno"] == 95.0
+    assert numerici["pressione_sistolica"] is None and numerici["pressione_diastolica"] is None
+    assert numerici["tempo_rilevazione"] == 630
+
+
+def test_pressione():
+    numerici = parametri_numerici({"pressione_arteriosa": "130/85 mmHg"})
+    assert (numerici["pressione_sistolica"], numerici["pressione_diastolica"]) == (130.0, 85.0)
+    numerici = parametri_numerici({"pressione_arteriosa": "90/<50"})
+    assert (numerici["pressione_sistolica"], numerici["pressione_diastolica"]) == (None, None)
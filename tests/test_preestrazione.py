@@ -0,0 +1,19 @@
+import pytest
+
+from preestrazione import parametri_vitali
+
+
+@pytest.mark.parametrize("testo", [
+    "Polso debole sotto i 60 bpm.",
+    "Frequenza cardiaca inferiore a 60 battiti.",
+    "Paziente con FC < 60, fc meno di 60.",
+])
+def test_soglie_non_diventano_misure(testo):
+    assert "frequenza_cardiaca" not in (parametri_vitali(testo).get("parametri_vitali") or [{}])[0]
+
+
+def test_misure_riconosciute():
+    testo = "Frequenza cardiaca 110 bpm, saturazione 92%, pressione 140 su 90. Glicemia oltre 300."
+    assert parametri_vitali(testo) == {"parametri_vitali": [
+        {"frequenza_cardiaca": "110 bpm", "saturazione_ossigeno": "92%", "pressione_arteriosa": "140/90"},
+    ]}
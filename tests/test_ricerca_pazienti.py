@@ -0,0 +1,19 @@
+from ricerca_pazienti import IndicePazienti
+
+
+def test_sottostringa_anche_con_corrispondenze_per_prefisso():
+    indice = IndicePazienti(["Rossi Mario", "Ossimo Anna", "Bianchi Luca"])
+    assert indice.cerca("ossi") == ["Ossimo Anna", "Rossi Mario"]
+
+
+def test_prefissi_di_parola_in_qualunque_ordine():
+    indice = IndicePazienti(["Rossi Mario", "De Luca Maria", "Mariotti Carlo"])
+    assert indice.cerca("mario rossi") == ["Rossi Mario"]
+    assert indice.cerca("MARI") == ["De Luca Maria", "Mariotti Carlo", "Rossi Mario"]
+    assert indice.cerca("xyz") == []
+
+
+def test_limite():
+    indice = IndicePazienti([f"Rossi {i:03d}" for i in range(100)] + ["Grossi Anna"])
+    assert len(indice.cerca("rossi", limite=10)) == 10
+    assert indice.cerca("rossi")[:2] == ["Rossi 000", "Rossi 001"]
@@ -0,0 +1,38 @@
+import urllib.request
+from types import SimpleNamespace
+
+import bson
+
+import strumentazione
+
+
+def risposta(comando):
+    return SimpleNamespace(command_name=comando, duration_micros=1500, reply={"ok": 1, "cursor": {"firstBatch": [{"a": 1}]}})
+
+
+def test_byte_misurati_solo_su_richiesta(monkeypatch):
+    codificate = []
+    monkeypatch.setattr(bson, "encode", lambda documento: codificate.append(documento) or b"12345")
+
+    registro = strumentazione.Registro()
+    strumentazione.monitor_mongo(registro).succeeded(risposta("find"))
+    assert codificate == []
+    assert registro.mongo["find"]["comandi"] == 1
+    assert "voice2care_mongo_byte_total" not in strumentazione.esporta_prometheus(registro)
+
+    registro = strumentazione.Registro()
+    strumentazione.monitor_mongo(registro, misura_byte=True).succeeded(risposta("find"))
+    assert registro.mongo["find"]["byte"] == 5
+    assert 'voice2care_mongo_byte_total{comando="find"} 5' in strumentazione.esporta_prometheus(registro, misura_byte=True)
+
+
+def test_endpoint_metriche_solo_locale():
+    server = strumentazione.avvia_server_metriche(0)
+    try:
+        host, porta = server.server_address
+        assert host == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{porta}/metrics", timeout=5) as r:
+            assert r.status == 200
+    finally:
+        server.shutdown()
+        server.server_close()
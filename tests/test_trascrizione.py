@@ -0,0 +1,39 @@
+import numpy as np
+
+from trascrizione import FREQUENZA, BufferCircolare, Segmentatore
+
+
+def segmenta(audio, blocco=4000):
+    buffer = BufferCircolare(FREQUENZA * 30)
+    segmentatore = Segmentatore()
+    chunk = []
+    for i in range(0, len(audio), blocco):
+        buffer.scrivi(audio[i:i + blocco])
+        chunk += segmentatore.analizza(buffer)
+    return chunk + segmentatore.chiudi(buffer)
+
+
+def silenzio(secondi):
+    return np.zeros(int(secondi * FREQUENZA), dtype=np.float32)
+
+
+def voce(secondi):
+    t = np.arange(int(secondi * FREQUENZA)) / FREQUENZA
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def test_colpo_isolato_non_viene_trascritto():
+    audio = np.concatenate([silenzio(1), voce(0.025), silenzio(1.5)])
+    assert segmenta(audio) == []
+
+
+def test_frase_diventa_un_chunk_con_i_margini():
+    audio = np.concatenate([silenzio(1), voce(1), silenzio(1.5)])
+    [(inizio, fine, continua)] = segmenta(audio)
+    assert inizio == int(0.8 * FREQUENZA) and fine == int(2.2 * FREQUENZA)
+    assert not continua
+
+
+def test_voce_breve_a_fine_stream():
+    assert segmenta(np.concatenate([silenzio(1), voce(0.1)])) == []
+    assert len(segmenta(np.concatenate([silenzio(1), voce(0.5)]))) == 1
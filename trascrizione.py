@@ -0,0 +1,420 @@
+import argparse
+import queue
+import threading
+import time
+import wave
+
+import numpy as np
+
+from testo import normalizza
+
+# ----------------------------
+# Configurazione
+# ----------------------------
+FREQUENZA = 16000  # Whisper usa 16kHz
+BLOCCO = 4000  # circa 0.25 secondi, come la InputStream del notebook
+LINGUA = "it"
+
+# Rilevamento della voce (VAD a energia)
+FINESTRA_VAD = 400  # 25 ms
+SOGLIA_RMS = 0.01  # soglia minima di energia per considerare un frame voce
+FATTORE_RUMORE = 3.0  # la soglia sale a questo multiplo del rumore di fondo stimato
+
+# Suddivisione in chunk (secondi)
+SILENZIO_FINE = 0.6  # silenzio che chiude una frase
+MARGINE = 0.2  # audio tenuto prima e dopo la voce per non tagliare le parole
+DURATA_MIN = 0.4  # voce più corta (colpi, rumori) non viene trascritta; margini esclusi
+DURATA_MAX = 10.0  # oltre, il chunk viene spezzato anche senza pause
+SOVRAPPOSIZIONE = 1.0  # audio ripetuto all'inizio del chunk successivo a uno spezzato
+
+CODA_AUDIO = 64  # blocchi in attesa dal microfono (~16 s)
+CODA_CHUNK = 4  # chunk in attesa di trascrizione: oltre, la segmentazione si ferma
+
+
+# ----------------------------
+# Buffer circolare preallocato
+# ----------------------------
+class BufferCircolare:
+    """Ultimi `capacita` campioni audio, indirizzati per posizione assoluta nello stream."""
+
+    def __init__(self, capacita):
+        self.capacita = capacita
+        self.scritti = 0
+        self._dati = np.zeros(capacita, dtype=np.float32)
+
+    def scrivi(self, campioni):
+        n = len(campioni)
+        if n >= self.capacita:
+            self._dati[:] = campioni[-self.capacita:]
+            # Riallinea in modo che la posizione assoluta `scritti` corrisponda all'indice 0
+            self._dati = np.roll(self._dati, (self.scritti + n) % self.capacita)
+        else:
+            inizio = self.scritti % self.capacita
+            prima = min(n, self.capacita - inizio)
+            self._dati[inizio:inizio + prima] = campioni[:prima]
+            self._dati[:n - prima] = campioni[prima:]
+        self.scritti += n
+
+    def leggi(self, inizio, fine):
+        """Copia dei campioni nelle posizioni assolute [inizio, fine)."""
+        if inizio < self.scritti - self.capacita or fine > self.scritti or inizio > fine:
+            raise ValueError(f"Intervallo [{inizio}, {fine}) non disponibile nel buffer")
+        n = fine - inizio
+        a = inizio % self.capacita
+        if a + n <= self.capacita:
+            return self._dati[a:a + n].copy()
+        return np.concatenate((self._dati[a:], self._dati[:n - (self.capacita - a)]))
+
+
+# ----------------------------
+# Rilevamento della voce e suddivisione in chunk
+# ----------------------------
+class RilevatoreVoce:
+    """VAD a energia: un frame è voce se il suo RMS supera la soglia, adattata al rumore di fondo."""
+
+    def __init__(self, soglia=SOGLIA_RMS, fattore_rumore=FATTORE_RUMORE):
+        self.soglia = soglia
+        self.fattore_rumore = fattore_rumore
+        self.rumore = 0.0
+
+    def voce(self, frame):
+        rms = float(np.sqrt(np.mean(np.square(frame, dtype=np.float64))))
+        parlato = rms > max(self.soglia, self.rumore * self.fattore_rumore)
+        if not parlato:
+            # Media mobile del rumore aggiornata solo sui frame di silenzio
+            self.rumore = 0.95 * self.rumore + 0.05 * rms
+        return parlato
+
+
+class Segmentatore:
+    """Decide quando un tratto di voce è completo e va trascritto.
+
+    Lavora sulle posizioni assolute del buffer circolare: restituisce gli
+    intervalli (inizio, fine, continua) da trascrivere, dove `continua` indica
+    che il chunk ripete la coda del precedente perché quello è stato spezzato.
+    """
+
+    def __init__(self, frequenza=FREQUENZA, rilevatore=None, finestra=FINESTRA_VAD):
+        self.frequenza = frequenza
+        self.finestra = finestra
+        self.rilevatore = rilevatore or RilevatoreVoce()
+        self.posizione = 0  # primo campione non ancora analizzato
+        self.inizio_voce = None
+        self.prima_voce = 0  # primo frame di voce del chunk aperto, senza margine
+        self.ultima_voce = 0
+        self.fine_ultimo = 0
+        self.continua = False
+
+    def _campioni(self, secondi):
+        return int(secondi * self.frequenza)
+
+    def analizza(self, buffer):
+        """Analizza i frame completi arrivati nel buffer e restituisce i chunk chiusi."""
+        chunk = []
+        while self.posizione + self.finestra <= buffer.scritti:
+            inizio, fine = self.posizione, self.posizione + self.finestra
+            self.posizione = fine
+
+            if self.rilevatore.voce(buffer.leggi(inizio, fine)):
+                if self.inizio_voce is None:
+                    self.inizio_voce = max(inizio - self._campioni(MARGINE), self.fine_ultimo, buffer.scritti - buffer.capacita)
+                    self.prima_voce = inizio
+                    self.continua = False
+                self.ultima_voce = fine
+            if self.inizio_voce is None:
+                continue
+
+            if fine - self.ultima_voce >= self._campioni(SILENZIO_FINE):
+                chiuso = (self.inizio_voce, min(self.ultima_voce + self._campioni(MARGINE), fine), self.continua)
+                self.inizio_voce = None
+                # Conta solo la voce: con i due margini anche un colpo di 25 ms supererebbe DURATA_MIN
+                if self.ultima_voce - self.prima_voce >= self._campioni(DURATA_MIN):
+                    chunk.append(chiuso)
+                    self.fine_ultimo = chiuso[1]
+            elif fine - self.inizio_voce >= self._campioni(DURATA_MAX):
+                chunk.append((self.inizio_voce, fine, self.continua))
+                self.fine_ultimo = fine
+                self.inizio_voce = fine - self._campioni(SOVRAPPOSIZIONE)
+                self.prima_voce = self.inizio_voce
+                self.continua = True
+        return chunk
+
+    def chiudi(self, buffer):
+        """Chunk ancora aperto a fine stream (voce senza la pausa finale)."""
+        if self.inizio_voce is None:
+            return []
+        chiuso = (self.inizio_voce, buffer.scritti, self.continua)
+        self.inizio_voce = None
+        return [chiuso] if self.ultima_voce - self.prima_voce >= self._campioni(DURATA_MIN) else []
+
+
+# ----------------------------
+# Unione dei testi dei chunk
+# ----------------------------
+def rimuovi_sovrapposizione(parole_precedenti, testo, max_parole=12):
+    """Toglie dall'inizio di `testo` le parole che ripetono la fine della trascrizione precedente."""
+    parole = testo.split()
+    coda = [normalizza(p) for p in parole_precedenti[-max_parole:]]
+    testa = [normalizza(p) for p in parole[:max_parole]]
+    for k in range(min(len(coda), len(testa)), 0, -1):
+        if coda[-k:] == testa[:k]:
+            return " ".join(parole[k:])
+    return testo
+
+
+class Trascrizione:
+    """Testo complessivo costruito unendo i segmenti dei chunk nell'ordine di arrivo."""
+
+    def __init__(self):
+        self.parole = []
+        self.fine = 0.0  # istante (s dall'inizio dello stream) dell'ultimo segmento accettato
+
+    def aggiungi(self, segmenti, inizio_chunk, continua):
+        """Aggiunge i segmenti di un chunk (tempi relativi al chunk) e restituisce il testo nuovo."""
+        testi = []
+        for segmento in segmenti:
+            fine = inizio_chunk + segmento["end"]
+            # Nei chunk sovrapposti i segmenti già coperti dal chunk precedente vengono scartati
+            if continua and fine <= self.fine:
+                continue
+            testi.append(segmento["text"].strip())
+            self.fine = max(self.fine, fine)
+
+        nuovo = " ".join(t for t in testi if t)
+        if continua:
+            nuovo = rimuovi_sovrapposizione(self.parole, nuovo)
+        self.parole.extend(nuovo.split())
+        return nuovo
+
+    @property
+    def testo(self):
+        return " ".join(self.parole)
+
+
+# ----------------------------
+# Pipeline: segmentazione nel thread chiamante, inferenza in un worker
+# ----------------------------
+class PipelineTrascrizione:
+    """Trascrizione in streaming di blocchi audio float32 mono a `frequenza` Hz.
+
+    `trascrivi(audio)` restituisce i segmenti nel formato di Whisper
+    (dizionari con "start", "end", "text"). La coda dei chunk è limitata:
+    se l'inferenza è più lenta del parlato, `elabora` si blocca finché il
+    worker non libera un posto, invece di accumulare audio senza limite.
+    """
+
+    def __init__(self, trascrivi, frequenza=FREQUENZA, al_testo=None, dimensione_coda=CODA_CHUNK):
+        self.trascrivi = trascrivi
+        self.frequenza = frequenza
+        self.al_testo = al_testo
+        capacita = int((DURATA_MAX + SOVRAPPOSIZIONE + 2 * MARGINE + SILENZIO_FINE) * frequenza) + BLOCCO
+        self.buffer = BufferCircolare(capacita)
+        self.segmentatore = Segmentatore(frequenza)
+        self.trascrizione = Trascrizione()
+        self.metriche = []
+        self._coda = queue.Queue(maxsize=dimensione_coda)
+        self._worker = threading.Thread(target=self._lavora, name="trascrizione", daemon=True)
+        self._worker.start()
+
+    def elabora(self, blocco, arrivato_il=None):
+        """Aggiunge un blocco audio; `arrivato_il` (perf_counter) è l'istante di cattura, se noto."""
+        arrivato_il = time.perf_counter() if arrivato_il is None else arrivato_il
+        blocco = np.asarray(blocco, dtype=np.float32).reshape(-1)
+        # Blocchi lunghi vengono analizzati a pezzi, così il buffer contiene sempre il chunk aperto
+        for inizio in range(0, len(blocco), BLOCCO):
+            self.buffer.scrivi(blocco[inizio:inizio + BLOCCO])
+            for intervallo in self.segmentatore.analizza(self.buffer):
+                self._invia(intervallo, arrivato_il)
+
+    def _invia(self, intervallo, arrivato_il):
+        inizio, fine, continua = intervallo
+        chunk = {
+            "inizio": inizio,
+            "fine": fine,
+            "continua": continua,
+            "audio": self.buffer.leggi(inizio, fine),
+            "arrivato_il": arrivato_il,
+        }
+        attesa = time.perf_counter()
+        self._coda.put(chunk)
+        chunk["attesa_coda"] = time.perf_counter() - attesa
+
+    def _lavora(self):
+        while True:
+            chunk = self._coda.get()
+            if chunk is None:
+                return
+            inizio_inferenza = time.perf_counter()
+            try:
+                segmenti = self.trascrivi(chunk["audio"])
+                errore = None
+            except Exception as e:
+                segmenti, errore = [], str(e)
+            fine_inferenza = time.perf_counter()
+
+            nuovo = self.trascrizione.aggiungi(segmenti, chunk["inizio"] / self.frequenza, chunk["continua"])
+            durata = (chunk["fine"] - chunk["inizio"]) / self.frequenza
+            self.metriche.append({
+                "chunk": len(self.metriche),
+                "inizio_s": round(chunk["inizio"] / self.frequenza, 2),
+                "durata_s": round(durata, 2),
+                "attesa_coda_s": chunk.get("attesa_coda", 0.0),
+                "inferenza_s": fine_inferenza - inizio_inferenza,
+                # Dal blocco audio che ha chiuso il chunk al testo disponibile
+                "latenza_s": fine_inferenza - chunk["arrivato_il"],
+                "fattore_tempo_reale": (fine_inferenza - inizio_inferenza) / durata if durata else 0.0,
+                "errore": errore,
+            })
+            if self.al_testo and nuovo:
+                self.al_testo(nuovo)
+
+    def chiudi(self):
+        """Trascrive l'eventuale voce rimasta, attende il worker e restituisce il testo completo."""
+        for intervallo in self.segmentatore.chiudi(self.buffer):
+            self._invia(intervallo, time.perf_counter())
+        self._coda.put(None)
+        self._worker.join()
+        return self.trascrizione.testo
+
+
+def trascrivi_stream(blocchi, trascrivi, frequenza=FREQUENZA, al_testo=None):
+    """Trascrive uno stream di blocchi audio; restituisce il testo e le metriche per chunk.
+
+    `blocchi` può produrre array o coppie (array, istante di cattura). Uno stop
+    manuale (Ctrl+C o interruzione del kernel) chiude lo stream trascrivendo
+    l'audio già ricevuto.
+    """
+    pipeline = PipelineTrascrizione(trascrivi, frequenza, al_testo=al_testo)
+    try:
+        for blocco in blocchi:
+            if isinstance(blocco, tuple):
+                pipeline.elabora(*blocco)
+            else:
+                pipeline.elabora(blocco)
+    except KeyboardInterrupt:
+        print("Interrotto")
+    return pipeline.chiudi(), pipeline.metriche
+
+
+def riepilogo_latenze(metriche):
+    """Percentili della latenza e del fattore tempo reale sui chunk trascritti."""
+    if not metriche:
+        return {"chunk": 0}
+    latenze = np.array([m["latenza_s"] for m in metriche])
+    return {
+        "chunk": len(metriche),
+        "latenza_p50_s": round(float(np.percentile(latenze, 50)), 3),
+        "latenza_p95_s": round(float(np.percentile(latenze, 95)), 3),
+        "latenza_max_s": round(float(latenze.max()), 3),
+        "fattore_tempo_reale_medio": round(float(np.mean([m["fattore_tempo_reale"] for m in metriche])), 3),
+        "errori": sum(1 for m in metriche if m["errore"]),
+    }
+
+
+# ----------------------------
+# Sorgenti audio
+# ----------------------------
+def leggi_wav(percorso, frequenza=FREQUENZA):
+    """Audio di un file WAV PCM come float32 mono a `frequenza` Hz."""
+    with wave.open(percorso, "rb") as f:
+        canali, larghezza, frequenza_file = f.getnchannels(), f.getsampwidth(), f.getframerate()
+        grezzo = f.readframes(f.getnframes())
+
+    if larghezza == 1:
+        audio = (np.frombuffer(grezzo, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif larghezza == 2:
+        audio = np.frombuffer(grezzo, dtype="<i2").astype(np.float32) / 32768
+    elif larghezza == 4:
+        audio = np.frombuffer(grezzo, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"WAV a {8 * larghezza} bit non supportato: {percorso}")
+
+    audio = audio.reshape(-1, canali).mean(axis=1)
+    if frequenza_file != frequenza:
+        durata = len(audio) / frequenza_file
+        istanti = np.arange(int(durata * frequenza)) / frequenza
+        audio = np.interp(istanti, np.arange(len(audio)) / frequenza_file, audio)
+    return audio.astype(np.float32)
+
+
+def blocchi_wav(percorso, blocco=BLOCCO, frequenza=FREQUENZA, tempo_reale=False):
+    """Riproduce un file WAV a blocchi, come farebbe il microfono.
+
+    Con `tempo_reale=True` ogni blocco viene emesso quando sarebbe stato
+    registrato, così latenze e contropressione sono quelle di un uso dal vivo.
+    """
+    audio = leggi_wav(percorso, frequenza)
+    avvio = time.perf_counter()
+    for inizio in range(0, len(audio), blocco):
+        parte = audio[inizio:inizio + blocco]
+        if tempo_reale:
+            catturato = avvio + (inizio + len(parte)) / frequenza
+            time.sleep(max(0.0, catturato - time.perf_counter()))
+        yield parte, time.perf_counter()
+
+
+def blocchi_microfono(blocco=BLOCCO, frequenza=FREQUENZA, dimensione_coda=CODA_AUDIO):
+    """Blocchi dal microfono; se il consumatore resta indietro i blocchi in eccesso vengono scartati e contati."""
+    import sounddevice as sd
+
+    coda = queue.Queue(maxsize=dimensione_coda)
+    scartati = 0
+
+    def callback(indata, frames, time_info, status):
+        nonlocal scartati
+        try:
+            coda.put_nowait((indata[:, 0].copy(), time.perf_counter()))
+        except queue.Full:
+            # La callback audio non deve mai bloccarsi
+            scartati += 1
+
+    with sd.InputStream(channels=1, samplerate=frequenza, blocksize=blocco, dtype="float32", callback=callback):
+        print("Inizia a parlare... (premi Ctrl+C per uscire)")
+        try:
+            while True:
+                yield coda.get()
+        finally:
+            if scartati:
+                print(f"Attenzione: {scartati} blocchi audio scartati perché la trascrizione era in ritardo.")
+
+
+def trascrittore_whisper(modello="base", lingua=LINGUA):
+    """Funzione `trascrivi(audio)` basata su Whisper; `modello` è un nome o un modello già caricato."""
+    if isinstance(modello, str):
+        import whisper
+
+        modello = whisper.load_model(modello)
+
+    def trascrivi(audio):
+        # Il contesto tra chunk è gestito dall'unione dei testi, non dal decoder
+        risultato = modello.transcribe(audio, language=lingua, fp16=False, condition_on_previous_text=False)
+        return risultato["segments"]
+
+    return trascrivi
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Trascrizione in streaming con Whisper dal microfono o da file WAV (replay)."
+    )
+    parser.add_argument("wav", nargs="*", help="File WAV da riprodurre al posto del microfono")
+    parser.add_argument("--modello", default="base", help="Modello Whisper (tiny, base, small, ...)")
+    parser.add_argument("--tempo-reale", action="store_true", help="Riproduce i WAV alla velocità di registrazione")
+    args = parser.parse_args()
+
+    trascrivi = trascrittore_whisper(args.modello)
+    sorgenti = [blocchi_wav(p, tempo_reale=args.tempo_reale) for p in args.wav] or [blocchi_microfono()]
+    for sorgente in sorgenti:
+        testo, metriche = trascrivi_stream(sorgente, trascrivi, al_testo=lambda t: print("Testo:", t))
+        for m in metriche:
+            print(
+                f"chunk {m['chunk']:>3}  inizio {m['inizio_s']:>7.2f} s  durata {m['durata_s']:>5.2f} s  "
+                f"inferenza {m['inferenza_s']:.2f} s  latenza {m['latenza_s']:.2f} s"
+                + (f"  errore: {m['errore']}" if m["errore"] else "")
+            )
+        print("Trascrizione:", testo)
+        print(riepilogo_latenze(metriche))
+
+
+if __name__ == "__main__":
+    main()
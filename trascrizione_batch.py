@@ -0,0 +1,312 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import estrazione
+from client_ollama import ClientOllama
+from trascrizione import LINGUA
+
+# ----------------------------
+# Configurazione
+# ----------------------------
+CARTELLA_USCITA = "cartelle_cliniche"
+FILE_AVANZAMENTO = "avanzamento_batch.jsonl"
+ESTENSIONI_AUDIO = (".wav", ".mp3", ".m4a", ".flac", ".ogg")
+
+# Trascrizioni completate in attesa dell'estrazione: oltre, il pool non riceve nuovi file
+CODA_ESTRAZIONE = 8
+OGNI = 25  # ogni quanti file stampare l'avanzamento
+
+
+# ----------------------------
+# Avanzamento persistente (ripresa dopo un crash)
+# ----------------------------
+class Avanzamento:
+    """Registro append-only delle fasi completate per ogni file audio.
+
+    Ogni riga è scritta e sincronizzata su disco appena la fase termina: dopo
+    un'interruzione si riparte dal primo file non completato, e i file già
+    trascritti passano direttamente all'estrazione.
+    """
+
+    def __init__(self, percorso):
+        self.percorso = percorso
+        self.fasi = {}
+        self._lock = threading.Lock()
+        if os.path.exists(percorso):
+            with open(percorso, "r", encoding="utf-8") as f:
+                for riga in f:
+                    try:
+                        voce = json.loads(riga)
+                    except json.JSONDecodeError:
+                        # Ultima riga troncata da un crash durante la scrittura
+                        continue
+                    self.fasi.setdefault(voce["chiave"], {})[voce["fase"]] = voce
+
+    @staticmethod
+    def chiave(percorso):
+        """Identifica il contenuto del file: un file modificato viene rielaborato."""
+        stat = os.stat(percorso)
+        return f"{os.path.abspath(percorso)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def fase(self, chiave, nome):
+        return self.fasi.get(chiave, {}).get(nome)
+
+    def registra(self, chiave, fase, **dati):
+        voce = {"chiave": chiave, "fase": fase, "registrato_il": time.time(), **dati}
+        with self._lock:
+            self.fasi.setdefault(chiave, {})[fase] = voce
+            with open(self.percorso, "a", encoding="utf-8") as f:
+                f.write(json.dumps(voce, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def scrivi_atomico(percorso, contenuto):
+    temporaneo = percorso + ".tmp"
+    with open(temporaneo, "w", encoding="utf-8") as f:
+        f.write(contenuto)
+    os.replace(temporaneo, percorso)
+
+
+# ----------------------------
+# Statistiche per fase
+# ----------------------------
+class Fase:
+    """Throughput di una fase: file elaborati, tempo di lavoro e secondi di audio."""
+
+    def __init__(self, nome, lavoratori):
+        self.nome = nome
+        self.lavoratori = lavoratori
+        self.elementi = 0
+        self.errori = 0
+        self.secondi_lavoro = 0.0
+        self.secondi_audio = 0.0
+        self.inizio = None
+        self.fine = None
+        self._lock = threading.Lock()
+
+    def avvia(self):
+        self.inizio = time.perf_counter()
+
+    def registra(self, secondi, secondi_audio=0.0, errore=False):
+        with self._lock:
+            self.fine = time.perf_counter()
+            self.elementi += 1
+            self.errori += errore
+            self.secondi_lavoro += secondi
+            self.secondi_audio += secondi_audio
+
+    def riepilogo(self):
+        durata = (self.fine - self.inizio) if self.elementi else 0.0
+        return {
+            "fase": self.nome,
+            "lavoratori": self.lavoratori,
+            "file": self.elementi,
+            "errori": self.errori,
+            "file_al_minuto": round(self.elementi / durata * 60, 2) if durata else 0.0,
+            # Tempo medio di un file per un singolo lavoratore: serve a dimensionare il pool
+            "secondi_per_file": round(self.secondi_lavoro / self.elementi, 2) if self.elementi else 0.0,
+            "utilizzo": round(self.secondi_lavoro / (durata * self.lavoratori), 2) if durata else 0.0,
+            "audio_su_tempo_reale": round(self.secondi_audio / durata, 2) if durata and self.secondi_audio else None,
+        }
+
+
+def stampa_riepilogo(fasi):
+    for fase in fasi:
+        r = fase.riepilogo()
+        audio = f", {r['audio_su_tempo_reale']}x tempo reale" if r["audio_su_tempo_reale"] else ""
+        print(
+            f"{r['fase']:<12} {r['file']:>6} file ({r['errori']} errori)  {r['file_al_minuto']:>8.2f} file/min  "
+            f"{r['secondi_per_file']:>7.2f} s/file per lavoratore  utilizzo {r['utilizzo']:.0%} "
+            f"su {r['lavoratori']} lavoratori{audio}"
+        )
+
+
+# ----------------------------
+# Trascrizione nei processi worker (modello Whisper caricato una volta per processo)
+# ----------------------------
+_modello = None
+
+
+def _inizializza(nome_modello, thread):
+    global _modello
+    import torch
+    import whisper
+
+    # Un pool di P processi su N core: ogni processo usa N/P thread, senza sovrascrivere gli altri
+    torch.set_num_threads(thread)
+    _modello = whisper.load_model(nome_modello, device="cpu")
+
+
+def _trascrivi(percorso):
+    import whisper
+
+    inizio = time.perf_counter()
+    try:
+        audio = whisper.load_audio(percorso)
+        risultato = _modello.transcribe(audio, language=LINGUA, fp16=False)
+    except Exception as e:
+        return percorso, None, 0.0, time.perf_counter() - inizio, str(e)
+    durata_audio = len(audio) / whisper.audio.SAMPLE_RATE
+    return percorso, risultato["text"].strip(), durata_audio, time.perf_counter() - inizio, None
+
+
+# ----------------------------
+# Orchestrazione
+# ----------------------------
+def file_audio(cartella):
+    trovati = []
+    for radice, _, nomi in os.walk(cartella):
+        trovati.extend(os.path.join(radice, n) for n in nomi if n.lower().endswith(ESTENSIONI_AUDIO))
+    return sorted(trovati)
+
+
+def _nome_base(percorso, cartella):
+    # Il percorso relativo evita collisioni tra file omonimi in sottocartelle diverse
+    relativo = os.path.splitext(os.path.relpath(percorso, cartella))[0]
+    return relativo.replace(os.sep, "__")
+
+
+def elabora_cartella(
+    cartella,
+    uscita=CARTELLA_USCITA,
+    processi=None,
+    estrattori=1,
+    modello_whisper="base",
+    modello_llm=estrazione.MODELLO,
+    dimensione_coda=CODA_ESTRAZIONE,
+):
+    """Trascrive e struttura tutti i file audio di `cartella`, riprendendo da dove si era interrotto.
+
+    La trascrizione gira in un pool di processi (un modello Whisper residente
+    per processo); l'estrazione con l'LLM gira in `estrattori` thread. Le due
+    fasi sono collegate da una coda limitata. Per ogni file vengono salvati
+    `<uscita>/trascrizioni/<nome>.txt` e `<uscita>/<nome>.json`.
+    """
+    processi = processi or max(1, (os.cpu_count() or 1) // 2)
+    thread_per_processo = max(1, (os.cpu_count() or 1) // processi)
+    cartella_trascrizioni = os.path.join(uscita, "trascrizioni")
+    os.makedirs(cartella_trascrizioni, exist_ok=True)
+
+    avanzamento = Avanzamento(os.path.join(uscita, FILE_AVANZAMENTO))
+    statistiche_trascrizione = Fase("trascrizione", processi)
+    statistiche_estrazione = Fase("estrazione", estrattori)
+
+    da_trascrivere, da_estrarre, completati = [], [], 0
+    for percorso in file_audio(cartella):
+        chiave = avanzamento.chiave(percorso)
+        if avanzamento.fase(chiave, "estratto"):
+            completati += 1
+        elif avanzamento.fase(chiave, "trascritto"):
+            da_estrarre.append((percorso, chiave))
+        else:
+            da_trascrivere.append((percorso, chiave))
+    print(
+        f"{completati} file già completati, {len(da_estrarre)} da estrarre, {len(da_trascrivere)} da trascrivere "
+        f"({processi} processi x {thread_per_processo} thread, {estrattori} estrattori)."
+    )
+
+    coda = queue.Queue(maxsize=dimensione_coda)
+    client = ClientOllama(concorrenza=estrattori)
+    statistiche_trascrizione.avvia()
+    statistiche_estrazione.avvia()
+
+    def estrai():
+        while True:
+            elemento = coda.get()
+            if elemento is None:
+                return
+            percorso, chiave = elemento
+            nome = _nome_base(percorso, cartella)
+            inizio = time.perf_counter()
+            try:
+                with open(os.path.join(cartella_trascrizioni, nome + ".txt"), "r", encoding="utf-8") as f:
+                    dati = estrazione.estrai_cartella(f.read(), modello=modello_llm, client=client)
+                errore = None if dati is not None else "La risposta del modello non contiene un JSON valido"
+            except Exception as e:
+                dati, errore = None, str(e)
+
+            if errore:
+                # Il file resta "trascritto": verrà ritentato alla prossima esecuzione
+                print(f"Errore nell'estrazione di {percorso}: {errore}")
+            else:
+                destinazione = os.path.join(uscita, nome + ".json")
+                scrivi_atomico(destinazione, json.dumps(dati, indent=4, ensure_ascii=False))
+                avanzamento.registra(chiave, "estratto", file=percorso, uscita=destinazione)
+            statistiche_estrazione.registra(time.perf_counter() - inizio, errore=errore is not None)
+            if statistiche_estrazione.elementi % OGNI == 0:
+                stampa_riepilogo([statistiche_trascrizione, statistiche_estrazione])
+
+    thread_estrazione = [threading.Thread(target=estrai, daemon=True) for _ in range(estrattori)]
+    for t in thread_estrazione:
+        t.start()
+    # I file già trascritti entrano in coda in parallelo alle nuove trascrizioni
+    ripresa = threading.Thread(target=lambda: [coda.put(e) for e in da_estrarre], daemon=True)
+    ripresa.start()
+
+    def completa(futuro, chiavi):
+        percorso, testo, durata_audio, secondi, errore = futuro.result()
+        statistiche_trascrizione.registra(secondi, durata_audio, errore=errore is not None)
+        if errore:
+            print(f"Errore nella trascrizione di {percorso}: {errore}")
+            return
+        destinazione = os.path.join(cartella_trascrizioni, _nome_base(percorso, cartella) + ".txt")
+        scrivi_atomico(destinazione, testo)
+        avanzamento.registra(chiavi[percorso], "trascritto", file=percorso, uscita=destinazione, durata_audio=durata_audio)
+        # Bloccante se l'estrazione è in ritardo: il pool smette di ricevere nuovi file
+        coda.put((percorso, chiavi[percorso]))
+
+    chiavi = dict(da_trascrivere)
+    if da_trascrivere:
+        with ProcessPoolExecutor(processi, initializer=_inizializza, initargs=(modello_whisper, thread_per_processo)) as pool:
+            in_corso = set()
+            for percorso, _ in da_trascrivere:
+                # Al massimo due file per processo in volo: il resto attende senza occupare memoria
+                if len(in_corso) >= 2 * processi:
+                    finiti, in_corso = wait(in_corso, return_when=FIRST_COMPLETED)
+                    for futuro in finiti:
+                        completa(futuro, chiavi)
+                in_corso.add(pool.submit(_trascrivi, percorso))
+            for futuro in wait(in_corso).done:
+                completa(futuro, chiavi)
+
+    ripresa.join()
+    for _ in thread_estrazione:
+        coda.put(None)
+    for t in thread_estrazione:
+        t.join()
+    client.chiudi()
+
+    stampa_riepilogo([statistiche_trascrizione, statistiche_estrazione])
+    print("Cache LLM:", estrazione.cache_predefinita().statistiche())
+    return [statistiche_trascrizione.riepilogo(), statistiche_estrazione.riepilogo()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Trascrive con Whisper ed estrae con l'LLM le cartelle cliniche di una cartella di registrazioni."
+    )
+    parser.add_argument("cartella", help="Cartella con i file audio (anche in sottocartelle)")
+    parser.add_argument("--uscita", default=CARTELLA_USCITA, help="Cartella dei JSON, delle trascrizioni e dell'avanzamento")
+    parser.add_argument("--processi", type=int, default=None, help="Processi di trascrizione (default: metà dei core)")
+    parser.add_argument("--estrattori", type=int, default=1, help="Richieste parallele all'LLM")
+    parser.add_argument("--modello", default="base", help="Modello Whisper (tiny, base, small, ...)")
+    parser.add_argument("--modello-llm", default=estrazione.MODELLO, help="Modello Ollama per l'estrazione")
+    args = parser.parse_args()
+    elabora_cartella(
+        args.cartella,
+        uscita=args.uscita,
+        processi=args.processi,
+        estrattori=args.estrattori,
+        modello_whisper=args.modello,
+        modello_llm=args.modello_llm,
+    )
+
+
+if __name__ == "__main__":
+    main()